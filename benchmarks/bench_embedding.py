@@ -0,0 +1,96 @@
+"""向量化后端对比：查询延迟、文本块吞吐量以及与原始模型的一致性
+
+对每个后端测量单条查询的 p50/p99 延迟和批量向量化的吞吐量（块/秒），并以 torch 原始模型的输出为基准
+计算余弦相似度的最小值与平均值；最小值低于 EMBEDDING_PARITY_MIN 的后端会被标记为不达标。
+
+用法：
+    python -m benchmarks.bench_embedding                              # 对比全部后端
+    python -m benchmarks.bench_embedding --backends torch onnx-int8 --threads 4
+    python -m benchmarks.bench_embedding --export                     # 重新导出ONNX模型
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.corpus import make_corpus
+from embedding_model.backends import (BACKENDS, MODEL_CACHE_DIR, MODEL_NAME, NORMALIZE_EMBEDDINGS, ONNX_DIR,
+                                      PARITY_MIN_COSINE, PARITY_TEXTS, OnnxEncoder, SentenceTransformerEncoder,
+                                      cosine_parity, export_onnx, load_sentence_transformer, onnx_exported,
+                                      quantize_torch, require_onnx, set_torch_threads)
+
+def make_chunks(count: int, size: int = 400) -> list:
+    text = make_corpus(0, chapters=10)
+    return [text[i * size % (len(text) - size):][:size] for i in range(count)]
+
+def make_encoder(backend: str, model, batch_size: int, threads: int):
+    if backend == "torch":
+        return SentenceTransformerEncoder(model, NORMALIZE_EMBEDDINGS, batch_size)
+    if backend == "torch-int8":
+        return SentenceTransformerEncoder(quantize_torch(model), NORMALIZE_EMBEDDINGS, batch_size)
+    filename = "model.int8.onnx" if backend == "onnx-int8" else "model.onnx"
+    return OnnxEncoder(ONNX_DIR, filename, NORMALIZE_EMBEDDINGS, batch_size, threads)
+
+def measure(encoder, queries: list, chunks: list, reference: np.ndarray) -> dict:
+    encoder.embed_documents(queries[:2])  # 预热
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        encoder.embed_query(query)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    vectors = encoder.embed_documents(chunks)
+    elapsed = time.perf_counter() - start
+    min_cosine, mean_cosine = cosine_parity(vectors, reference)
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p99_ms": float(np.percentile(latencies, 99)),
+        "chunks_per_s": len(chunks) / elapsed,
+        "min_cosine": min_cosine,
+        "mean_cosine": mean_cosine,
+        "passed": min_cosine >= PARITY_MIN_COSINE,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="向量化后端对比")
+    parser.add_argument("--backends", nargs="*", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--threads", type=int, default=0, help="推理线程数，0 为库默认值")
+    parser.add_argument("--batch-size", type=int, default=32, help="批量向量化的批大小")
+    parser.add_argument("--chunks", type=int, default=256, help="吞吐量测试的文本块数")
+    parser.add_argument("--queries", type=int, default=50, help="延迟测试的查询数")
+    parser.add_argument("--export", action="store_true", help="重新导出ONNX模型")
+    parser.add_argument("--output", help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    set_torch_threads(args.threads)
+    export = args.export or not onnx_exported(MODEL_NAME)
+    for backend in args.backends:
+        if backend.startswith("onnx"):
+            require_onnx(backend, export)
+    model = load_sentence_transformer(MODEL_NAME, MODEL_CACHE_DIR)
+    if any(backend.startswith("onnx") for backend in args.backends) and export:
+        print(f"导出ONNX模型到 {ONNX_DIR} ...")
+        export_onnx(model, MODEL_NAME, NORMALIZE_EMBEDDINGS)
+
+    queries = (PARITY_TEXTS * (args.queries // len(PARITY_TEXTS) + 1))[:args.queries]
+    chunks = PARITY_TEXTS + make_chunks(args.chunks)
+    reference = np.asarray(SentenceTransformerEncoder(model, NORMALIZE_EMBEDDINGS, args.batch_size)
+                           .embed_documents(chunks), dtype=np.float32)
+
+    report = {}
+    print(f"\n{'后端':<12}{'查询p50':>10}{'查询p99':>10}{'块/秒':>10}{'最小余弦':>10}{'平均余弦':>10}")
+    for backend in args.backends:
+        result = measure(make_encoder(backend, model, args.batch_size, args.threads), queries, chunks, reference)
+        report[backend] = result
+        flag = "" if result["passed"] else f"  ✗ 低于 {PARITY_MIN_COSINE}"
+        print(f"{backend:<12}{result['query_p50_ms']:>7.1f} ms{result['query_p99_ms']:>7.1f} ms"
+              f"{result['chunks_per_s']:>10.1f}{result['min_cosine']:>12.4f}{result['mean_cosine']:>12.4f}{flag}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"threads": args.threads, "batch_size": args.batch_size, "results": report},
+                      f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
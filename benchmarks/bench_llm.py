@@ -0,0 +1,99 @@
+"""LLM客户端压测：在本地模拟服务上比较不重试、重试、重试+对冲三种配置的成功率与延迟
+
+模拟服务按 --error-rate 返回429/503，按 --slow-rate 让部分请求的首片段延迟 --slow-delay 秒，
+以固定并发发出请求，统计成功率、首片段与完整回答的 p50/p99 延迟，以及服务端收到的请求数和新建连接数。
+
+用法：
+    python -m benchmarks.bench_llm
+    python -m benchmarks.bench_llm --requests 200 --concurrency 16 --error-rate 0.1 --slow-rate 0.05 --hedge-after 0.5
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.fake_llm_server import start_fake_server
+from utils.llm_client import GeminiClient, LLMError
+
+PROMPT = "参考资料:\n阿司匹林的不良反应包括胃肠道出血。\n历史对话:\n\n问题：阿司匹林有哪些不良反应？"
+
+def run_one(client: GeminiClient) -> tuple:
+    start = time.perf_counter()
+    first = None
+    try:
+        for chunk in client.generate_content(PROMPT, stream=True):
+            if first is None:
+                first = time.perf_counter() - start
+        return True, first, time.perf_counter() - start
+    except LLMError:
+        return False, None, time.perf_counter() - start
+
+def run_config(name: str, args, **client_options) -> dict:
+    server = start_fake_server(first_delay=args.first_delay, chunk_delay=args.chunk_delay,
+                               answer_chars=args.answer_chars, error_rate=args.error_rate,
+                               slow_rate=args.slow_rate, slow_delay=args.slow_delay, seed=args.seed)
+    # 并发上限留出余量，对冲请求才有名额
+    client = GeminiClient(base_url=server.url, max_concurrent=args.concurrency * 2, **client_options)
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(lambda _: run_one(client), range(args.requests)))
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+    ok = [r for r in results if r[0]]
+    first = np.asarray([r[1] for r in ok if r[1] is not None] or [0.0]) * 1000
+    total = np.asarray([r[2] for r in ok] or [0.0]) * 1000
+    stats = client.stats()
+    return {
+        "config": name,
+        "success_rate": len(ok) / len(results),
+        "first_p50_ms": float(np.percentile(first, 50)),
+        "first_p99_ms": float(np.percentile(first, 99)),
+        "total_p50_ms": float(np.percentile(total, 50)),
+        "total_p99_ms": float(np.percentile(total, 99)),
+        "server_requests": server.counters["requests"],
+        "connections": server.counters["connections"],
+        "retries": stats["retries"],
+        "hedges": stats["hedges"],
+        "hedge_wins": stats["hedge_wins"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM客户端压测（本地模拟服务）")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--first-delay", type=float, default=0.2, help="首片段延迟（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="片段间隔（秒）")
+    parser.add_argument("--answer-chars", type=int, default=400)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-delay", type=float, default=3.0)
+    parser.add_argument("--hedge-after", type=float, default=0.5, help="对冲配置中发出第二个请求的等待时间（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    configs = [
+        ("不重试", {"max_retries": 0, "hedge_after": 0}),
+        ("重试", {"hedge_after": 0}),
+        ("重试+对冲", {"hedge_after": args.hedge_after}),
+    ]
+    print(f"{'配置':<10}{'成功率':>8}{'首片段p50':>12}{'首片段p99':>12}{'完整p50':>12}{'完整p99':>12}"
+          f"{'服务端请求':>10}{'连接数':>8}")
+    report = []
+    for name, options in configs:
+        result = run_config(name, args, **options)
+        report.append(result)
+        print(f"{name:<10}{result['success_rate']:>8.1%}{result['first_p50_ms']:>9.0f} ms{result['first_p99_ms']:>9.0f} ms"
+              f"{result['total_p50_ms']:>9.0f} ms{result['total_p99_ms']:>9.0f} ms"
+              f"{result['server_requests']:>12}{result['connections']:>10}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"args": vars(args), "results": report}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
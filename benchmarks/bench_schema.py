@@ -0,0 +1,170 @@
+"""collection结构对比：legacy（VARCHAR元数据 + 内联文本 + float32向量）与 compact（int32元数据 +
+float16/二值向量 + 旁路文本存储）的存储大小、检索延迟和召回率
+
+用合成的聚类向量（归一化，模拟embedding分布）和合成教材文本分别建立三个临时collection，
+以float32精确检索为基准计算 recall@k；延迟包含读取最终 k 个文本块内容的时间。
+在当前配置的向量库后端上运行，离线测试可使用本地后端：
+
+    VECTOR_BACKEND=local python -m benchmarks.bench_schema
+    python -m benchmarks.bench_schema --rows 50000 --queries 300 --output schema.json
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+from langchain.schema import Document
+
+from benchmarks.corpus import make_corpus
+from benchmarks.tune_index import exact_top_k
+from utils.compact_schema import CHUNK_FIELDS, EMBEDDING_DIM, collection_fields, fill_contents, forget_layout, \
+    insert_rows, layout_of, search
+from utils.content_store import drop_content_store, get_content_store
+from vector_store import get_backend
+from vector_store.index_policy import choose_index, ensure_index, get_registry
+
+VARIANTS = {
+    "legacy": ("legacy", None),
+    "compact-float16": ("compact", "float16"),
+    "compact-binary": ("compact", "binary"),
+}
+
+def make_vectors(rows: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """围绕随机中心生成的归一化向量"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, EMBEDDING_DIM)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, EMBEDDING_DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def make_documents(rows: int, chunk_size: int = 500) -> List[Document]:
+    text = ""
+    seed = 0
+    while len(text) < rows * chunk_size:
+        text += make_corpus(seed)
+        seed += 1
+    return [Document(page_content=text[i * chunk_size:(i + 1) * chunk_size],
+                     metadata={"chunk_index": str(i), "chunk_total": str(rows),
+                               "chunk_size": str(chunk_size), "chunk_overlap": "0"})
+            for i in range(rows)]
+
+def make_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    """在库中向量附近扰动得到查询"""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), size=count, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(EMBEDDING_DIM)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def build(store, name: str, schema: str, vector_type: str, documents, vectors, batch_size: int = 1000):
+    if store.has_collection(name):
+        store.drop_collection(name)
+    drop_content_store(name)
+    forget_layout(name)
+    fields = collection_fields(schema=schema, vector_type=vector_type or "float16")
+    config = choose_index(0, store.index_types, fields[-1].dtype)
+    collection = store.create_collection(name, fields, config.index_params, "schema benchmark")
+    start = time.perf_counter()
+    for i in range(0, len(documents), batch_size):
+        insert_rows(collection, documents[i:i + batch_size], vectors[i:i + batch_size])
+    collection.flush()
+    ensure_index(collection, store)
+    return collection, time.perf_counter() - start
+
+def row_bytes(collection, documents) -> float:
+    """每行在向量库中的估计内存占用：向量 + 标量字段"""
+    layout = layout_of(collection)
+    if layout.binary:
+        vector = EMBEDDING_DIM // 8
+    else:
+        vector = EMBEDDING_DIM * (2 if layout.vector_type == "float16_vector" else 4)
+    if layout.compact:
+        return 8 + 4 * len(CHUNK_FIELDS) + vector
+    sample = documents[:1000]
+    text = sum(len(doc.page_content.encode('utf-8')) + sum(len(doc.metadata[name]) for name in CHUNK_FIELDS)
+               for doc in sample) / len(sample)
+    return 8 + text + vector
+
+def measure(store, collection, documents, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict:
+    layout = layout_of(collection)
+    search_params = get_registry().search_params(collection.name)
+    fields = ["chunk_index", "chunk_total", "content"]
+    latencies = []
+    found = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = search(collection, query.tolist(), search_params, limit=k, output_fields=fields)
+        docs = [{'page_content': hit['fields'].get('content'), 'metadata': {'id': hit['id'], 'source': "bench"}}
+                for hit in hits]
+        fill_contents(docs, {"bench": collection})
+        latencies.append(time.perf_counter() - start)
+        # chunk_index 即向量在数组中的下标
+        found += len({int(hit['fields']['chunk_index']) for hit in hits} & set(expected.tolist()))
+    latencies = np.asarray(latencies) * 1000
+    result = {
+        "vector_type": layout.vector_type,
+        "index": get_registry().get(collection.name).label(),
+        "row_bytes": row_bytes(collection, documents),
+        "recall": found / truth.size,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+    root = getattr(store, "root", None)
+    if root is not None:
+        result["index_disk_bytes"] = directory_bytes(os.path.join(root, collection.name))
+    if layout.compact:
+        result["side_store_bytes"] = get_content_store(collection.name).size_bytes()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="collection结构大小/延迟对比")
+    parser.add_argument("--rows", type=int, default=10000, help="文本块数量")
+    parser.add_argument("--clusters", type=int, default=64, help="合成向量的聚类数")
+    parser.add_argument("--queries", type=int, default=200, help="查询数量")
+    parser.add_argument("--k", type=int, default=12, help="recall@k 的 k（默认与检索数量一致）")
+    parser.add_argument("--variants", nargs="*", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--keep", action="store_true", help="保留临时collection")
+    parser.add_argument("--output", help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    store = get_backend()
+    store.connect()
+    vectors = make_vectors(args.rows, args.clusters)
+    documents = make_documents(args.rows)
+    queries = make_queries(vectors, min(args.queries, args.rows))
+    truth = exact_top_k(vectors, queries, args.k)
+    print(f"{args.rows} 个文本块, {len(queries)} 个查询, recall@{args.k}")
+
+    report = {}
+    for variant in args.variants:
+        name = f"bench_schema__{variant.replace('-', '_')}"
+        schema, vector_type = VARIANTS[variant]
+        collection, seconds = build(store, name, schema, vector_type, documents, vectors)
+        try:
+            report[variant] = {"insert_s": seconds, **measure(store, collection, documents, queries, truth, args.k)}
+        finally:
+            if not args.keep:
+                collection.release()
+                store.drop_collection(name)
+                get_registry().remove(name)
+                drop_content_store(name)
+                forget_layout(name)
+
+    baseline = report.get("legacy", {}).get("row_bytes")
+    print(f"\n{'结构':<17}{'每行内存':>10}{'内存比':>8}{'索引磁盘':>11}{'旁路存储':>11}"
+          f"{'p50':>9}{'p99':>9}{'recall':>8}")
+    for variant, result in report.items():
+        ratio = f"{result['row_bytes'] / baseline:.2f}" if baseline else "-"
+        disk = f"{result['index_disk_bytes'] / 2**20:.1f} MB" if "index_disk_bytes" in result else "-"
+        side = f"{result['side_store_bytes'] / 2**20:.1f} MB" if "side_store_bytes" in result else "-"
+        print(f"{variant:<17}{result['row_bytes']:>8.0f} B{ratio:>8}{disk:>11}{side:>11}"
+              f"{result['p50_ms']:>6.2f} ms{result['p99_ms']:>6.2f} ms{result['recall']:>8.3f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
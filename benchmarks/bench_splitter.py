@@ -0,0 +1,110 @@
+"""分割器吞吐量基准与黄金输出校验
+
+用法：
+    python -m benchmarks.bench_splitter                 # 测量吞吐量
+    python -m benchmarks.bench_splitter --check         # 与黄金输出比对，不一致时返回非零
+    python -m benchmarks.bench_splitter --workers 4     # 并行分词模式
+    python -m benchmarks.bench_splitter --update-golden # 重新生成黄金输出（仅在有意改变分割结果时使用）
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+from benchmarks.corpus import make_corpus
+from utils.text_splitter.medical_splitter import AdaptiveMedicalSplitter
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "golden", "splitter.json")
+GOLDEN_SEEDS = range(12)
+
+def golden_inputs():
+    """黄金语料：12 份不同章节数的合成文本"""
+    for seed in GOLDEN_SEEDS:
+        yield seed, make_corpus(seed, 1 + seed % 6), {"source": f"seed{seed}"}
+
+def digest_documents(documents) -> str:
+    """对分割结果（内容与元数据）计算摘要"""
+    h = hashlib.sha256()
+    for doc in documents:
+        h.update(json.dumps([doc.page_content, doc.metadata], ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        h.update(b"\n")
+    return h.hexdigest()
+
+def compute_golden(splitter: AdaptiveMedicalSplitter) -> dict:
+    results = {}
+    for seed, text, metadata in golden_inputs():
+        documents = splitter.split_document(text, metadata)
+        results[str(seed)] = {"chunks": len(documents), "sha256": digest_documents(documents)}
+    return results
+
+def check_golden(splitter: AdaptiveMedicalSplitter) -> bool:
+    with open(GOLDEN_PATH, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    actual = compute_golden(splitter)
+    ok = True
+    for seed, record in expected.items():
+        if actual.get(seed) != record:
+            ok = False
+            print(f"seed {seed}: 期望 {record}，实际 {actual.get(seed)}")
+    print("黄金输出校验" + ("通过" if ok else "失败"))
+    return ok
+
+def measure(splitter: AdaptiveMedicalSplitter, seeds: int, chapters: int, repeat: int) -> dict:
+    texts = [make_corpus(seed, chapters) for seed in range(seeds)]
+    chars = sum(len(text) for text in texts)
+    best = None
+    chunks = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = sum(sum(1 for _ in splitter.iter_documents(text)) for text in texts)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "chars": chars,
+        "chunks": chunks,
+        "seconds": best,
+        "chars_per_sec": chars / best,
+        "chunks_per_sec": chunks / best,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="分割器吞吐量基准")
+    parser.add_argument("--check", action="store_true", help="与黄金输出比对")
+    parser.add_argument("--update-golden", action="store_true", help="重新生成黄金输出")
+    parser.add_argument("--seeds", type=int, default=8, help="合成文本份数")
+    parser.add_argument("--chapters", type=int, default=10, help="每份文本的章数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最快一次")
+    parser.add_argument("--workers", type=int, default=1, help="分词进程数")
+    args = parser.parse_args()
+
+    import jieba
+    import logging
+    jieba.setLogLevel(logging.WARNING)
+    jieba.initialize()
+    splitter = AdaptiveMedicalSplitter(workers=args.workers)
+    try:
+        run(splitter, args)
+    finally:
+        splitter.close()
+
+def run(splitter: AdaptiveMedicalSplitter, args):
+    if args.update_golden:
+        os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+            json.dump(compute_golden(splitter), f, indent=2, sort_keys=True)
+        print(f"已写入 {GOLDEN_PATH}")
+        return
+    if args.check:
+        if not check_golden(splitter):
+            sys.exit(1)
+        return
+
+    result = measure(splitter, args.seeds, args.chapters, args.repeat)
+    print(f"分词进程: {max(splitter.workers, 1)}")
+    print(f"文本: {result['chars']} 字, 文本块: {result['chunks']}, 用时 {result['seconds']:.2f}s")
+    print(f"吞吐量: {result['chars_per_sec']:.0f} 字/s, {result['chunks_per_sec']:.1f} 块/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import random
+
+# 合成语料使用的词表，覆盖分割器关心的结构：章节标题、节标题、条目编号、医学术语、剂量数值和缩写
+_TERMS = [
+    "阿司匹林", "β受体阻滞剂", "血管紧张素转换酶抑制剂", "高血压", "糖尿病", "胰岛素", "肝功能",
+    "肾小球滤过率", "心力衰竭", "不良反应", "药理作用", "临床应用", "药物相互作用", "病理生理",
+    "Warfarin Sodium", "Beta Blocker", "Heart Failure", "ACE", "NSAID", "CT", "MRI",
+]
+_SENTENCES = [
+    "{a}可以引起{b}的明显变化。",
+    "{a}的临床表现包括{b}和发热！",
+    "使用{a}时应注意{b}？",
+    "{a}与{b}之间存在药物相互作用，常用剂量为 5.5 mg/kg 每日",
+    "研究表明{a}能够降低{b}的发生率 12% Patients。",
+    "（{n}）{a}主要经肝脏代谢，{b}患者应减量。",
+]
+_NUMERALS = "一二三四五六七八九十"
+
+def make_corpus(seed: int, chapters: int = 6, max_sentences: int = 400) -> str:
+    """生成确定性的中文医学教材风格文本，相同参数总是得到相同结果"""
+    rnd = random.Random(seed)
+    out = []
+    for c in range(chapters):
+        out.append(f"第{_NUMERALS[c % 10]}章 {rnd.choice(_TERMS)}概述\n")
+        for s in range(rnd.randint(1, 4)):
+            out.append(f"{c + 1}.{s + 1} {rnd.choice(_TERMS)}的作用\n")
+            for i in range(rnd.randint(1, 4)):
+                out.append(f"{_NUMERALS[i]}、{rnd.choice(_TERMS)}\n")
+                paragraph = []
+                for _ in range(rnd.randint(5, max_sentences)):
+                    paragraph.append(rnd.choice(_SENTENCES).format(
+                        a=rnd.choice(_TERMS), b=rnd.choice(_TERMS), n=rnd.randint(1, 9)
+                    ))
+                    if rnd.random() < 0.1:
+                        paragraph.append("\n\n")
+                    if rnd.random() < 0.05:
+                        paragraph.append(f"{rnd.randint(1, 20)}、")
+                out.append("".join(paragraph) + "\n")
+    return "".join(out)
+
+def make_pages(seed: int, chapters: int = 6, page_chars: int = 1500):
+    """将合成语料按固定字数切成页面，模拟PDF逐页解析的结果"""
+    text = make_corpus(seed, chapters)
+    return [text[i:i + page_chars] for i in range(0, len(text), page_chars)]
@@ -0,0 +1,100 @@
+"""向量降维评估：比较PCA与截取前若干维在不同维度下的 recall@12，并拟合PCA模型
+
+以原始1792维向量的精确检索结果为基准，对每个候选维度分别降维（PCA / 截取）后做精确检索，
+统计前k个结果的重合比例。向量来自知识库中尚未降维的collection（默认）或embedding磁盘缓存。
+
+用法：
+    python -m benchmarks.dim_report                        # 输出 recall@12 与维度的关系
+    python -m benchmarks.dim_report --questions questions.txt --dims 256 512 768
+    python -m benchmarks.dim_report --source cache --fit    # 在embedding缓存上拟合PCA并保存
+拟合后设置 EMBEDDING_PROJECTION=pca、EMBEDDING_PROJECTION_DIM=512，新建的collection即按该维度存储。
+"""
+import argparse
+import json
+
+import numpy as np
+
+from benchmarks.tune_index import exact_top_k, make_queries
+from embedding_model.projection import PCA_MODEL_PATH, Projection, fit_pca
+from utils.compact_schema import EMBEDDING_DIM, iter_rows, layout_of
+from vector_store import get_backend
+
+DEFAULT_DIMS = [128, 256, 384, 512, 768, 1024, 1792]
+
+def read_knowledge_base(max_rows: int) -> np.ndarray:
+    """读取尚未降维的collection中的向量（二值向量使用旁路存储中的float16副本）"""
+    from embedding_model.projection import get_projection
+    store = get_backend()
+    store.connect()
+    vectors = []
+    for name in sorted(store.list_collections()):
+        if not name.startswith("medical_") or name.endswith("__tune") or get_projection(name) is not None:
+            continue
+        collection = store.open_collection(name)
+        if layout_of(collection).dim != EMBEDDING_DIM:
+            continue
+        for row in iter_rows(collection, "id >= 0", ["id", "embedding"]):
+            vectors.append(row["embedding"])
+            if len(vectors) >= max_rows:
+                return np.asarray(vectors, dtype=np.float32)
+    return np.asarray(vectors, dtype=np.float32)
+
+def read_cache(max_rows: int) -> np.ndarray:
+    from embedding_model.embedding import EMBEDDING_CACHE_DIR, MODEL_NAME, NORMALIZE_EMBEDDINGS
+    from embedding_model.embedding_cache import EmbeddingCache
+    vectors = EmbeddingCache(EMBEDDING_CACHE_DIR, MODEL_NAME, NORMALIZE_EMBEDDINGS).vectors()
+    if len(vectors) > max_rows:
+        rows = np.sort(np.random.default_rng(0).choice(len(vectors), size=max_rows, replace=False))
+        vectors = vectors[rows]
+    return np.asarray(vectors, dtype=np.float32)
+
+def recall(vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, projection: Projection, k: int) -> float:
+    found = exact_top_k(projection.apply(vectors), projection.apply(queries), k)
+    return sum(len(set(a.tolist()) & set(b.tolist())) for a, b in zip(found, truth)) / truth.size
+
+def report(vectors: np.ndarray, queries: np.ndarray, dims, k: int, pca: Projection) -> list:
+    truth = exact_top_k(vectors, queries, k)
+    rows = []
+    for dim in sorted(dims):
+        row = {"dim": dim, "float32_bytes": dim * 4, "float16_bytes": dim * 2}
+        row["truncate"] = recall(vectors, queries, truth, Projection("truncate", dim), k)
+        if dim <= pca.dim:
+            row["pca"] = recall(vectors, queries, truth, Projection("pca", dim, pca.mean, pca.components), k)
+        rows.append(row)
+        pca_text = f"{row['pca']:.3f}" if "pca" in row else "-"
+        print(f"{dim:>6}{row['float32_bytes']:>10} B{row['float16_bytes']:>10} B{pca_text:>9}{row['truncate']:>10.3f}")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="向量降维评估")
+    parser.add_argument("--source", choices=["kb", "cache"], default="kb", help="向量来源：知识库或embedding缓存")
+    parser.add_argument("--max-rows", type=int, default=20000, help="最多使用的向量数")
+    parser.add_argument("--dims", type=int, nargs="*", default=DEFAULT_DIMS, help="候选维度（8的倍数）")
+    parser.add_argument("--k", type=int, default=12, help="recall@k 的 k（默认与检索数量一致）")
+    parser.add_argument("--queries", type=int, default=200, help="查询数量")
+    parser.add_argument("--questions", help="真实问题文件，每行一个")
+    parser.add_argument("--fit", action="store_true", help=f"拟合PCA并保存到 {PCA_MODEL_PATH}")
+    parser.add_argument("--output", help="将结果写入JSON文件")
+    args = parser.parse_args()
+
+    vectors = read_cache(args.max_rows) if args.source == "cache" else read_knowledge_base(args.max_rows)
+    if len(vectors) <= args.k:
+        raise SystemExit(f"只有 {len(vectors)} 个未降维的向量，无法评估")
+    # 主成分数不超过样本数
+    pca = fit_pca(vectors, min(EMBEDDING_DIM, len(vectors) - 1))
+    queries = make_queries(vectors, args.queries, args.questions)
+    print(f"{len(vectors)} 个向量, {len(queries)} 个查询, recall@{args.k}（以{EMBEDDING_DIM}维精确检索为基准）\n")
+    print(f"{'维度':>5}{'float32/行':>12}{'float16/行':>12}{'PCA':>9}{'截取':>8}")
+    rows = report(vectors, queries, args.dims, args.k, pca)
+
+    if args.fit:
+        pca.save(PCA_MODEL_PATH)
+        print(f"\nPCA模型已保存到 {PCA_MODEL_PATH}（{pca.dim} 个主成分），"
+              f"设置 EMBEDDING_PROJECTION=pca 与 EMBEDDING_PROJECTION_DIM 后对新建的collection生效")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"rows": len(vectors), "queries": len(queries), "k": args.k, "results": rows},
+                      f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import zlib
+from typing import List
+
+import numpy as np
+
+from utils.compact_schema import EMBEDDING_DIM
+
+class HashEmbedder:
+    """确定性的模拟embedding：字符二元组哈希到固定维度并归一化，不依赖模型
+
+    与真实模型接口相同（embed_documents / embed_query），含有相同词语的文本相似度更高，
+    检索结果有意义且每次运行完全一致，用于离线基准测试。
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        text = "".join(text.split())
+        for i in range(max(1, len(text) - 1)):
+            h = zlib.crc32(text[i:i + 2].encode('utf-8'))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
@@ -0,0 +1,326 @@
+"""离线基准测试套件：分割器吞吐量、入库速度、检索延迟与端到端问答
+
+不依赖Milvus、Gemini和embedding模型：合成的中文医学教材（benchmarks.corpus）作为知识库，
+HashEmbedder 作为确定性的模拟embedding，FakeModel 作为模拟LLM，向量库使用本地后端，
+所有数据文件写入临时目录。测量内容：
+    - splitter：AdaptiveMedicalSplitter 的 字/秒 与 块/秒；
+    - ingest：load_pdf 的 块/秒 以及流水线各阶段的工作时间；
+    - chat：多个模拟用户并发调用 ChatAgent.chat，统计检索（向量化 + 检索 + 合并 + 读取内容）、
+      首个片段和完整回答的 p50/p95/p99 延迟与每秒问答数（取自各次提问的 Trace）。
+
+结果连同当前提交写入JSON（默认 ./benchmark_results/<提交>.json），--baseline 指定另一次结果时打印对比。
+STORAGE_MODE、VECTOR_TYPE 等其他配置沿用当前环境变量，可用于比较不同配置。
+
+用法：
+    python -m benchmarks.suite
+    python -m benchmarks.suite --users 8 --queries 20 --books 4 --chapters 10
+    python -m benchmarks.suite --stages splitter --baseline benchmark_results/<旧提交>.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ("splitter", "ingest", "chat")
+# 计入检索延迟的阶段（各collection的 search span 包含在 search_all 中）
+RETRIEVAL_STAGES = ("embed", "search_all", "merge", "fetch_content")
+
+_QUESTIONS = [
+    "{a}的不良反应有哪些？",
+    "{a}和{b}之间有什么药物相互作用？",
+    "{a}患者使用{b}时应注意什么？",
+    "简述{a}的药理作用和临床应用。",
+    "{a}如何影响{b}？",
+]
+
+def make_questions(seed: int, count: int) -> list:
+    """确定性的问题列表，使用与合成语料相同的术语"""
+    from benchmarks.corpus import _TERMS
+    rnd = random.Random(seed)
+    return [rnd.choice(_QUESTIONS).format(a=rnd.choice(_TERMS), b=rnd.choice(_TERMS)) for _ in range(count)]
+
+def isolate(workdir: str, args):
+    """切换到临时工作目录并设置离线配置，必须在导入项目模块之前调用（配置在模块导入时读取）"""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    os.environ.update({
+        "VECTOR_BACKEND": "local",
+        "LLM_BACKEND": "fake",
+        "ANSWER_CACHE": "1" if args.answer_cache else "0",
+        "TRACE_LOG": os.path.join(workdir, "traces.jsonl"),
+        "TRACE_PROFILE": "0",
+        "FAKE_LLM_FIRST_DELAY": str(args.llm_first_delay),
+        "FAKE_LLM_CHUNK_DELAY": str(args.llm_chunk_delay),
+    })
+    # 向量库、清单、内容存储等默认路径都是相对路径
+    os.chdir(workdir)
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def percentiles(seconds: list) -> dict:
+    values = np.asarray(seconds or [0.0]) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+    }
+
+def read_traces(path: str, kind: str, offset: int = 0) -> list:
+    """读取追踪日志中 offset 字节之后指定类型的Trace"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        f.seek(offset)
+        traces = [json.loads(line) for line in f if line.strip()]
+    return [trace for trace in traces if trace["kind"] == kind]
+
+def stage_seconds(trace: dict) -> dict:
+    totals = {}
+    for span in trace["spans"]:
+        totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"] / 1000
+    return totals
+
+def quiet(enabled: bool):
+    """屏蔽入库和初始化过程的步骤输出"""
+    return contextlib.redirect_stdout(io.StringIO()) if enabled else contextlib.nullcontext()
+
+def bench_splitter(args) -> dict:
+    import jieba
+    import logging
+    from benchmarks.bench_splitter import measure
+    from utils.text_splitter.medical_splitter import AdaptiveMedicalSplitter
+    jieba.setLogLevel(logging.WARNING)
+    jieba.initialize()
+    splitter = AdaptiveMedicalSplitter(workers=args.split_workers)
+    try:
+        return measure(splitter, args.seeds, args.chapters, args.repeat)
+    finally:
+        splitter.close()
+
+def bench_ingest(args, embeddings) -> dict:
+    """将合成教材逐个以 load_pdf 入库，文件内容只用于清单记录，页面文本直接传入"""
+    from benchmarks.corpus import make_pages
+    from utils.manifest import Manifest
+    from utils.pdf_loader import load_pdf
+    from vector_store import get_backend
+
+    with quiet(not args.verbose):
+        get_backend().connect()
+    os.makedirs(args.pdf_dir, exist_ok=True)
+    offset = os.path.getsize(os.environ["TRACE_LOG"]) if os.path.exists(os.environ["TRACE_LOG"]) else 0
+    manifest = Manifest()
+    pages_total = chunks_total = 0
+    elapsed = 0.0
+    for i in range(args.books):
+        pages = make_pages(args.seed + i, args.chapters)
+        path = os.path.join(args.pdf_dir, f"合成教材{i + 1}.pdf")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\f".join(pages))
+        start = time.perf_counter()
+        with quiet(not args.verbose):
+            load_pdf(path, embeddings, manifest, split_workers=args.split_workers, pages=pages)
+        elapsed += time.perf_counter() - start
+        pages_total += len(pages)
+        chunks_total += sum(len(ids) for ids in manifest.files[os.path.basename(path)]["chunks"].values())
+
+    # 流水线各阶段并发执行，阶段时间为实际工作时间
+    stages = {}
+    for trace in read_traces(os.environ["TRACE_LOG"], "ingest", offset):
+        for name, seconds in stage_seconds(trace).items():
+            stages[name] = stages.get(name, 0.0) + seconds
+    return {
+        "files": args.books,
+        "pages": pages_total,
+        "chunks": chunks_total,
+        "seconds": elapsed,
+        "chunks_per_sec": chunks_total / elapsed,
+        "pages_per_sec": pages_total / elapsed,
+        "stage_seconds": {name: round(seconds, 4) for name, seconds in sorted(stages.items())},
+    }
+
+def make_agent(args, embeddings):
+    """知识库已由 bench_ingest 入库，ChatAgent 初始化时只打开collection；embedding模型替换为模拟实现"""
+    from chat_agent import ChatAgent
+
+    class BenchAgent(ChatAgent):
+        @staticmethod
+        def _load_embeddings():
+            return embeddings
+
+    with quiet(not args.verbose):
+        return BenchAgent(args.pdf_dir)
+
+def run_user(agent, questions: list) -> list:
+    """一个模拟用户依次提问（独立的对话记忆），返回每次提问的 (首个片段延迟, 完整回答延迟, 是否出错)"""
+    from utils.conversation_memory import ConversationMemory
+    memory = ConversationMemory()
+    results = []
+    for question in questions:
+        start = time.perf_counter()
+        first = None
+        parts = []
+        for text in agent.chat(question, memory):
+            if first is None:
+                first = time.perf_counter() - start
+            parts.append(text)
+        results.append((first or 0.0, time.perf_counter() - start, "".join(parts).startswith("错误:")))
+    return results
+
+def bench_chat(args, agent) -> dict:
+    trace_log = os.environ["TRACE_LOG"]
+    # 预热：首次检索时按需加载collection
+    run_user(agent, make_questions(args.seed + 1000, args.warmup))
+    offset = os.path.getsize(trace_log) if os.path.exists(trace_log) else 0
+
+    questions = make_questions(args.seed, args.users * args.queries)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        per_user = list(executor.map(lambda i: run_user(agent, questions[i::args.users]), range(args.users)))
+    wall = time.perf_counter() - start
+    results = [result for user in per_user for result in user]
+
+    traces = read_traces(trace_log, "chat", offset)
+    stages = [stage_seconds(trace) for trace in traces]
+    retrieval = [sum(totals.get(name, 0.0) for name in RETRIEVAL_STAGES) for totals in stages]
+    return {
+        "users": args.users,
+        "queries": len(results),
+        "errors": sum(1 for *_, failed in results if failed),
+        "statuses": {status: sum(1 for trace in traces if trace["status"] == status)
+                     for status in sorted({trace["status"] for trace in traces})},
+        "seconds": wall,
+        "qps": len(results) / wall,
+        "retrieval": percentiles(retrieval),
+        "stages": {name: percentiles([totals.get(name, 0.0) for totals in stages])
+                   for name in RETRIEVAL_STAGES + ("prompt", "llm_first_token", "llm_total")},
+        "first_chunk": percentiles([first for first, _, _ in results]),
+        "end_to_end": percentiles([total for _, total, _ in results]),
+    }
+
+# 对比时列出的指标：(路径, 名称, 越大越好)
+HEADLINES = [
+    (("splitter", "chars_per_sec"), "分割 字/秒", True),
+    (("splitter", "chunks_per_sec"), "分割 块/秒", True),
+    (("ingest", "chunks_per_sec"), "入库 块/秒", True),
+    (("chat", "retrieval", "p50_ms"), "检索 p50 ms", False),
+    (("chat", "retrieval", "p95_ms"), "检索 p95 ms", False),
+    (("chat", "retrieval", "p99_ms"), "检索 p99 ms", False),
+    (("chat", "first_chunk", "p95_ms"), "首片段 p95 ms", False),
+    (("chat", "end_to_end", "p95_ms"), "完整回答 p95 ms", False),
+    (("chat", "qps"), "问答/秒", True),
+]
+
+def _lookup(results: dict, path: tuple):
+    for key in path:
+        if not isinstance(results, dict) or key not in results:
+            return None
+        results = results[key]
+    return results
+
+def print_report(results: dict, baseline: dict = None):
+    base_results = (baseline or {}).get("results", {})
+    header = f"{'指标':<16}{'本次':>14}"
+    if baseline:
+        header += f"{'基线':>14}{'变化':>10}"
+    print(header)
+    for path, name, higher_better in HEADLINES:
+        value = _lookup(results, path)
+        if value is None:
+            continue
+        line = f"{name:<16}{value:>14.1f}"
+        base = _lookup(base_results, path)
+        if baseline and base:
+            change = (value - base) / base
+            worse = change < 0 if higher_better else change > 0
+            line += f"{base:>14.1f}{change:>+9.1%}{' ✗' if worse and abs(change) >= 0.1 else ''}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准测试套件")
+    parser.add_argument("--stages", nargs="*", default=list(STAGES), choices=STAGES,
+                        help="要运行的测试（chat 会先运行 ingest 建立知识库）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seeds", type=int, default=8, help="分割器测试的合成文本份数")
+    parser.add_argument("--chapters", type=int, default=10, help="每份合成文本的章数")
+    parser.add_argument("--repeat", type=int, default=3, help="分割器测试重复次数，取最快一次")
+    parser.add_argument("--split-workers", type=int, default=None, help="分词进程数")
+    parser.add_argument("--books", type=int, default=3, help="入库的合成教材数量")
+    parser.add_argument("--users", type=int, default=4, help="并发的模拟用户数")
+    parser.add_argument("--queries", type=int, default=10, help="每个用户的提问次数")
+    parser.add_argument("--warmup", type=int, default=3, help="正式计时前的预热提问次数")
+    parser.add_argument("--llm-first-delay", type=float, default=0.0, help="模拟LLM的首片段延迟（秒）")
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.0, help="模拟LLM的片段间隔（秒）")
+    parser.add_argument("--answer-cache", action="store_true", help="启用答案缓存（默认关闭，避免重复问题命中缓存）")
+    parser.add_argument("--workdir", help="数据文件目录（默认使用临时目录并在结束后删除）")
+    parser.add_argument("--output", help="结果JSON路径，默认 ./benchmark_results/<提交>.json")
+    parser.add_argument("--baseline", help="用于对比的另一次结果JSON")
+    parser.add_argument("--verbose", action="store_true", help="显示入库和初始化过程的输出")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    commit = git_commit()
+    output = os.path.abspath(args.output or os.path.join("benchmark_results", f"{commit[:12] or 'unknown'}.json"))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    with contextlib.ExitStack() as stack:
+        workdir = os.path.abspath(args.workdir) if args.workdir else stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(workdir, exist_ok=True)
+        isolate(workdir, args)
+        stack.callback(os.chdir, cwd)
+        args.pdf_dir = os.path.join(workdir, "data")
+
+        from benchmarks.fake_embedding import HashEmbedder
+        embeddings = HashEmbedder()
+        results = {}
+        if "splitter" in args.stages:
+            print("分割器吞吐量...")
+            results["splitter"] = bench_splitter(args)
+        if "ingest" in args.stages or "chat" in args.stages:
+            print("入库速度...")
+            results["ingest"] = bench_ingest(args, embeddings)
+        if "chat" in args.stages:
+            print(f"并发问答（{args.users} 个用户 × {args.queries} 次提问）...")
+            agent = make_agent(args, embeddings)
+            try:
+                results["chat"] = bench_chat(args, agent)
+            finally:
+                agent.search_executor.shutdown(wait=False)
+                agent.memory_summarizer.close()
+
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "args": {key: value for key, value in vars(args).items() if key != "pdf_dir"},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print()
+    print_report(results, baseline)
+    print(f"\n结果已写入 {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""向量索引调优：在真实知识库数据上比较候选索引配置的召回率与延迟，并记录每个collection的最优配置
+
+对每个collection：读出全部向量，复制到临时collection中，依次构建候选索引，以精确检索结果为基准
+计算 recall@k，并逐条检索统计 p50/p99 延迟。召回率达到目标的配置中选 p99 最低的一个，
+记入 index_configs.json 并重建原collection的索引（--dry-run 时只输出结果）。
+
+用法：
+    python -m benchmarks.tune_index                          # 调优所有collection
+    python -m benchmarks.tune_index medical_kb_xxx --recall 0.98
+    python -m benchmarks.tune_index --questions questions.txt # 用真实问题作为查询（每行一个）
+    python -m benchmarks.tune_index --auto                   # 不调优，只按数据量重新选择索引
+"""
+import argparse
+import json
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from embedding_model.projection import get_projection
+from utils.compact_schema import iter_rows, layout_of
+from vector_store import FieldSpec, get_backend
+from vector_store.index_policy import IndexConfig, candidate_configs, ensure_index, get_registry
+
+def read_vectors(collection, batch_size: int = 1000) -> np.ndarray:
+    """读出collection的全部向量（float16向量还原为float32）"""
+    rows = iter_rows(collection, "id >= 0", ["id", "embedding"], batch_size)
+    return np.asarray([row["embedding"] for row in rows], dtype=np.float32)
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int, block: int = 65536) -> np.ndarray:
+    """精确L2检索，返回每个查询的前k个向量下标"""
+    norms = np.einsum('ij,ij->i', vectors, vectors)
+    results = []
+    for query in queries:
+        distances = np.concatenate([
+            norms[i:i + block] - 2 * (vectors[i:i + block] @ query) for i in range(0, len(vectors), block)
+        ])
+        top = np.argpartition(distances, k - 1)[:k]
+        results.append(top[np.argsort(distances[top])])
+    return np.asarray(results)
+
+def make_queries(vectors: np.ndarray, count: int, questions: str = None, seed: int = 0,
+                 projection=None) -> np.ndarray:
+    """questions 的问题向量按 projection（collection的降维投影）处理后才能与库中向量比较"""
+    if questions:
+        from embedding_model import embedding_model
+        with open(questions, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f if line.strip()]
+        queries = np.asarray([embedding_model.embed_query(line) for line in lines[:count]], dtype=np.float32)
+        return queries if projection is None else projection.apply(queries)
+    # 没有真实问题时从库中抽样文本块向量作为查询
+    rng = np.random.default_rng(seed)
+    return vectors[rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)]
+
+def create_scratch(store, name: str, vectors: np.ndarray, batch_size: int = 1000):
+    """创建临时collection，row 字段记录向量在原数组中的下标"""
+    if store.has_collection(name):
+        store.drop_collection(name)
+    fields = [
+        FieldSpec(name="id", dtype="int64", is_primary=True, auto_id=True),
+        FieldSpec(name="row", dtype="int64"),
+        FieldSpec(name="embedding", dtype="float_vector", dim=vectors.shape[1]),
+    ]
+    collection = store.create_collection(name, fields, IndexConfig("FLAT").index_params, "index tuning scratch")
+    for i in range(0, len(vectors), batch_size):
+        collection.insert([list(range(i, min(i + batch_size, len(vectors)))), vectors[i:i + batch_size].tolist()])
+    collection.flush()
+    return collection
+
+def measure(collection, config: IndexConfig, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict:
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = collection.search([query.tolist()], "embedding", config.search_params, limit=k,
+                                    output_fields=["row"])
+        latencies.append(time.perf_counter() - start)
+        found = {hit.get("row") for hit in results[0]}
+        hits += len(found & set(expected.tolist()))
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "config": config.label(),
+        "recall": hits / truth.size,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+def pick_winner(results: List[Tuple[IndexConfig, Dict]], target_recall: float) -> Tuple[IndexConfig, Dict]:
+    """召回率达标的配置中选 p99 最低的，都不达标时选召回率最高的"""
+    passing = [item for item in results if item[1]["recall"] >= target_recall]
+    if passing:
+        return min(passing, key=lambda item: (item[1]["p99_ms"], item[1]["p50_ms"]))
+    return max(results, key=lambda item: (item[1]["recall"], -item[1]["p99_ms"]))
+
+def tune_collection(store, name: str, args) -> Dict:
+    collection = store.open_collection(name)
+    if layout_of(collection).binary:
+        # 二值向量检索后按float16副本重排，候选配置只适用于浮点向量
+        print(f"{name}: 二值向量collection，跳过（索引按数据量自动选择）")
+        return {}
+    vectors = read_vectors(collection)
+    if len(vectors) < args.k:
+        print(f"{name}: 只有 {len(vectors)} 个向量，跳过")
+        return {}
+    queries = make_queries(vectors, args.queries, args.questions, projection=get_projection(name))
+    truth = exact_top_k(vectors, queries, args.k)
+    print(f"\n{name}: {len(vectors)} 个向量, {len(queries)} 个查询, recall@{args.k}")
+
+    scratch = create_scratch(store, f"{name}__tune", vectors)
+    results = []
+    try:
+        current_build = None
+        for config in candidate_configs(len(vectors), store.index_types):
+            build = (config.index_type, json.dumps(config.build, sort_keys=True))
+            if build != current_build:
+                store.set_index(scratch, config.index_params)
+                current_build = build
+            metrics = measure(scratch, config, queries, truth, args.k)
+            results.append((config, metrics))
+            print(f"  {metrics['config']:<45} recall {metrics['recall']:.3f}  "
+                  f"p50 {metrics['p50_ms']:.2f} ms  p99 {metrics['p99_ms']:.2f} ms")
+    finally:
+        store.drop_collection(scratch.name)
+
+    winner, metrics = pick_winner(results, args.recall)
+    print(f"  → 最优: {metrics['config']} (recall {metrics['recall']:.3f}, p99 {metrics['p99_ms']:.2f} ms)")
+    if not args.dry_run:
+        store.set_index(collection, winner.index_params)
+        get_registry().record(name, winner, len(vectors), "tuned", recall=metrics["recall"],
+                              p50_ms=metrics["p50_ms"], p99_ms=metrics["p99_ms"], k=args.k)
+    return {"rows": len(vectors), "winner": metrics, "candidates": [m for _, m in results]}
+
+def main():
+    parser = argparse.ArgumentParser(description="向量索引调优")
+    parser.add_argument("collections", nargs="*", help="要调优的collection，默认全部")
+    parser.add_argument("--k", type=int, default=12, help="recall@k 的 k（默认与检索数量一致）")
+    parser.add_argument("--queries", type=int, default=200, help="查询数量")
+    parser.add_argument("--questions", help="真实问题文件，每行一个")
+    parser.add_argument("--recall", type=float, default=0.95, help="目标召回率")
+    parser.add_argument("--dry-run", action="store_true", help="只输出结果，不修改索引和配置")
+    parser.add_argument("--auto", action="store_true", help="不调优，只按数据量重新选择索引")
+    parser.add_argument("--output", help="将全部测量结果写入JSON文件")
+    args = parser.parse_args()
+
+    store = get_backend()
+    store.connect()
+    names = args.collections or sorted(name for name in store.list_collections()
+                                       if name.startswith("medical_") and not name.endswith("__tune"))
+    report = {}
+    for name in names:
+        if args.auto:
+            config = ensure_index(store.open_collection(name), store)
+            print(f"{name}: {config.label() if config else '索引无需变化'}")
+            continue
+        report[name] = tune_collection(store, name, args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
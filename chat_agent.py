@@ -1,50 +1,124 @@
 from dotenv import load_dotenv
 import os
 import re
+import time
 import jieba
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # 初始化环境变量
 load_dotenv()
 
+# 单次检索的总时限（秒），超时未返回的集合将被跳过
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "5"))
+# 检索时需要先加载collection的额外时限（秒）
+COLLECTION_LOAD_TIMEOUT = float(os.getenv("COLLECTION_LOAD_TIMEOUT", "60"))
+# 是否启用答案缓存
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") != "0"
+# 生成回答的LLM：gemini（带连接池、超时、重试和对冲的REST客户端）、genai（google-generativeai SDK），
+# 或 fake（进程内模拟，不调用外部服务，用于测试）
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+# 生成参数
+GENERATION_CONFIG = {
+    "temperature": 0.4,
+    "top_p": 1,
+    "top_k": 40,
+    "max_output_tokens": 65536,
+}
+
 class ChatAgent:
-    def __init__(self, pdf_dir, specific_files=None):
+    def __init__(self, pdf_dir, specific_files=None, workers=1):
         # 延迟导入其他模块
         from main import print_with_loading_clear
         print_with_loading_clear("正在加载必要组件...")
         
-        import google.generativeai as genai
-        import jieba
-        from pymilvus import connections, Collection, utility
-        from utils.pdf_loader import load_pdfs
-        from embedding_model import embedding_model
-        
-        # 设置日志级别
-        import logging
-        jieba.setLogLevel(logging.WARNING)
-        
-        try:
-            connections.connect("default", host="localhost", port="19530")
-        except Exception as e:
-            print("正在连接 Milvus 服务器...")
-            connections.connect("default", host="localhost", port="19530")
+        from utils.pdf_loader import load_pdfs, is_single_collection
+        from utils.startup import StartupTimer, WARMUP_THREADS, init_jieba
+        from utils.collection_manager import CollectionManager, LAZY_LOAD
 
         # Gemini API 配置
+        from utils.llm_client import LLM_BASE_URL
         api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
+        # 使用本地模拟的LLM或模拟服务（LLM_BASE_URL 指向本机）时不需要API Key
+        uses_google = LLM_BACKEND == "genai" or (LLM_BACKEND == "gemini" and "googleapis.com" in LLM_BASE_URL)
+        if not api_key and uses_google:
             raise ValueError("GEMINI_API_KEY environment variable not set.")
-        genai.configure(api_key=api_key, transport="rest")
 
-        # 生成参数配置
-        self.model = genai.GenerativeModel(
-            model_name='gemini-2.0-flash-thinking-exp-01-21',
-            generation_config={
-                "temperature": 0.4,
-                "top_p": 1,
-                "top_k": 40,
-                "max_output_tokens": 65536,
-            }
+        # 互不依赖的预热任务并发执行：embedding模型、jieba词典、Gemini客户端在后台线程加载，
+        # 主线程连接向量库并打开collection
+        self.startup_timer = StartupTimer()
+        warmup = ThreadPoolExecutor(max_workers=WARMUP_THREADS, thread_name_prefix="warmup")
+        embeddings_future = warmup.submit(self.startup_timer.timed("embedding模型", self._load_embeddings))
+        warmup.submit(self.startup_timer.timed("jieba词典", init_jieba))
+        if LLM_BACKEND == "fake":
+            from utils.fake_llm import FakeModel
+            self._model_future = warmup.submit(self.startup_timer.timed("模拟LLM", FakeModel))
+        else:
+            self._model_future = warmup.submit(self.startup_timer.timed("Gemini客户端", self._init_model, api_key))
+        warmup.shutdown(wait=False)
+
+        # 初始化或加载知识库
+        self.collections = {}
+        self.pdf_dir = pdf_dir
+        
+        # 加载PDF文件（只有需要入库时才等待embedding模型）；按需加载模式下collection在首次检索时才加载
+        self.single_collection = is_single_collection()
+        self.specific_files = specific_files
+        with self.startup_timer.phase("向量库与知识库"):
+            self.collections = load_pdfs(pdf_dir, specific_files, workers,
+                                         get_embeddings=embeddings_future.result, load=not LAZY_LOAD)
+        if not self.collections:
+            print("警告: 未能加载任何PDF文件")
+
+        # 跟踪已加载collection的内存占用，超出预算时释放最久未使用的
+        self.collection_manager = CollectionManager(on_event=self._report_collection_event)
+        if not LAZY_LOAD or self.single_collection:
+            for collection in {c.name: c for c in self.collections.values()}.values():
+                self.collection_manager.track_loaded(collection)
+            
+        # 等待embedding模型就绪后即可开始检索
+        self.embeddings = embeddings_future.result()
+        
+        # 单用户模式的对话记忆；早先对话在后台压缩为摘要
+        from utils.conversation_memory import ConversationMemory, MemorySummarizer, MEMORY_SUMMARIZER
+        self.memory = ConversationMemory()
+        self.memory_summarizer = MemorySummarizer(
+            self._summarize_with_llm if MEMORY_SUMMARIZER == "llm" and LLM_BACKEND != "fake" else None
+        )
+
+        # 最近一次提问的阶段耗时记录（--profile 时打印）
+        self.last_trace = None
+
+        # 答案缓存
+        from utils.answer_cache import AnswerCache
+        self.answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
+
+        # 各集合的索引配置（决定检索参数）
+        from vector_store.index_policy import get_registry
+        self.index_registry = get_registry()
+
+        # 并行检索各个集合的线程池
+        self.search_timeout = SEARCH_TIMEOUT
+        self.search_executor = ThreadPoolExecutor(
+            max_workers=min(32, max(1, len(self.collections))),
+            thread_name_prefix="search"
         )
-        # self.model = genai.GenerativeModel(
+
+    @staticmethod
+    def _load_embeddings():
+        from embedding_model import embedding_model
+        return embedding_model
+
+    @staticmethod
+    def _init_model(api_key):
+        from utils.llm_client import LLM_MODEL
+        if LLM_BACKEND == "gemini":
+            from utils.llm_client import GeminiClient
+            return GeminiClient(api_key, LLM_MODEL, GENERATION_CONFIG)
+
+        import google.generativeai as genai
+        genai.configure(api_key=api_key, transport="rest")
+        return genai.GenerativeModel(model_name=LLM_MODEL, generation_config=GENERATION_CONFIG)
+        # return genai.GenerativeModel(
         #     model_name='gemini-2.0-pro-exp',
         #     generation_config={
         #         "temperature": 0.2,
@@ -54,76 +128,195 @@ class ChatAgent:
         #     }
         # )
 
-        # 初始化或加载知识库
-        self.collections = {}
-        self.pdf_dir = pdf_dir
+    @property
+    def model(self):
+        """Gemini模型，首次提问时若后台初始化尚未完成则等待"""
+        return self._model_future.result()
+
+    def llm_stats(self):
+        """LLM客户端的请求统计；客户端尚未初始化完成或不提供统计时返回 None"""
+        if not self._model_future.done() or self._model_future.exception() is not None:
+            return None
+        stats = getattr(self.model, "stats", None)
+        return stats() if stats else None
+
+    def _summarize_with_llm(self, prompt):
+        """生成对话摘要（在后台线程中调用，不使用流式输出）"""
+        from utils.conversation_memory import MEMORY_SUMMARY_TOKENS
+        response = self.model.generate_content(
+            prompt, generation_config={"temperature": 0.2, "max_output_tokens": MEMORY_SUMMARY_TOKENS * 4}
+        )
+        return response.text
+
+    @staticmethod
+    def _report_collection_event(event):
+        from main import print_with_loading_clear
+        from utils.collection_manager import format_event
+        print_with_loading_clear(format_event(event))
+
+    def _search_collection(self, filename, collection, query_embedding, trace=None):
+        """在单个集合中检索（未加载时先加载），返回统一格式的文档列表
+
+        紧凑结构的collection不返回文本（page_content 为 None），选出最终结果后再由 fill_contents 读取。
+        """
+        from utils.compact_schema import search
+        from utils.tracing import maybe_span
+        with maybe_span(trace, "search", collection=filename), self.collection_manager.use(collection) as collection:
+            hits = search(
+                collection,
+                query_embedding,
+                self.index_registry.search_params(collection.name),  # 按该集合的索引类型选择检索参数
+                limit=4,  # 每个文件取前4个最相关的结果
+                output_fields=["chunk_index", "chunk_total", "content"],
+                timeout=self.search_timeout
+            )
         
-        # 加载PDF文件
-        self.collections = load_pdfs(pdf_dir, specific_files)
+        docs = []
+        for hit in hits:
+            docs.append({
+                'page_content': hit['fields'].get('content'),
+                'metadata': {
+                    'id': hit['id'],
+                    'source': filename,
+                    'chunk_index': hit['fields'].get('chunk_index'),
+                    'chunk_total': hit['fields'].get('chunk_total'),
+                    'score': hit['score']  # 添加相似度分数
+                }
+            })
+        return docs
+
+    def _search_consolidated(self, query_embedding, trace=None):
+        """单集合模式：一次检索覆盖所有已加载的文件，按source过滤"""
+        from utils.compact_schema import search
+        from utils.pdf_loader import source_expr
+        from utils.tracing import maybe_span
         if not self.collections:
-            print("警告: 未能加载任何PDF文件")
-            
-        # 初始化embedding模型
-        self.embeddings = embedding_model
+            return []
+        collection = next(iter(self.collections.values()))
+        with maybe_span(trace, "search", collection=collection.name), \
+                self.collection_manager.use(collection) as collection:
+            hits = search(
+                collection,
+                query_embedding,
+                self.index_registry.search_params(collection.name),
+                limit=12,
+                expr=source_expr(self.collections.keys()),
+                output_fields=["source", "chunk_index", "chunk_total", "content"],
+                timeout=self.search_timeout
+            )
+        
+        docs = []
+        for hit in hits:
+            docs.append({
+                'page_content': hit['fields'].get('content'),
+                'metadata': {
+                    'id': hit['id'],
+                    'source': hit['fields'].get('source'),
+                    'chunk_index': hit['fields'].get('chunk_index'),
+                    'chunk_total': hit['fields'].get('chunk_total'),
+                    'score': hit['score']
+                }
+            })
+        return docs
+
+    def _search_all(self, query_embedding, trace=None):
+        """并发检索所有集合，超过时限或出错的集合被跳过"""
+        futures = {
+            self.search_executor.submit(
+                self._search_collection, filename, collection, query_embedding, trace
+            ): filename
+            for filename, collection in self.collections.items()
+        }
+        # 有尚未加载的collection时，为加载留出额外时间
+        timeout = self.search_timeout
+        if not all(self.collection_manager.is_loaded(c) for c in self.collections.values()):
+            timeout += COLLECTION_LOAD_TIMEOUT
+        done, not_done = wait(futures, timeout=timeout)
+        
+        all_results = []
+        skipped = []
+        for future in not_done:
+            future.cancel()
+            skipped.append(futures[future])
+        for future in done:
+            try:
+                all_results.extend(future.result())
+            except Exception:
+                skipped.append(futures[future])
         
-        self.chat_history = []
-        self.max_history = 10
+        if skipped and trace is not None:
+            trace.set(skipped=sorted(skipped))
+        if skipped:
+            from main import print_with_loading_clear
+            print_with_loading_clear(f"警告: 以下资料检索超时或失败，已跳过: {', '.join(sorted(skipped))}")
+        return all_results
 
-    def chat(self, query):
+    def chat(self, query, memory=None):
+        """回答问题，逐段生成回答文本
+
+        memory 为该会话的对话记忆（ConversationMemory，会被更新），默认使用单用户模式的 self.memory。
+        """
+        from utils.tracing import Trace
+        memory = self.memory if memory is None else memory
+        # 各阶段耗时记入 trace；生成器被关闭（客户端断开或 Ctrl-C）时状态为 cancelled
+        trace = self.last_trace = Trace("chat", query_chars=len(query))
+        status = "cancelled"
         try:
-            search_params = {
-                "metric_type": "L2",
-                "params": {"nprobe": 16}
-            }
+            with trace.span("embed"):
+                query_embedding = self.embeddings.embed_query(query)
+
+            # 历史对话：早先对话的摘要加上预算内的近期对话原文；追问的答案依赖历史，缓存按历史区分
+            summary_text, recent_text, memory_stats = memory.render()
+            history_text = summary_text + recent_text
+            from utils.answer_cache import history_digest
+            history_key = history_digest(history_text)
             
-            # 在所有加载的collections中搜索
-            all_results = []
-            query_embedding = self.embeddings.embed_query(query)
+            # 语义相近的问题直接返回缓存答案
+            if self.answer_cache:
+                with trace.span("cache_lookup", kind="semantic"):
+                    answer = self.answer_cache.lookup_semantic(query_embedding, self.collections.keys(),
+                                                               history_key)
+                if answer is not None:
+                    status = "cached"
+                    memory.record_report({"cached": True})
+                    self._record_history(query, answer, memory)
+                    yield answer
+                    return
             
-            for filename, collection in self.collections.items():
-                results = collection.search(
-                    [query_embedding], 
-                    "embedding",
-                    search_params,
-                    limit=4,  # 每个文件取前4个最相关的结果
-                    output_fields=["chunk_index", "chunk_total", "content"]
-                )
-                
-                for hits in results:
-                    for hit in hits:
-                        doc = {
-                            'page_content': hit.get('content'),
-                            'metadata': {
-                                'source': filename,
-                                'chunk_index': hit.get('chunk_index'),
-                                'chunk_total': hit.get('chunk_total'),
-                                'score': hit.score  # 添加相似度分数
-                            }
-                        }
-                        all_results.append(doc)
+            # 在所有加载的collections中并发搜索
+            with trace.span("search_all", collections=len(self.collections)) as attrs:
+                if self.single_collection:
+                    all_results = self._search_consolidated(query_embedding, trace)
+                else:
+                    all_results = self._search_all(query_embedding, trace)
+                attrs["hits"] = len(all_results)
             
             # 根据相似度分数排序,取最相关的内容
-            all_results.sort(key=lambda x: x['metadata']['score'])
-            filtered_docs = all_results[:12]  # 取总体最相关的12个结果
-
-            # Milvus返回的结果处理
-            context = ""
-            current_length = 0
-            max_length = min(8000, 3000 + len(query) * 10)
-            
-            for doc in filtered_docs:
-                content = doc['page_content']
-                if current_length + len(content) > max_length:
-                    break
-                context += f"\n\n{content}"
-                current_length += len(content)
+            with trace.span("merge"):
+                all_results.sort(key=lambda x: x['metadata']['score'])
+                filtered_docs = all_results[:12]  # 取总体最相关的12个结果
             
-            # 构建提示词
-            history_text = ""
-            if self.chat_history:
-                history_text = "\n历史对话：\n" + "\n".join(
-                    f"问：{q}\n答：{a}" for q, a in self.chat_history
-                )
+            # 相同问题且检索到相同资料时直接返回缓存答案
+            chunk_ids = [f"{doc['metadata']['source']}:{doc['metadata']['id']}" for doc in filtered_docs]
+            if self.answer_cache:
+                with trace.span("cache_lookup", kind="exact"):
+                    answer = self.answer_cache.lookup(query, chunk_ids, history_key)
+                if answer is not None:
+                    status = "cached"
+                    memory.record_report({"cached": True})
+                    self._record_history(query, answer, memory)
+                    yield answer
+                    return
+
+            # 紧凑结构的collection只为最终选出的文本块读取内容
+            from utils.compact_schema import fill_contents
+            with trace.span("fetch_content"):
+                fill_contents(filtered_docs, self.collections)
+
+            prompt_start = time.perf_counter()
+            # 拼接参考资料：相邻且重叠的文本块合并去重，按token预算放入
+            from utils.context_builder import build_context, context_budget
+            context, context_stats = build_context(filtered_docs, context_budget(query))
 
             prompt = f"""作为教学助手，你的回答应当帮助学习者深入理解。不要有任何开场白或过渡语，只输出正文。
             注重知识点的扩展和联系，保证回答的准确性和完整性。
@@ -154,17 +347,62 @@ class ChatAgent:
 
 问题：{query}"""
 
-            # 生成响应
-            response = self.model.generate_content(prompt)
-            self.chat_history.append((query, response.text))
-            if len(self.chat_history) > self.max_history:
-                self.chat_history = self.chat_history[-self.max_history:]
+            from utils.tokens import estimate_tokens
+            report = {
+                "context": estimate_tokens(context),
+                "summary": estimate_tokens(summary_text),
+                "history": estimate_tokens(recent_text),
+                "query": estimate_tokens(query),
+                "total": estimate_tokens(prompt),
+                "context_saved": context_stats["saved_tokens"],
+                "context_chunks": context_stats["chunks"],
+                "context_spans": context_stats["spans"],
+                **memory_stats,
+            }
+            report["instructions"] = report["total"] - report["context"] - report["summary"] \
+                - report["history"] - report["query"]
+            memory.record_report(report)
+            trace.add_span("prompt", prompt_start, time.perf_counter(), tokens=report["total"])
+
+            # 流式生成响应，逐块输出；分别记录首个片段的等待时间和生成总耗时
+            llm_start = time.perf_counter()
+            response = self.model.generate_content(prompt, stream=True)
+            parts = []
+            for chunk in response:
+                if not chunk.parts:
+                    continue
+                if not parts:
+                    trace.add_span("llm_first_token", llm_start, time.perf_counter())
+                parts.append(chunk.text)
+                yield chunk.text
             
-            yield response.text
+            # 只有完整生成的回答才记入历史和缓存（中途取消时生成器被关闭，不会执行到这里）
+            answer = "".join(parts)
+            trace.add_span("llm_total", llm_start, time.perf_counter(), chars=len(answer))
+            status = "ok"
+            self._record_history(query, answer, memory)
+            if self.answer_cache:
+                self.answer_cache.store(
+                    query, chunk_ids,
+                    sources=[doc['metadata']['source'] for doc in filtered_docs],
+                    scope=self.collections.keys(),
+                    query_embedding=query_embedding,
+                    answer=answer,
+                    history=history_key
+                )
             
         except Exception as e:
+            status = "error"
+            trace.set(error=str(e))
             yield f"错误: {str(e)}"
+        finally:
+            trace.finish(status)
     
+    def _record_history(self, query, answer, memory):
+        """记录对话历史，超出token预算的早先对话交给后台线程并入摘要"""
+        memory.add(query, answer)
+        self.memory_summarizer.schedule(memory)
+
     def _evaluate_doc_quality(self, content: str, query: str) -> float:
         """评估文档质量"""
         indicators = {
@@ -179,33 +417,23 @@ class ChatAgent:
         return min(1.0, final_score)
     
     def update_knowledge_base(self, pdf_dir):
-        """更新知识库"""
-        from utils.pdf_loader import load_pdf, get_pdf_files
-        from pymilvus import utility, Collection
+        """增量更新知识库：新增文件全量入库，修改的文件只更新变化的文本块，删除的文件移出知识库"""
+        from utils.pdf_loader import sync_knowledge_base
 
-        current_files = get_pdf_files(pdf_dir)
-        if not current_files:
-            print(f"警告: {pdf_dir} 目录下没有找到PDF文件")
+        labels = {"added": "新增", "updated": "已更新", "removed": "已移除"}
+        changes = sync_knowledge_base(pdf_dir, self.collections, self.specific_files)
+        # 已删除的collection不再计入内存占用；新增和更新的collection先释放，下次检索时按需加载
+        self.collection_manager.retain(self.collections.values())
+        if not self.single_collection:
+            for file, change in changes.items():
+                if change in ("added", "updated"):
+                    self.collection_manager.release(self.collections[file])
+        if not changes:
+            print("知识库已是最新")
             return
-
-        processed_files = set()
-        collection_name = "medical_knowledge_base"  # 假设集合名称是固定的
-        if utility.has_collection(collection_name):
-            collection = Collection(collection_name)
-            collection.load()
-            for entity in collection.query(expr='id >= 0', output_fields=['source']):
-                processed_files.add(entity['source'])
-
-        new_files = current_files - processed_files
-
-        if new_files:
-            print("检测到新增PDF文件，进行增量更新...")
-            for file in new_files:
-                pdf_path = os.path.join(pdf_dir, file)
-                load_pdf(pdf_path, self.vectorstore, self.embeddings)
-            print("知识库已更新")
-        else:
-            print("未检测到新增PDF文件")
+        for file, change in sorted(changes.items()):
+            print(f"  [{labels.get(change, change)}] {file}")
+        print("知识库已更新")
 
 # Prompt with Markdown
 #             **为了优化Markdown结构，请注意以下几点以提升文档质量：**
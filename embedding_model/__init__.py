@@ -1 +1,6 @@
-from .embedding import embedding_model
\ No newline at end of file
+def __getattr__(name):
+    # 按需加载模型：导入 embedding_model.projection 等子模块时不触发模型加载
+    if name == "embedding_model":
+        from .embedding import embedding_model
+        return embedding_model
+    raise AttributeError(name)
@@ -0,0 +1,180 @@
+import inspect
+import json
+import os
+from typing import List, Tuple
+import numpy as np
+
+MODEL_NAME = "TencentBAC/Conan-embedding-v1"
+MODEL_CACHE_DIR = "./embeddings_cache"
+NORMALIZE_EMBEDDINGS = True
+
+# 向量化后端：torch（默认，PyTorch原始精度）、torch-int8（PyTorch动态int8量化）、
+# onnx（导出的ONNX Runtime模型）、onnx-int8（ONNX Runtime动态int8量化）
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+# 推理线程数，0 表示使用库的默认值（通常为物理核数）
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# 导出的ONNX模型目录
+ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "./embeddings_cache/onnx")
+# 与原始模型输出的最小余弦相似度，低于该值时放弃加速后端，回退到 torch
+PARITY_MIN_COSINE = float(os.getenv("EMBEDDING_PARITY_MIN", "0.99"))
+# ONNX后端的可选依赖 (模块名, pip包名)，见 requirements-onnx.txt；导出模型时还需要 onnx
+ONNX_RUNTIME_PACKAGES = [("onnxruntime", "onnxruntime")]
+ONNX_EXPORT_PACKAGES = [("onnx", "onnx")]
+
+# 一致性校验使用的文本，覆盖短问题、长段落、中英文混排和剂量数值
+PARITY_TEXTS = [
+    "高血压患者能否长期服用阿司匹林？",
+    "β受体阻滞剂的主要不良反应有哪些",
+    "糖尿病肾病的早期诊断指标",
+    "What is the first-line treatment for heart failure?",
+    "华法林（Warfarin Sodium）与多种药物存在相互作用，使用期间需定期监测INR。",
+    "胰岛素的常用剂量为 0.5 U/kg 每日，应根据血糖水平调整。",
+    "第三章 心血管系统药物\n3.1 抗高血压药\n一、血管紧张素转换酶抑制剂（ACEI）可抑制血管紧张素Ⅱ的生成，"
+    "降低外周血管阻力，同时减少醛固酮分泌，适用于各型高血压，尤其是合并糖尿病、心力衰竭的患者。",
+    "肾小球滤过率（GFR）低于30 ml/min时，经肾排泄的药物应减量或延长给药间隔。",
+    "CT和MRI在急性脑卒中诊断中的价值比较",
+    "非甾体抗炎药（NSAID）可引起胃肠道黏膜损伤，严重时导致消化道出血，老年患者及既往有溃疡病史者"
+    "应慎用，必要时合用质子泵抑制剂。长期使用还可能引起肾功能损害和血压升高。",
+    "肝功能不全",
+    "药理作用",
+]
+
+def cosine_parity(vectors, reference) -> Tuple[float, float]:
+    """两组向量逐行余弦相似度的 (最小值, 平均值)"""
+    a = np.asarray(vectors, dtype=np.float32)
+    b = np.asarray(reference, dtype=np.float32)
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return float(cosine.min()), float(cosine.mean())
+
+class SentenceTransformerEncoder:
+    """sentence-transformers 模型（原始精度或动态int8量化的Linear层）"""
+
+    def __init__(self, model, normalize: bool, batch_size: int):
+        self.model = model
+        self.normalize = normalize
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=self.normalize,
+                                 convert_to_numpy=True, show_progress_bar=False).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+class OnnxEncoder:
+    """ONNX Runtime 推理，模型输出即 sentence-transformers 的 sentence_embedding（含池化与Dense层）"""
+
+    def __init__(self, model_dir: str, filename: str, normalize: bool, batch_size: int, threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        with open(os.path.join(model_dir, "export.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(model_dir, filename), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_length = self.meta["max_seq_length"]
+        self.normalize = normalize
+        self.batch_size = batch_size
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        outputs = []
+        for i in range(0, len(texts), self.batch_size):
+            features = self.tokenizer(texts[i:i + self.batch_size], padding=True, truncation=True,
+                                      max_length=self.max_length, return_tensors="np")
+            inputs = {name: value.astype(np.int64) for name, value in features.items() if name in self.input_names}
+            outputs.append(self.session.run(None, inputs)[0])
+        vectors = np.concatenate(outputs).astype(np.float32)
+        if self.normalize:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+def require_onnx(backend: str, export: bool):
+    """检查ONNX后端的可选依赖，缺少时报错并给出需要安装的包"""
+    import importlib.util
+    packages = ONNX_RUNTIME_PACKAGES + (ONNX_EXPORT_PACKAGES if export else [])
+    missing = [package for module, package in packages if importlib.util.find_spec(module) is None]
+    if missing:
+        raise ImportError(f"向量化后端 {backend} 需要安装 {', '.join(missing)}，"
+                          f"请执行: pip install -r requirements-onnx.txt")
+
+def set_torch_threads(threads: int = EMBEDDING_THREADS):
+    import torch
+    if threads > 0:
+        torch.set_num_threads(threads)
+
+def load_sentence_transformer(model_name: str, cache_folder: str, device: str = "cpu"):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device=device, cache_folder=cache_folder)
+
+def quantize_torch(model):
+    """对Linear层做动态int8量化（权重int8，激活在推理时按批量化），只适用于CPU"""
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def export_onnx(model, model_name: str, normalize: bool, directory: str = ONNX_DIR) -> str:
+    """导出ONNX模型（fp32与动态int8量化两个版本），并记录与原始模型的一致性，返回导出目录"""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    class _SentenceEmbedding(torch.nn.Module):
+        def __init__(self, inner, input_names):
+            super().__init__()
+            self.inner = inner
+            self.input_names = input_names
+
+        def forward(self, *inputs):
+            return self.inner(dict(zip(self.input_names, inputs)))["sentence_embedding"]
+
+    os.makedirs(directory, exist_ok=True)
+    tokenizer = model.tokenizer
+    sample = tokenizer(PARITY_TEXTS[:2], padding=True, truncation=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    wrapper = _SentenceEmbedding(model.cpu().eval(), input_names)
+    fp32_path = os.path.join(directory, "model.onnx")
+    # torch 2.9 起默认使用dynamo导出器，它不接受 dynamic_axes，这里固定使用基于追踪的导出器
+    export_options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper, tuple(sample[name] for name in input_names), fp32_path,
+            input_names=input_names, output_names=["sentence_embedding"],
+            dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in input_names},
+                          "sentence_embedding": {0: "batch"}},
+            opset_version=14,
+            **export_options,
+        )
+    quantize_dynamic(fp32_path, os.path.join(directory, "model.int8.onnx"), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(directory)
+
+    meta = {"model": model_name, "normalize": normalize, "max_seq_length": model.max_seq_length}
+    with open(os.path.join(directory, "export.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    # 导出时原始模型已在内存中，顺便记录两个版本的一致性，之后启动时无需再加载原始模型
+    reference = model.encode(PARITY_TEXTS, normalize_embeddings=normalize, convert_to_numpy=True)
+    for backend, filename in (("onnx", "model.onnx"), ("onnx-int8", "model.int8.onnx")):
+        encoder = OnnxEncoder(directory, filename, normalize, batch_size=len(PARITY_TEXTS))
+        meta[backend] = dict(zip(("min_cosine", "mean_cosine"),
+                                 cosine_parity(encoder.embed_documents(PARITY_TEXTS), reference)))
+    with open(os.path.join(directory, "export.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return directory
+
+def onnx_exported(model_name: str, directory: str = ONNX_DIR) -> bool:
+    try:
+        with open(os.path.join(directory, "export.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return False
+    return meta.get("model") == model_name and "onnx-int8" in meta
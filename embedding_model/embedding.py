@@ -1,10 +1,28 @@
 from dotenv import load_dotenv
 from langchain_huggingface import HuggingFaceEmbeddings
+from typing import Callable, List, Optional
 import torch
 import os
 
 load_dotenv()
 
+# 后端配置从环境变量读取，需在 load_dotenv 之后导入
+from .backends import (BACKENDS, EMBEDDING_BACKEND, EMBEDDING_THREADS, MODEL_CACHE_DIR, MODEL_NAME,
+                       NORMALIZE_EMBEDDINGS, ONNX_DIR, PARITY_MIN_COSINE, PARITY_TEXTS, OnnxEncoder,
+                       SentenceTransformerEncoder, cosine_parity, export_onnx, load_sentence_transformer,
+                       onnx_exported, quantize_torch, require_onnx, set_torch_threads)
+from .micro_batch import QUERY_BATCHING, MicroBatcher
+
+# 文本块向量的磁盘缓存，EMBEDDING_CACHE=0 时关闭
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") != "0"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embeddings_cache/vectors")
+
+# 批量向量化的默认参数，可通过环境变量调整
+DEFAULT_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+DEFAULT_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "8192"))
+# Conan-embedding-v1 的最大序列长度，超出部分会被截断，不计入预算
+MAX_SEQ_TOKENS = 512
+
 class EmbeddingModel:
     _instance = None
 
@@ -14,16 +32,122 @@ class EmbeddingModel:
             cls._instance.initialize()
         return cls._instance
 
-    def initialize(self):
+    def initialize(self, backend: str = EMBEDDING_BACKEND):
         device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="TencentBAC/Conan-embedding-v1",
-            model_kwargs={'device': device},
-            encode_kwargs={'normalize_embeddings': True},
-            cache_folder="./embeddings_cache"
-        )
+        set_torch_threads()
+        if backend not in BACKENDS:
+            raise ValueError(f"未知的向量化后端: {backend}，可选: {', '.join(BACKENDS)}")
+        # 量化与ONNX后端只用于CPU，有GPU时直接使用原始模型
+        self.backend = backend if device == "cpu" else "torch"
+        self.parity = None  # 加速后端与原始模型的一致性 (最小余弦相似度, 平均余弦相似度)
+        if self.backend == "torch":
+            self.embeddings = HuggingFaceEmbeddings(
+                model_name=MODEL_NAME,
+                model_kwargs={'device': device},
+                encode_kwargs={'normalize_embeddings': NORMALIZE_EMBEDDINGS, 'batch_size': DEFAULT_BATCH_SIZE},
+                cache_folder=MODEL_CACHE_DIR
+            )
+        elif self.backend == "torch-int8":
+            self.embeddings = self._init_torch_int8()
+        else:
+            self.embeddings = self._init_onnx()
+
+        # 并发的查询向量化请求合并为批量计算
+        self.query_batcher = MicroBatcher(self.embeddings.embed_documents) if QUERY_BATCHING else None
+
+        self.cache = None
+        if EMBEDDING_CACHE_ENABLED:
+            from .embedding_cache import EmbeddingCache
+            # 不同后端的输出略有差异，加速后端使用独立的缓存命名空间
+            cache_key = MODEL_NAME if self.backend == "torch" else f"{MODEL_NAME}|{self.backend}"
+            self.cache = EmbeddingCache(EMBEDDING_CACHE_DIR, cache_key, NORMALIZE_EMBEDDINGS)
+
+    def _init_torch_int8(self):
+        model = load_sentence_transformer(MODEL_NAME, MODEL_CACHE_DIR)
+        reference = model.encode(PARITY_TEXTS, normalize_embeddings=NORMALIZE_EMBEDDINGS, convert_to_numpy=True)
+        encoder = SentenceTransformerEncoder(quantize_torch(model), NORMALIZE_EMBEDDINGS, DEFAULT_BATCH_SIZE)
+        self.parity = cosine_parity(encoder.embed_documents(PARITY_TEXTS), reference)
+        if self.parity[0] < PARITY_MIN_COSINE:
+            return self._fallback(SentenceTransformerEncoder(model, NORMALIZE_EMBEDDINGS, DEFAULT_BATCH_SIZE))
+        return encoder
+
+    def _init_onnx(self):
+        model = None
+        exported = onnx_exported(MODEL_NAME)
+        require_onnx(self.backend, export=not exported)
+        if not exported:
+            # 首次使用时导出，之后直接加载导出的模型，无需PyTorch模型
+            model = load_sentence_transformer(MODEL_NAME, MODEL_CACHE_DIR)
+            export_onnx(model, MODEL_NAME, NORMALIZE_EMBEDDINGS)
+        filename = "model.int8.onnx" if self.backend == "onnx-int8" else "model.onnx"
+        encoder = OnnxEncoder(ONNX_DIR, filename, NORMALIZE_EMBEDDINGS, DEFAULT_BATCH_SIZE, EMBEDDING_THREADS)
+        self.parity = (encoder.meta[self.backend]["min_cosine"], encoder.meta[self.backend]["mean_cosine"])
+        if self.parity[0] < PARITY_MIN_COSINE:
+            model = model or load_sentence_transformer(MODEL_NAME, MODEL_CACHE_DIR)
+            return self._fallback(SentenceTransformerEncoder(model, NORMALIZE_EMBEDDINGS, DEFAULT_BATCH_SIZE))
+        return encoder
+
+    def _fallback(self, encoder):
+        """加速后端与原始模型的一致性不达标时回退到原始精度"""
+        print(f"警告: 向量化后端 {self.backend} 与原始模型的最小余弦相似度为 {self.parity[0]:.4f}，"
+              f"低于 {PARITY_MIN_COSINE}，已回退到 torch")
+        self.backend = "torch"
+        return encoder
 
     def embed_query(self, query):
+        if self.query_batcher is not None:
+            return self.query_batcher.embed(query)
         return self.embeddings.embed_query(query)
 
-embedding_model = EmbeddingModel()
\ No newline at end of file
+    def embed_documents(self, texts: List[str], batch_size: int = None,
+                        max_batch_tokens: int = None,
+                        progress: Optional[Callable[[int], None]] = None) -> List[List[float]]:
+        """批量向量化文本，按长度分桶以减少padding浪费，返回顺序与输入一致
+
+        启用磁盘缓存时，内容相同的文本直接读取缓存向量，只对未命中的文本运行模型。
+        """
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        max_batch_tokens = max_batch_tokens or DEFAULT_MAX_BATCH_TOKENS
+
+        if self.cache is not None:
+            results: List[Optional[List[float]]] = self.cache.get_many(texts)
+        else:
+            results = [None] * len(texts)
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if progress and len(missing) < len(texts):
+            progress(len(texts) - len(missing))
+
+        missing_texts = [texts[i] for i in missing]
+        for batch in self._make_batches(missing_texts, batch_size, max_batch_tokens):
+            batch_texts = [missing_texts[i] for i in batch]
+            vectors = self.embeddings.embed_documents(batch_texts)
+            if self.cache is not None:
+                self.cache.put_many(batch_texts, vectors)
+            for i, vector in zip(batch, vectors):
+                results[missing[i]] = vector
+            if progress:
+                progress(len(batch))
+        return results
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """粗略估计token数（中文约一字一token），上限为模型最大序列长度"""
+        return max(1, min(len(text), MAX_SEQ_TOKENS))
+
+    def _make_batches(self, texts: List[str], batch_size: int, max_batch_tokens: int) -> List[List[int]]:
+        """按长度排序后切分批次，每批的 padding 后token数不超过预算"""
+        order = sorted(range(len(texts)), key=lambda i: self._estimate_tokens(texts[i]))
+        batches = []
+        current = []
+        for i in order:
+            # 排序后当前文本即为批内最长，padding 后的总量为 最长长度 × 批大小
+            padded = self._estimate_tokens(texts[i]) * (len(current) + 1)
+            if current and (len(current) >= batch_size or padded > max_batch_tokens):
+                batches.append(current)
+                current = []
+            current.append(i)
+        if current:
+            batches.append(current)
+        return batches
+
+embedding_model = EmbeddingModel()
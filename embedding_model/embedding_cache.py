@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+
+DIGEST_SIZE = 32  # sha256
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+class EmbeddingCache:
+    """磁盘向量缓存：向量存于内存映射的float32数组，另以 文本哈希 → 行号 的索引定位
+
+    以 (模型名称, 是否归一化) 区分命名空间，同一目录下可缓存多个模型的向量。
+    文件只追加写入：先写向量再写哈希，进程中断时不会出现指向缺失向量的索引。
+    """
+
+    def __init__(self, directory: str, model_name: str, normalize: bool):
+        os.makedirs(directory, exist_ok=True)
+        namespace = hashlib.sha1(f"{model_name}|normalize={normalize}".encode('utf-8')).hexdigest()[:16]
+        base = os.path.join(directory, namespace)
+        self._meta_path = base + ".json"
+        self._vectors_path = base + ".f32"
+        self._keys_path = base + ".keys"
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, int] = {}
+        self._mmap: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                self.dim = json.load(f)["dim"]
+        else:
+            with open(self._meta_path, 'w', encoding='utf-8') as f:
+                json.dump({"model": model_name, "normalize": normalize, "dim": None}, f)
+        self._load_index()
+
+    def _load_index(self):
+        if self.dim is None or not os.path.exists(self._keys_path) or not os.path.exists(self._vectors_path):
+            return
+        with open(self._keys_path, 'rb') as f:
+            keys = f.read()
+        rows = min(len(keys) // DIGEST_SIZE, os.path.getsize(self._vectors_path) // (self.dim * 4))
+        # 截掉上次中断写入留下的不完整尾部，保持向量与哈希逐行对齐
+        with open(self._keys_path, 'r+b') as f:
+            f.truncate(rows * DIGEST_SIZE)
+        with open(self._vectors_path, 'r+b') as f:
+            f.truncate(rows * self.dim * 4)
+        for row in range(rows):
+            self._index[keys[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE]] = row
+
+    def _vectors(self) -> np.memmap:
+        """按需（重新）映射向量文件，追加写入后行数增加时重新映射"""
+        rows = len(self._index)
+        if self._mmap is None or self._mmap.shape[0] < rows:
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+        return self._mmap
+
+    def __len__(self):
+        return len(self._index)
+
+    def vectors(self) -> np.ndarray:
+        """全部已缓存的向量（只读内存映射），用于在语料上拟合降维投影"""
+        with self._lock:
+            if not self._index:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            return self._vectors()[:len(self._index)]
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """批量查找，未命中的位置返回 None"""
+        digests = [text_digest(text) for text in texts]
+        with self._lock:
+            rows = [self._index.get(digest) for digest in digests]
+            found = [row for row in rows if row is not None]
+            vectors = self._vectors() if found else None
+            results = [None if row is None else vectors[row].tolist() for row in rows]
+        self.hits += len(found)
+        self.misses += len(texts) - len(found)
+        return results
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """追加写入新向量，已存在的文本跳过"""
+        with self._lock:
+            pending = {}
+            for text, vector in zip(texts, vectors):
+                digest = text_digest(text)
+                if digest not in self._index and digest not in pending:
+                    pending[digest] = vector
+            if not pending:
+                return
+            array = np.asarray(list(pending.values()), dtype=np.float32)
+            if self.dim is None:
+                self.dim = array.shape[1]
+                with open(self._meta_path, 'r+', encoding='utf-8') as f:
+                    meta = json.load(f)
+                    meta["dim"] = self.dim
+                    f.seek(0)
+                    json.dump(meta, f)
+                    f.truncate()
+            with open(self._vectors_path, 'ab') as f:
+                f.write(array.tobytes())
+            with open(self._keys_path, 'ab') as f:
+                f.write(b''.join(pending.keys()))
+            start = len(self._index)
+            for offset, digest in enumerate(pending):
+                self._index[digest] = start + offset
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Callable, Deque, List, Tuple
+
+# 查询向量化的微批处理：有多条请求排队时等待最多 EMBED_QUERY_BATCH_WAIT_MS 毫秒或凑满 EMBED_QUERY_BATCH_MAX 条后一次前向计算
+QUERY_BATCHING = os.getenv("EMBED_QUERY_BATCHING", "1") != "0"
+QUERY_BATCH_MAX = int(os.getenv("EMBED_QUERY_BATCH_MAX", "16"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("EMBED_QUERY_BATCH_WAIT_MS", "5"))
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"mean": 0.0, "p50": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+    return {
+        "mean": sum(ordered) / len(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+
+class MicroBatcher:
+    """将并发的单条向量化请求合并为批量计算，结果按请求分别返回
+
+    模型空闲时队列中只有一条请求则立即计算，单个用户提问不增加等待；
+    有多条请求排队（并发提问，或模型忙于上一批时陆续到达）时，继续等待新请求直到凑满 max_batch 条
+    或距最早请求提交已过 max_wait_ms 再一起计算。
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], List[List[float]]], max_batch: int = QUERY_BATCH_MAX,
+                 max_wait_ms: float = QUERY_BATCH_WAIT_MS, history: int = 1000):
+        self.embed_batch = embed_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Deque[Tuple[str, Future, float]] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        # 统计：批大小分布、每条请求因合批增加的等待时间、每批的计算时间（毫秒）
+        self.batch_sizes: Counter = Counter()
+        self.max_depth = 0
+        self._waits: Deque[float] = deque(maxlen=history)
+        self._compute: Deque[float] = deque(maxlen=history)
+        self._thread = threading.Thread(target=self._run, name="embed-batch", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher 已关闭")
+            self._queue.append((text, future, time.perf_counter()))
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify()
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _collect(self) -> List[Tuple[str, Future, float]]:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return []
+            if len(self._queue) == 1:
+                return [self._queue.popleft()]
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            start = time.perf_counter()
+            try:
+                vectors = self.embed_batch([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+            with self._cond:
+                self.batch_sizes[len(batch)] += 1
+                self._compute.append(elapsed * 1000)
+                self._waits.extend((start - submitted) * 1000 for _, _, submitted in batch)
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        with self._cond:
+            batches = sum(self.batch_sizes.values())
+            items = sum(size * count for size, count in self.batch_sizes.items())
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self.max_depth,
+                "batches": batches,
+                "items": items,
+                "mean_batch": items / batches if batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "wait_ms": _percentiles(self._waits),
+                "compute_ms": _percentiles(self._compute),
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+def format_batch_stats(stats: dict) -> List[str]:
+    histogram = ", ".join(f"{size}×{count}" for size, count in stats["batch_sizes"].items()) or "-"
+    return [
+        f"查询向量化微批: {stats['items']} 条 / {stats['batches']} 批, 平均批大小 {stats['mean_batch']:.2f} "
+        f"(上限 {stats['max_batch']}, 等待上限 {stats['max_wait_ms']:.0f} ms)",
+        f"  批大小分布: {histogram}",
+        f"  排队: 当前 {stats['queue_depth']}, 最大 {stats['max_queue_depth']}",
+        f"  计算前等待(排队+合批): 平均 {stats['wait_ms']['mean']:.1f} ms, p50 {stats['wait_ms']['p50']:.1f} ms, "
+        f"p99 {stats['wait_ms']['p99']:.1f} ms",
+        f"  每批计算: 平均 {stats['compute_ms']['mean']:.1f} ms, p99 {stats['compute_ms']['p99']:.1f} ms",
+    ]
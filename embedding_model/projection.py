@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+from typing import Dict, Optional
+import numpy as np
+
+# 新建collection时对向量降维的方式：none（保持1792维）、pca（按语料拟合的主成分）、truncate（截取前若干维）
+PROJECTION_METHOD = os.getenv("EMBEDDING_PROJECTION", "none")
+# 降维后的维度，需为8的倍数（二值向量按字节打包）
+PROJECTION_DIM = int(os.getenv("EMBEDDING_PROJECTION_DIM", "512"))
+# 拟合的PCA模型与各collection使用的投影保存在此目录
+PROJECTION_DIR = os.getenv("EMBEDDING_PROJECTION_DIR", "./projections")
+PCA_MODEL_PATH = os.path.join(PROJECTION_DIR, "pca.npz")
+
+class Projection:
+    """向量降维：PCA（减去均值后投影到前 dim 个主成分）或截取前 dim 维，结果重新归一化
+
+    投影后仍为单位向量，不同投影的collection之间L2距离可以直接比较。
+    """
+
+    def __init__(self, method: str, dim: int, mean: np.ndarray = None, components: np.ndarray = None):
+        if method not in ("pca", "truncate"):
+            raise ValueError(f"未知的降维方式: {method}")
+        if dim <= 0 or dim % 8:
+            raise ValueError(f"降维后的维度需为8的正整数倍: {dim}")
+        if method == "pca" and (components is None or len(components) < dim):
+            raise ValueError(f"PCA模型只有 {0 if components is None else len(components)} 个主成分，不足 {dim} 维")
+        self.method = method
+        self.dim = dim
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float32)
+        self.components = None if components is None else np.asarray(components[:dim], dtype=np.float32)
+
+    def apply(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == "truncate":
+            projected = vectors[..., :self.dim]
+        else:
+            projected = (vectors - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+        return projected / np.maximum(norms, 1e-12)
+
+    def fingerprint(self) -> str:
+        h = hashlib.sha1(f"{self.method}|{self.dim}".encode('utf-8'))
+        if self.components is not None:
+            h.update(self.mean.tobytes())
+            h.update(self.components.tobytes())
+        return h.hexdigest()[:16]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {"method": np.array(self.method), "dim": np.array(self.dim)}
+        if self.components is not None:
+            arrays.update(mean=self.mean, components=self.components)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, dim: int = None) -> "Projection":
+        with np.load(path) as data:
+            components = data["components"] if "components" in data else None
+            mean = data["mean"] if "mean" in data else None
+            return cls(str(data["method"]), dim or int(data["dim"]), mean, components)
+
+def fit_pca(vectors: np.ndarray, max_dim: int = None, block: int = 65536) -> Projection:
+    """在语料向量上拟合PCA，保留前 max_dim 个主成分（默认全部）
+
+    分块累加协方差矩阵，内存占用与向量数量无关。
+    """
+    count, width = vectors.shape
+    mean = np.zeros(width, dtype=np.float64)
+    for i in range(0, count, block):
+        mean += np.asarray(vectors[i:i + block], dtype=np.float64).sum(axis=0)
+    mean /= count
+    covariance = np.zeros((width, width), dtype=np.float64)
+    for i in range(0, count, block):
+        centered = np.asarray(vectors[i:i + block], dtype=np.float64) - mean
+        covariance += centered.T @ centered
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance / max(1, count - 1))
+    order = np.argsort(eigenvalues)[::-1][:max_dim or width]
+    max_dim = len(order) - len(order) % 8
+    return Projection("pca", max_dim, mean, eigenvectors[:, order].T)
+
+def new_projection() -> Optional[Projection]:
+    """新建collection使用的投影，按 EMBEDDING_PROJECTION 配置；未降维时返回 None
+
+    PCA需要先用 `python -m benchmarks.dim_report --fit` 拟合模型。
+    """
+    if PROJECTION_METHOD == "none":
+        return None
+    if PROJECTION_METHOD == "truncate":
+        return Projection("truncate", PROJECTION_DIM)
+    if not os.path.exists(PCA_MODEL_PATH):
+        raise FileNotFoundError(f"未找到PCA模型 {PCA_MODEL_PATH}，请先运行 python -m benchmarks.dim_report --fit")
+    return Projection.load(PCA_MODEL_PATH, PROJECTION_DIM)
+
+def _collection_path(collection_name: str) -> str:
+    return os.path.join(PROJECTION_DIR, "collections", f"{collection_name}.npz")
+
+_projections: Dict[str, Optional[Projection]] = {}
+_projections_lock = threading.Lock()
+
+def get_projection(collection_name: str) -> Optional[Projection]:
+    """collection建立时保存的投影（进程内缓存），未降维的collection返回 None"""
+    with _projections_lock:
+        if collection_name not in _projections:
+            path = _collection_path(collection_name)
+            _projections[collection_name] = Projection.load(path) if os.path.exists(path) else None
+        return _projections[collection_name]
+
+def save_projection(collection_name: str, projection: Optional[Projection]):
+    """记录新建collection使用的投影，写入和检索时都按它降维"""
+    drop_projection(collection_name)
+    if projection is not None:
+        projection.save(_collection_path(collection_name))
+        with _projections_lock:
+            _projections[collection_name] = projection
+
+def drop_projection(collection_name: str):
+    with _projections_lock:
+        _projections.pop(collection_name, None)
+    path = _collection_path(collection_name)
+    if os.path.exists(path):
+        os.remove(path)
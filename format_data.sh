@@ -6,6 +6,14 @@ docker compose down
 # 删除 volumes 文件夹
 rm -rf volumes
 
+# 删除知识库清单、索引配置和答案缓存（向量库已清空，原有记录失效）
+rm -f kb_manifest.json index_configs.json
+rm -rf answer_cache content_store projections/collections
+
+# 删除本地向量库和文本块向量缓存（模型文件和导出的ONNX模型保留）
+rm -rf "${LOCAL_VECTOR_DIR:-./vector_db}"
+rm -rf "${EMBEDDING_CACHE_DIR:-./embeddings_cache/vectors}"
+
 # 启动 Milvus 容器
 docker compose up -d
 
@@ -1,3 +1,4 @@
+import argparse
 import sys
 import time
 import threading
@@ -53,8 +54,9 @@ def print_with_loading_clear(text):
     print(text)
 
 def stream_output(text):
-    """直接输出完整文本"""
-    print(text)
+    """流式输出文本片段，不换行并立即刷新"""
+    sys.stdout.write(text)
+    sys.stdout.flush()
 
 def print_welcome():
     """打印欢迎信息"""
@@ -96,25 +98,63 @@ def animate_generating():
 def start_generating_animation():
     """开始生成回答动画"""
     animate_generating.running = True
-    threading.Thread(target=animate_generating).start()
+    animate_generating.thread = threading.Thread(target=animate_generating)
+    animate_generating.thread.daemon = True
+    animate_generating.thread.start()
 
 def stop_generating_animation():
     """停止并清理动画"""
+    if not getattr(animate_generating, "running", False):
+        return
     animate_generating.running = False
-    time.sleep(0.1)  # 等待线程完成
+    # 等待线程完成，避免残留帧覆盖流式输出的内容
+    thread = getattr(animate_generating, "thread", None)
+    if thread:
+        thread.join(timeout=0.5)
     # 彻底清理动画
     sys.stdout.write('\r' + ' ' * 50 + '\r')
     sys.stdout.flush()
 
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="医学知识库问答系统")
+    parser.add_argument("files", nargs="*", help="指定加载的PDF文件，默认加载data文件夹中的所有PDF文件")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("INGEST_WORKERS", "1")),
+                        help="并行解析新PDF文件的进程数（默认1，即串行处理）")
+    parser.add_argument("--migrate", action="store_true",
+                        help="将按文件划分的collection迁移到单一collection后退出")
+    parser.add_argument("--drop-old", action="store_true",
+                        help="迁移完成后删除原有的按文件划分的collection")
+    parser.add_argument("--serve", action="store_true",
+                        help="以HTTP服务方式运行，多个会话共享已加载的模型和知识库")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"), help="服务监听地址")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")), help="服务监听端口")
+    parser.add_argument("--fake-llm", action="store_true",
+                        help="使用本地模拟的LLM生成回答（不调用Gemini，用于测试）")
+    parser.add_argument("--profile", action="store_true",
+                        help="打印每次提问和每个文件入库的各阶段耗时")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     # 立即显示欢迎信息
     print_welcome()
     
-    specific_files = sys.argv[1:] if len(sys.argv) > 1 else None
+    specific_files = args.files or None
+    if args.fake_llm:
+        os.environ["LLM_BACKEND"] = "fake"
+    if args.profile:
+        os.environ["TRACE_PROFILE"] = "1"
     
     try:
+        if args.migrate:
+            from utils.pdf_loader import migrate_to_single_collection
+            migrate_to_single_collection(drop_old=args.drop_old)
+            return
+
         # 延迟导入ChatAgent，这样不会阻塞欢迎信息的显示
         from chat_agent import ChatAgent
+        from utils.conversation_memory import PROMPT_TOKEN_REPORT
         
         if specific_files:
             print_with_loading_clear(f"准备加载指定的PDF文件: [{', '.join(specific_files)}]")
@@ -123,9 +163,16 @@ def main():
         
         loading_animation.start()
         try:
-            agent = ChatAgent("data", specific_files)
+            agent = ChatAgent("data", specific_files, workers=args.workers)
         finally:
             loading_animation.stop()
+        # 检索就绪即可提问，Gemini客户端等仍可能在后台加载
+        print(Fore.CYAN + "\n".join(agent.startup_timer.report()) + Style.RESET_ALL)
+
+        if args.serve:
+            from server import run_server
+            run_server(agent, args.host, args.port)
+            return
 
         while True:
             query = input("\n请输入问题: ").strip()
@@ -135,6 +182,50 @@ def main():
                 os.system('cls' if os.name == 'nt' else 'clear')
                 print_welcome()
                 continue
+            elif query.lower() == 'cache':  # 查看答案缓存统计
+                if agent.answer_cache:
+                    stats = agent.answer_cache.stats()
+                    print(f"答案缓存: {stats['entries']} 条, 精确命中 {stats['exact_hits']}, "
+                          f"语义命中 {stats['semantic_hits']}, 未命中 {stats['misses']}, "
+                          f"命中率 {stats['hit_rate']:.1%}")
+                else:
+                    print("答案缓存未启用")
+                continue
+            elif query.lower() == 'collections':  # 查看已加载的collection及内存占用
+                stats = agent.collection_manager.stats()
+                budget = f"{stats['budget_bytes'] / 2**20:.0f} MB" if stats['budget_bytes'] > 0 else "不限"
+                print(f"已加载 {len(stats['loaded'])}/{len(agent.collections)} 个collection, "
+                      f"估计占用 {stats['used_bytes'] / 2**20:.0f} MB / {budget}, "
+                      f"载入 {stats['loads']} 次, 超出预算释放 {stats['evictions']} 次")
+                for name in reversed(stats['loaded']):
+                    print(f"  - {name}")
+                continue
+            elif query.lower() == 'embedding':  # 查看查询向量化的微批统计
+                batcher = getattr(agent.embeddings, "query_batcher", None)
+                if batcher is not None:
+                    from embedding_model.micro_batch import format_batch_stats
+                    print("\n".join(format_batch_stats(batcher.stats())))
+                else:
+                    print("查询向量化微批未启用")
+                continue
+            elif query.lower() == 'memory':  # 查看对话记忆和最近几轮提示词的token构成
+                from utils.tokens import format_token_report
+                memory = agent.memory
+                summarizer = agent.memory_summarizer.stats()
+                print(f"对话记忆: 共 {len(memory)} 轮, 原文 {len(memory.turns)} 轮, 已并入摘要 {memory.summarized_turns} 轮, "
+                      f"预算 {memory.budget} tokens（摘要预留 {memory.summary_tokens}）, "
+                      f"后台摘要 {summarizer['compactions']} 次, 平均 {summarizer['mean_ms']:.0f} ms")
+                for i, report in enumerate(list(memory.reports)[-10:], 1):
+                    print(f"  {i}. {format_token_report(report)}")
+                continue
+            elif query.lower() == 'llm':  # 查看LLM请求的重试、对冲和延迟统计
+                stats = agent.llm_stats()
+                if stats is not None:
+                    from utils.llm_client import format_llm_stats
+                    print(format_llm_stats(stats))
+                else:
+                    print("当前LLM后端不提供请求统计")
+                continue
             elif query.lower() == 'update':  # 添加 update 命令
                 loading_animation.start()
                 try:
@@ -146,24 +237,41 @@ def main():
             if not query:
                 continue
 
-            animate_generating.running = True
-            thread = threading.Thread(target=animate_generating)
-            thread.daemon = True
-            thread.start()
+            start_generating_animation()
 
+            responses = agent.chat(query)
+            started = False
             try:
-                for response in agent.chat(query):
-                    stop_generating_animation()
+                for response in responses:
+                    if not started:
+                        # 收到第一个片段时停止动画，开始流式输出
+                        stop_generating_animation()
+                        print()
+                        started = True
                     if response:
-                        # 使用打字机效果输出
-                        stream_output(f"\n{response}")
+                        stream_output(response)
+                print()
+                if PROMPT_TOKEN_REPORT and agent.memory.last_report:
+                    from utils.tokens import format_token_report
+                    print(Fore.CYAN + format_token_report(agent.memory.last_report) + Style.RESET_ALL)
+                if args.profile and agent.last_trace:
+                    print(Fore.CYAN + "\n".join(agent.last_trace.format()) + Style.RESET_ALL)
+            except KeyboardInterrupt:
+                # Ctrl-C 中断当前回答：关闭生成器，本轮不记入历史
+                responses.close()
+                stop_generating_animation()
+                print("\n[回答已中断]")
             except Exception as e:
                 stop_generating_animation()
                 print(f"\n错误: {str(e)}")
+            finally:
+                stop_generating_animation()
 
     except Exception as e:
         print(f"\n程序初始化失败: {str(e)}")
     finally:
+        if "utils.tracing" in sys.modules:
+            sys.modules["utils.tracing"].flush_metrics()
         print("\n感谢使用！再见！")
 
 if __name__ == "__main__":
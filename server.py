@@ -0,0 +1,314 @@
+"""多会话HTTP服务：一个进程共享embedding模型和知识库，为多个用户并发提供问答，回答以SSE流式返回
+
+接口：
+    POST   /sessions                  创建会话，返回 {"session_id": ...}
+    DELETE /sessions/<id>             删除会话
+    POST   /sessions/<id>/chat        提问，请求体 {"query": "..."}，响应为 text/event-stream：
+                                      event: chunk  data: {"text": "..."}   回答片段
+                                      event: done   data: {"chars": N, "seconds": T, "prompt_tokens": {...}}
+                                      event: error  data: {"error": "..."}
+    GET    /stats                     会话数、并发与排队情况
+    GET    /metrics                   Prometheus文本格式的各阶段耗时与计数
+
+每个会话同一时间只能有一个进行中的提问（否则返回409）；同时生成回答的请求数不超过 SERVER_MAX_CONCURRENT，
+排队的请求超过 SERVER_MAX_QUEUE 时返回503。客户端断开时（包括排队和等待首个片段期间）停止生成，该轮不记入会话历史。
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from utils.conversation_memory import ConversationMemory
+
+# 同时生成回答的请求数（每个占用一个工作线程）
+SERVER_MAX_CONCURRENT = int(os.getenv("SERVER_MAX_CONCURRENT", "4"))
+# 等待生成的请求数上限，超出时直接返回503
+SERVER_MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", "32"))
+# 会话空闲多久后过期（秒），以及最多保留的会话数
+SERVER_SESSION_TTL = float(os.getenv("SERVER_SESSION_TTL", "3600"))
+SERVER_MAX_SESSIONS = int(os.getenv("SERVER_MAX_SESSIONS", "1000"))
+# 读取请求头和请求体的时限（秒）
+REQUEST_TIMEOUT = 30
+MAX_BODY_BYTES = 64 * 1024
+
+_END = object()
+_REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            409: "Conflict", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+class Session:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.memory = ConversationMemory()
+        self.busy = False
+        self.last_used = time.monotonic()
+
+class SessionStore:
+    """会话表：空闲超过TTL的会话过期，超出数量上限时删除最久未使用的空闲会话"""
+
+    def __init__(self, ttl: float = SERVER_SESSION_TTL, max_sessions: int = SERVER_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: Dict[str, Session] = {}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self) -> Optional[Session]:
+        self._expire()
+        if len(self._sessions) >= self.max_sessions:
+            idle = [s for s in self._sessions.values() if not s.busy]
+            if not idle:
+                return None
+            del self._sessions[min(idle, key=lambda s: s.last_used).id]
+        session = Session()
+        self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        self._expire()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_used = time.monotonic()
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self):
+        deadline = time.monotonic() - self.ttl
+        for session_id in [s.id for s in self._sessions.values() if not s.busy and s.last_used < deadline]:
+            del self._sessions[session_id]
+
+class Request:
+    def __init__(self, method: str, path: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def sse_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+class ChatServer:
+    """在asyncio事件循环中处理HTTP连接，回答生成（ChatAgent.chat）在工作线程中逐段执行"""
+
+    def __init__(self, agent, max_concurrent: int = SERVER_MAX_CONCURRENT, max_queue: int = SERVER_MAX_QUEUE,
+                 sessions: SessionStore = None):
+        self.agent = agent
+        self.sessions = sessions or SessionStore()
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="chat")
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                request = await asyncio.wait_for(self._read_request(reader), REQUEST_TIMEOUT)
+                await self._route(request, reader, writer)
+            except HttpError as e:
+                await self._send_json(writer, e.status, {"error": str(e)})
+            except asyncio.TimeoutError:
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Request:
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "无效的请求行")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(400, "无效的Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "请求体过大")
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), target.split("?", 1)[0].rstrip("/") or "/", headers, body)
+
+    async def _route(self, request: Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        parts = request.path.strip("/").split("/")
+        if parts == ["stats"] and request.method == "GET":
+            await self._send_json(writer, 200, self.stats())
+        elif parts == ["metrics"] and request.method == "GET":
+            from utils.tracing import metrics
+            await self._send(writer, 200, metrics.render().encode('utf-8'), "text/plain; version=0.0.4")
+        elif parts == ["sessions"] and request.method == "POST":
+            session = self.sessions.create()
+            if session is None:
+                raise HttpError(503, "会话数已达上限")
+            await self._send_json(writer, 200, {"session_id": session.id})
+        elif len(parts) == 2 and parts[0] == "sessions" and request.method == "DELETE":
+            if not self.sessions.delete(parts[1]):
+                raise HttpError(404, "会话不存在")
+            await self._send(writer, 204, b"", "application/json")
+        elif len(parts) == 3 and parts[0] == "sessions" and parts[2] == "chat" and request.method == "POST":
+            session = self.sessions.get(parts[1])
+            if session is None:
+                raise HttpError(404, "会话不存在")
+            try:
+                query = str(json.loads(request.body or b"{}").get("query", "")).strip()
+            except (ValueError, AttributeError):
+                raise HttpError(400, "请求体应为JSON: {\"query\": \"...\"}")
+            if not query:
+                raise HttpError(400, "问题不能为空")
+            await self._chat(session, query, reader, writer)
+        elif parts[0] in ("stats", "metrics", "sessions"):
+            raise HttpError(405, "不支持的请求方法")
+        else:
+            raise HttpError(404, "接口不存在")
+
+    async def _chat(self, session: Session, query: str, reader: asyncio.StreamReader,
+                    writer: asyncio.StreamWriter):
+        if session.busy:
+            raise HttpError(409, "该会话已有进行中的提问")
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HttpError(503, "服务繁忙，请稍后重试")
+
+        session.busy = True
+        # 发送回答之前（排队、检索、等待首个片段）写入不会失败，需要单独监听连接是否已断开
+        watcher = asyncio.ensure_future(self._wait_disconnect(reader))
+        work = asyncio.ensure_future(self._queue_and_stream(session, query, writer))
+        try:
+            await asyncio.wait({watcher, work}, return_when=asyncio.FIRST_COMPLETED)
+            if not work.done():
+                self.cancelled += 1
+                work.cancel()
+            try:
+                await work
+            except asyncio.CancelledError:
+                pass
+        finally:
+            watcher.cancel()
+            work.cancel()
+            session.busy = False
+            session.last_used = time.monotonic()
+
+    @staticmethod
+    async def _wait_disconnect(reader: asyncio.StreamReader):
+        """请求已完整读取，之后读到EOF或连接出错即客户端已断开"""
+        try:
+            while await reader.read(4096):
+                pass
+        except ConnectionError:
+            pass
+
+    async def _queue_and_stream(self, session: Session, query: str, writer: asyncio.StreamWriter):
+        self.waiting += 1
+        try:
+            await self._send_headers(writer, 200, "text/event-stream", {"Cache-Control": "no-cache"})
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            self.active += 1
+            await self._stream(session, query, writer)
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    async def _stream(self, session: Session, query: str, writer: asyncio.StreamWriter):
+        """逐段取出回答并发送；客户端断开或任务被取消时关闭生成器，本轮不记入会话历史"""
+        loop = asyncio.get_running_loop()
+        responses = self.agent.chat(query, session.memory)
+        start = time.perf_counter()
+        chars = 0
+        try:
+            while True:
+                pending = self.executor.submit(next, responses, _END)
+                text = await asyncio.wrap_future(pending)
+                if text is _END:
+                    break
+                if text:
+                    chars += len(text)
+                    writer.write(sse_event("chunk", {"text": text}))
+                    await writer.drain()
+            writer.write(sse_event("done", {"chars": chars, "seconds": round(time.perf_counter() - start, 3),
+                                            "prompt_tokens": session.memory.last_report}))
+            await writer.drain()
+            self.completed += 1
+        except asyncio.CancelledError:
+            # 工作线程中正在执行的一步无法中断，执行完后立即关闭生成器，不再继续生成
+            pending.add_done_callback(lambda _: responses.close())
+            raise
+        except ConnectionError:
+            self.cancelled += 1
+            await loop.run_in_executor(self.executor, responses.close)
+        except Exception as e:
+            await loop.run_in_executor(self.executor, responses.close)
+            writer.write(sse_event("error", {"error": str(e)}))
+            await writer.drain()
+
+    async def _send_headers(self, writer: asyncio.StreamWriter, status: int, content_type: str,
+                            extra: Dict[str, str] = None, length: int = None):
+        headers = {"Content-Type": f"{content_type}; charset=utf-8", "Connection": "close", **(extra or {})}
+        if length is not None:
+            headers["Content-Length"] = str(length)
+        head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+        writer.write(head.encode('latin-1'))
+        await writer.drain()
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str):
+        await self._send_headers(writer, status, content_type, length=len(body))
+        writer.write(body)
+        await writer.drain()
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, data: dict):
+        await self._send(writer, status, json.dumps(data, ensure_ascii=False).encode('utf-8'), "application/json")
+
+    def stats(self) -> dict:
+        batcher = getattr(self.agent.embeddings, "query_batcher", None)
+        return {
+            "sessions": len(self.sessions),
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "query_embedding": batcher.stats() if batcher is not None else None,
+            "memory_summarizer": self.agent.memory_summarizer.stats(),
+            "llm": self.agent.llm_stats(),
+        }
+
+async def serve(agent, host: str, port: int):
+    server = ChatServer(agent)
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"问答服务已启动: http://{host}:{port}  (并发 {server.max_concurrent}, 排队上限 {server.max_queue})")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.executor.shutdown(wait=False, cancel_futures=True)
+
+def run_server(agent, host: str = "127.0.0.1", port: int = 8000):
+    try:
+        asyncio.run(serve(agent, host, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,104 @@
+import gc
+
+import numpy as np
+import pytest
+
+from utils.answer_cache import AnswerCache, history_digest, invalidate_source
+
+SCOPE = ["内科学.pdf", "外科学.pdf"]
+
+def unit(seed: int, dim: int = 8) -> np.ndarray:
+    vector = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "answer_cache" / "answers.sqlite")
+
+def store(cache, query="高血压的诊断标准？", chunk_ids=("1", "2"), sources=("内科学.pdf",),
+          vector=None, answer="答案", history="", scope=SCOPE):
+    cache.store(query, chunk_ids, sources, scope, unit(0) if vector is None else vector, answer, history)
+
+def test_history_digest():
+    assert history_digest("") == ""
+    assert history_digest("用户: 什么是高血压") == history_digest("用户: 什么是高血压")
+    assert history_digest("用户: 什么是高血压") != history_digest("用户: 什么是糖尿病")
+
+def test_exact_lookup_normalizes_query_and_chunk_order(path):
+    cache = AnswerCache(path)
+    store(cache)
+    assert cache.lookup(" 高血压的 诊断标准 ", ["2", "1"]) == "答案"
+    assert cache.lookup("高血压的诊断标准？", ["1", "3"]) is None
+    assert cache.stats()["exact_hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_follow_up_answers_are_keyed_by_history(path):
+    cache = AnswerCache(path)
+    first, second = history_digest("用户: 什么是高血压"), history_digest("用户: 什么是糖尿病")
+    store(cache, query="它的常用药物有哪些？", answer="降压药", history=first)
+    store(cache, query="它的常用药物有哪些？", answer="降糖药", history=second)
+
+    assert cache.lookup("它的常用药物有哪些？", ["1", "2"], first) == "降压药"
+    assert cache.lookup("它的常用药物有哪些？", ["1", "2"], second) == "降糖药"
+    assert cache.lookup("它的常用药物有哪些？", ["1", "2"]) is None
+    assert cache.lookup_semantic(unit(0), SCOPE, first) == "降压药"
+    assert cache.lookup_semantic(unit(0), SCOPE, second) == "降糖药"
+    assert cache.lookup_semantic(unit(0), SCOPE) is None
+
+def test_semantic_lookup_threshold_and_scope(path):
+    cache = AnswerCache(path, threshold=0.95)
+    store(cache, vector=unit(0))
+    near = unit(0) + 0.01 * unit(1)
+    assert cache.lookup_semantic(near / np.linalg.norm(near), SCOPE) == "答案"
+    assert cache.lookup_semantic(unit(2), SCOPE) is None
+    assert cache.lookup_semantic(unit(0), SCOPE[:1]) is None
+
+def test_entries_persist_across_instances(path):
+    store(AnswerCache(path), vector=unit(3))
+    cache = AnswerCache(path)
+    assert cache.lookup("高血压的诊断标准？", ["1", "2"]) == "答案"
+    assert cache.lookup_semantic(unit(3), SCOPE) == "答案"
+
+def test_capacity_eviction_keeps_vectors_in_sync(path):
+    cache = AnswerCache(path, max_entries=3)
+    for i in range(5):
+        store(cache, query=f"问题{i}", chunk_ids=[str(i)], vector=unit(i), answer=f"答案{i}")
+    assert cache.stats()["entries"] == 3
+    assert sorted(cache._keys) == sorted(cache._positions)
+    for i in range(5):
+        expected = f"答案{i}" if i >= 2 else None
+        assert cache.lookup_semantic(unit(i), SCOPE) == expected
+        assert cache.lookup(f"问题{i}", [str(i)]) == expected
+
+def test_ttl_expiry(path):
+    cache = AnswerCache(path, ttl=-1)
+    store(cache)
+    assert cache.lookup("高血压的诊断标准？", ["1", "2"]) is None
+
+def test_invalidate_source_updates_open_instances(path):
+    cache = AnswerCache(path)
+    store(cache, query="问题1", chunk_ids=["1"], sources=["内科学.pdf"], vector=unit(1), answer="答案1")
+    store(cache, query="问题2", chunk_ids=["2"], sources=["外科学.pdf"], vector=unit(2), answer="答案2",
+          scope=["外科学.pdf"])
+    # 另一个实例创建后被回收，不影响已打开实例的失效
+    AnswerCache(path)
+    gc.collect()
+
+    assert invalidate_source("内科学.pdf", path) == 1
+    assert cache.lookup("问题1", ["1"]) is None
+    assert cache.lookup_semantic(unit(1), SCOPE) is None
+    assert cache.lookup_semantic(unit(2), ["外科学.pdf"]) == "答案2"
+    assert cache.stats()["entries"] == 1
+
+def test_invalidate_source_matches_scope(path):
+    # 知识库范围包含该文件的条目同样失效，即使答案没有引用该文件
+    cache = AnswerCache(path)
+    store(cache, sources=["外科学.pdf"])
+    assert invalidate_source("内科学.pdf", path) == 1
+    assert cache.stats()["entries"] == 0
+
+def test_invalidate_source_without_open_instance(path, tmp_path):
+    store(AnswerCache(path))
+    gc.collect()
+    assert invalidate_source("内科学.pdf", path) == 1
+    assert AnswerCache(path).stats()["entries"] == 0
+    assert invalidate_source("内科学.pdf", str(tmp_path / "missing.sqlite")) == 0
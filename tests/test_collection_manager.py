@@ -0,0 +1,114 @@
+import random
+import threading
+
+import pytest
+
+from utils.collection_manager import CollectionManager
+
+class FakeCollection:
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.loaded = False
+        self.loads = 0
+
+    def load(self):
+        self.loaded = True
+        self.loads += 1
+
+    def release(self):
+        self.loaded = False
+
+def make_manager(budget: int, **sizes):
+    manager = CollectionManager(budget_bytes=budget)
+    manager.estimate_bytes = lambda collection: collection.size
+    return manager, {name: FakeCollection(name, size) for name, size in sizes.items()}
+
+def use(manager, collection):
+    with manager.use(collection):
+        assert collection.loaded
+
+def test_lru_eviction_under_budget():
+    manager, c = make_manager(250, a=100, b=100, c=100)
+    use(manager, c["a"])
+    use(manager, c["b"])
+    use(manager, c["a"])  # b 成为最久未使用
+    use(manager, c["c"])
+    assert manager.stats()["loaded"] == ["a", "c"]
+    assert manager.stats()["used_bytes"] == 200
+    assert not c["b"].loaded and c["a"].loaded and c["c"].loaded
+    assert manager.evictions == 1
+    assert [(e.kind, e.name) for e in manager.events][-2:] == [("load", "c"), ("evict", "b")]
+
+    use(manager, c["b"])
+    assert c["b"].loads == 2 and manager.stats()["loaded"] == ["c", "b"]
+
+def test_no_budget_never_evicts():
+    manager, c = make_manager(0, a=100, b=100)
+    for collection in c.values():
+        use(manager, collection)
+    assert manager.stats()["loaded"] == ["a", "b"] and manager.evictions == 0
+
+def test_pinned_collection_is_not_evicted():
+    manager, c = make_manager(150, a=100, b=100)
+    with manager.use(c["a"]):
+        # a 检索中，加载 b 后暂时超出预算
+        use(manager, c["b"])
+        assert c["a"].loaded
+        assert manager.stats()["used_bytes"] == 100
+        assert not c["b"].loaded
+    with manager.use(c["a"]):
+        with manager.use(c["b"]):
+            assert manager.stats()["used_bytes"] == 200
+        assert c["a"].loaded and not c["b"].loaded
+    assert manager.stats()["used_bytes"] <= 150
+
+def test_release_during_use_is_deferred():
+    manager, c = make_manager(0, a=100)
+    with manager.use(c["a"]):
+        manager.release(c["a"])
+        assert c["a"].loaded
+    assert not c["a"].loaded and manager.stats()["used_bytes"] == 0
+    use(manager, c["a"])
+    assert c["a"].loads == 2
+
+def test_retain_stops_tracking_removed_collections():
+    manager, c = make_manager(0, a=100, b=100)
+    use(manager, c["a"])
+    with manager.use(c["b"]):
+        manager.retain([c["a"]])
+        # 检索中的 b 在检索结束后才停止跟踪
+        assert manager.stats()["tracked"] == 2
+    stats = manager.stats()
+    assert (stats["loaded"], stats["used_bytes"], stats["tracked"]) == (["a"], 100, 1)
+
+def test_track_loaded_counts_towards_budget():
+    manager, c = make_manager(150, a=100, b=100)
+    for collection in c.values():
+        collection.load()
+        manager.track_loaded(collection)
+    assert manager.stats()["loaded"] == ["b"] and not c["a"].loaded
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_concurrent_use_keeps_accounting_consistent(seed):
+    manager, c = make_manager(300, **{name: 100 for name in "abcdef"})
+    collections = list(c.values())
+    errors = []
+
+    def worker(worker_seed):
+        rng = random.Random(worker_seed)
+        try:
+            for _ in range(200):
+                use(manager, rng.choice(collections))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(seed * 100 + i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    stats = manager.stats()
+    assert stats["used_bytes"] == 100 * len(stats["loaded"]) <= 300
+    assert sorted(stats["loaded"]) == sorted(name for name, collection in c.items() if collection.loaded)
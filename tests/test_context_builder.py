@@ -0,0 +1,37 @@
+from utils.context_builder import build_context, find_overlap, merge_spans
+
+# 同一PDF中两个条目：A 的两块首尾重叠，B 与 A 无关，两个条目的 chunk_index 都从0开始
+A0 = "高血压是以体循环动脉血压增高为主要特征的临床综合征。长期未控制的高血压可导致心、脑、肾等靶器官损害，并显著增加心血管事件的发生风险。"
+A1 = "长期未控制的高血压可导致心、脑、肾等靶器官损害，并显著增加心血管事件的发生风险。治疗目标是将血压控制在140/90mmHg以下。"
+B0 = "糖尿病是一组以高血糖为特征的代谢性疾病。胰岛素分泌缺陷或其生物作用受损是主要原因。"
+A_TEXT = "高血压是以体循环动脉血压增高为主要特征的临床综合征。长期未控制的高血压可导致心、脑、肾等靶器官损害，并显著增加心血管事件的发生风险。治疗目标是将血压控制在140/90mmHg以下。"
+
+def doc(text, index, source="内科学.pdf"):
+    return {"page_content": text, "metadata": {"source": source, "chunk_index": index}}
+
+def test_find_overlap():
+    assert find_overlap(A0, A1) == A0.index("长期")
+    assert find_overlap(A0, B0) is None
+    assert find_overlap(A0, A0[5:30]) == len(A0)
+
+def test_adjacent_chunks_merge():
+    spans = merge_spans([(0, doc(A0, 0)), (1, doc(A1, 1))])
+    assert [span.text for span in spans] == [A_TEXT]
+
+def test_unrelated_item_does_not_break_chain():
+    # 按 chunk_index 排序后为 A0, B0, A1，B0 不应打断 A0 与 A1 的合并
+    spans = merge_spans([(0, doc(A0, 0)), (1, doc(B0, 0)), (2, doc(A1, 1))])
+    assert [span.text for span in spans] == [A_TEXT, B0]
+    assert [span.rank for span in spans] == [0, 1]
+
+def test_different_sources_never_merge():
+    spans = merge_spans([(0, doc(A0, 0)), (1, doc(A1, 1, source="外科学.pdf"))])
+    assert len(spans) == 2
+
+def test_build_context_dedups_and_respects_budget():
+    text, stats = build_context([doc(A0, 0), doc(B0, 0), doc(A1, 1)], budget=10_000)
+    assert text == f"\n\n{A_TEXT}\n\n{B0}"
+    assert stats["spans"] == 2 and stats["saved_tokens"] > 0
+
+    text, stats = build_context([doc(A0, 0), doc(B0, 0), doc(A1, 1)], budget=1)
+    assert text == "" and stats["dropped_chunks"] == 3
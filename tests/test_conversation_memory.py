@@ -0,0 +1,105 @@
+import threading
+
+from utils.conversation_memory import ConversationMemory, MemorySummarizer, Turn, extract_summary
+from utils.tokens import estimate_tokens
+
+def fill(memory, turns, answer_chars=40):
+    for i in range(turns):
+        memory.add(f"问题{i}", f"回答{i}。" + "详" * answer_chars)
+
+def rendered_tokens(memory) -> int:
+    summary_text, recent_text, _ = memory.render()
+    return estimate_tokens(summary_text) + estimate_tokens(recent_text)
+
+def test_render_keeps_newest_turns_within_budget():
+    memory = ConversationMemory(budget=200, summary_tokens=50, max_turns=10)
+    fill(memory, 8)
+    summary_text, recent_text, stats = memory.render()
+    assert summary_text == ""
+    assert rendered_tokens(memory) <= 200
+    assert "问题7" in recent_text and "问题0" not in recent_text
+    assert stats["recent_turns"] + stats["omitted_turns"] == 8
+
+def test_render_respects_max_turns():
+    memory = ConversationMemory(budget=10_000, max_turns=3)
+    fill(memory, 5, answer_chars=1)
+    _, recent_text, stats = memory.render()
+    assert (stats["recent_turns"], stats["omitted_turns"]) == (3, 2)
+    assert "问题1" not in recent_text and "问题2" in recent_text
+
+def test_oversized_latest_turn_is_truncated():
+    memory = ConversationMemory(budget=50, summary_tokens=10)
+    memory.add("问题", "长" * 500)
+    _, recent_text, stats = memory.render()
+    assert stats["recent_turns"] == 1
+    assert recent_text.startswith("问：问题") and rendered_tokens(memory) <= 50
+
+def test_overflow_reserves_summary_space():
+    memory = ConversationMemory(budget=200, summary_tokens=100, max_turns=10)
+    fill(memory, 6)
+    per_turn = memory.turns[0].tokens
+    assert memory.overflow() == 6 - (200 - 100) // per_turn
+    assert ConversationMemory(budget=200, summary_tokens=100, max_turns=1).overflow() == 0
+
+def test_extract_summary_keeps_first_sentences_and_tail():
+    turns = [Turn("什么是高血压", "高血压是血压持续升高。其余说明。"), Turn("如何治疗", "以药物治疗为主！细节。")]
+    summary = extract_summary("", turns, 100)
+    assert summary == "- 问：什么是高血压；答：高血压是血压持续升高。\n- 问：如何治疗；答：以药物治疗为主！"
+    assert extract_summary(summary, turns, 10).endswith("以药物治疗为主！")
+    assert estimate_tokens(extract_summary(summary, turns, 10)) <= 10
+
+def test_summarizer_compacts_into_budget():
+    memory = ConversationMemory(budget=200, summary_tokens=60, max_turns=10)
+    fill(memory, 12)
+    summarizer = MemorySummarizer()
+    summarizer.schedule(memory)
+    summarizer.close()
+    assert memory.overflow() == 0 and not memory.compacting
+    assert len(memory) == 12 and memory.summarized_turns == 12 - len(memory.turns)
+    assert "问题0" in memory.summary or memory.summary.startswith("……")
+    assert estimate_tokens(memory.summary) <= 60
+    assert rendered_tokens(memory) <= 200
+    summary_text, recent_text, stats = memory.render()
+    assert summary_text.startswith("早先对话摘要") and "问题11" in recent_text
+    assert stats["summarized_turns"] == memory.summarized_turns
+    assert summarizer.stats()["compactions"] >= 1
+
+def test_summarizer_uses_llm_and_falls_back_on_failure():
+    prompts = []
+    memory = ConversationMemory(budget=100, summary_tokens=20, max_turns=10)
+    fill(memory, 5)
+    summarizer = MemorySummarizer(generate=lambda prompt: prompts.append(prompt) or "摘" * 100)
+    summarizer.schedule(memory)
+    summarizer.close()
+    assert "问题0" in prompts[0] and "不超过20字" in prompts[0]
+    # LLM 输出超出预留空间时截断
+    assert memory.summary.endswith("摘") and estimate_tokens(memory.summary) <= 20
+
+    def fail(prompt):
+        raise RuntimeError("LLM不可用")
+    memory = ConversationMemory(budget=100, summary_tokens=20, max_turns=10)
+    fill(memory, 5)
+    summarizer = MemorySummarizer(generate=fail)
+    summarizer.schedule(memory)
+    summarizer.close()
+    assert summarizer.stats()["failures"] >= 1
+    assert "问" in memory.summary and memory.overflow() == 0
+
+def test_clear_during_compaction_discards_summary():
+    started, release = threading.Event(), threading.Event()
+
+    def slow(prompt):
+        started.set()
+        release.wait(5)
+        return "过时的摘要"
+    memory = ConversationMemory(budget=100, summary_tokens=20, max_turns=10)
+    fill(memory, 5)
+    summarizer = MemorySummarizer(generate=slow)
+    summarizer.schedule(memory)
+    summarizer.schedule(memory)  # 同一会话同一时间只有一个压缩任务
+    started.wait(5)
+    memory.clear()
+    release.set()
+    summarizer.close()
+    assert memory.summary == "" and len(memory) == 0 and not memory.compacting
+    assert summarizer.stats()["compactions"] == 1
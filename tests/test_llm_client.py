@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from utils import llm_client
+from utils.fake_llm_server import start_fake_server
+from utils.llm_client import GeminiClient, LLMError
+
+PROMPT = "参考资料:\n高血压的诊断标准\n历史对话:\n\n问题：什么是高血压"
+
+class FirstChoice:
+    """模拟服务的错误码固定为 429"""
+
+    def choice(self, options):
+        return options[0]
+
+@pytest.fixture
+def server():
+    server = start_fake_server(first_delay=0.0, chunk_delay=0.0, answer_chars=120)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE", 0.01)
+
+def script(server, outcomes):
+    """按顺序为每个请求指定 (是否返回429, 首片段延迟)，用完后正常返回"""
+    outcomes = list(outcomes)
+    server.random = FirstChoice()
+
+    def draw():
+        with server.lock:
+            server.counters["requests"] += 1
+        return outcomes.pop(0) if outcomes else (False, 0.0)
+    server.draw = draw
+
+def make_client(server, **kwargs):
+    return GeminiClient(base_url=server.url, model="fake", **kwargs)
+
+def stream_text(client) -> str:
+    return "".join(chunk.text for chunk in client.generate_content(PROMPT, stream=True))
+
+def test_stream_matches_non_stream_and_reuses_connection(server):
+    client = make_client(server)
+    text = stream_text(client)
+    assert text.startswith("# 模拟回答\n问题：什么是高血压\n参考资料共 8 字。") and len(text) == 120
+    assert client.generate_content(PROMPT).text == text
+    assert stream_text(client) == text
+    assert server.counters["connections"] == 1
+    stats = client.stats()
+    assert (stats["requests"], stats["attempts"], stats["retries"], stats["errors"]) == (3, 3, 0, 0)
+
+def test_429_is_retried(server):
+    script(server, [(True, 0.0), (True, 0.0)])
+    client = make_client(server, max_retries=3)
+    assert len(stream_text(client)) == 120
+    assert (client.counters["attempts"], client.counters["retries"], client.counters["errors"]) == (3, 2, 0)
+
+def test_retries_exhausted(server):
+    script(server, [(True, 0.0)] * 10)
+    client = make_client(server, max_retries=2)
+    with pytest.raises(LLMError, match="已重试 2 次") as info:
+        stream_text(client)
+    assert info.value.status == 429
+    assert (client.counters["attempts"], client.counters["errors"]) == (3, 1)
+    assert server.counters["requests"] == 3
+
+def test_429_carries_retry_after(server):
+    script(server, [(True, 0.0)])
+    client = make_client(server, max_retries=0)
+    with pytest.raises(LLMError) as info:
+        client.generate_content(PROMPT)
+    assert (info.value.status, info.value.retryable, info.value.retry_after) == (429, True, 0.0)
+
+def test_client_errors_are_not_retried(server):
+    client = GeminiClient(base_url=server.url + "/wrong", model="fake", max_retries=3)
+    with pytest.raises(LLMError) as info:
+        stream_text(client)
+    assert info.value.status == 404 and not info.value.retryable
+    assert client.counters["attempts"] == 1
+
+def test_read_timeout_before_first_chunk_is_retried(server):
+    script(server, [(False, 1.0)])
+    client = make_client(server, read_timeout=0.2, max_retries=1)
+    assert len(stream_text(client)) == 120
+    assert (client.counters["timeouts"], client.counters["retries"]) == (1, 1)
+
+def test_hedge_wins_over_slow_request(server):
+    script(server, [(False, 2.0)])
+    client = make_client(server, hedge_after=0.1)
+    start = time.monotonic()
+    assert len(stream_text(client)) == 120
+    assert time.monotonic() - start < 1.5
+    assert (client.counters["hedges"], client.counters["hedge_wins"], client.counters["attempts"]) == (1, 1, 2)
+
+def test_no_hedge_for_fast_request(server):
+    client = make_client(server, hedge_after=0.5)
+    assert len(stream_text(client)) == 120
+    assert client.counters["hedges"] == 0
+
+def test_hedge_needs_a_free_slot(server):
+    script(server, [(False, 0.5)])
+    client = make_client(server, hedge_after=0.1, max_concurrent=1)
+    assert len(stream_text(client)) == 120
+    assert (client.counters["hedges"], client.counters["attempts"]) == (0, 1)
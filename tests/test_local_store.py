@@ -0,0 +1,226 @@
+import numpy as np
+import pytest
+
+from vector_store import local_store
+from vector_store.base import FieldSpec
+from vector_store.local_store import LocalBackend, _expr_to_sql
+
+DIM = 16
+COLUMNS = ["id", "source", "chunk_index"]
+FLAT = {"index_type": "FLAT", "metric_type": "L2", "params": {}}
+IVF = {"index_type": "IVF_FLAT", "metric_type": "L2", "params": {"nlist": 16}}
+
+def make_collection(tmp_path, index_params=FLAT, rows=200, seed=0, clusters=None):
+    """写入 rows 个随机向量（clusters 不为空时围绕若干中心生成，便于IVF聚类），返回 (collection, 向量)"""
+    fields = [
+        FieldSpec("id", "int64", is_primary=True, auto_id=True),
+        FieldSpec("source", "varchar", max_length=256),
+        FieldSpec("chunk_index", "int64"),
+        FieldSpec("embedding", "float_vector", dim=DIM),
+    ]
+    backend = LocalBackend(str(tmp_path / "vector_db"))
+    backend.connect()
+    collection = backend.create_collection("test", fields, index_params)
+    rng = np.random.default_rng(seed)
+    if clusters:
+        centers = rng.normal(size=(clusters, DIM)) * 5
+        vectors = centers[rng.integers(clusters, size=rows)] + rng.normal(size=(rows, DIM))
+    else:
+        vectors = rng.normal(size=(rows, DIM))
+    vectors = vectors.astype(np.float32)
+    sources = [f"book{i % 3}.pdf" for i in range(rows)]
+    collection.insert([sources, list(range(rows)), vectors.tolist()])
+    collection.load()
+    return collection, vectors
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int, allowed=None) -> list:
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    if allowed is not None:
+        distances[~allowed] = np.inf
+    order = np.argsort(distances, kind="stable")[:k]
+    return [int(i) for i in order if np.isfinite(distances[i])]
+
+def search_ids(collection, query, k, expr=None, nprobe=None):
+    param = {"metric_type": "L2", "params": {"nprobe": nprobe} if nprobe else {}}
+    hits = collection.search([query.tolist()], "embedding", param, k, expr=expr, output_fields=["source"])[0]
+    return [hit.id for hit in hits]
+
+# ---------- 过滤表达式 ----------
+
+def test_expr_in():
+    assert _expr_to_sql("source in [\"a.pdf\", \"b.pdf\"]", COLUMNS) == ("source IN (?, ?)", ["a.pdf", "b.pdf"])
+    assert _expr_to_sql("id in [1, 2, 3]", COLUMNS) == ("id IN (?, ?, ?)", [1, 2, 3])
+
+def test_expr_in_empty_list_matches_nothing():
+    assert _expr_to_sql("id in []", COLUMNS) == ("0 = 1", [])
+
+@pytest.mark.parametrize("expr, sql, params", [
+    ("id >= 0", "id >= ?", [0]),
+    ("chunk_index < 10", "chunk_index < ?", [10]),
+    ("source == \"a.pdf\"", "source = ?", ["a.pdf"]),
+    ("chunk_index != 3", "chunk_index != ?", [3]),
+])
+def test_expr_comparison(expr, sql, params):
+    assert _expr_to_sql(expr, COLUMNS) == (sql, params)
+
+def test_expr_empty_matches_all():
+    assert _expr_to_sql(None, COLUMNS) == ("1 = 1", [])
+    assert _expr_to_sql("", COLUMNS) == ("1 = 1", [])
+
+@pytest.mark.parametrize("expr", ["secret in [1]", "secret > 1", "id in [1] or 1 = 1", "id like 1"])
+def test_expr_rejects_unknown_fields_and_syntax(expr):
+    with pytest.raises(ValueError):
+        _expr_to_sql(expr, COLUMNS)
+
+def test_query_with_filters(tmp_path):
+    collection, _ = make_collection(tmp_path, rows=30)
+    rows = collection.query("source in [\"book1.pdf\"]", output_fields=["source", "chunk_index"])
+    assert [row["chunk_index"] for row in rows] == list(range(1, 30, 3))
+    assert collection.query("id in []") == []
+    assert len(collection.query("chunk_index >= 25")) == 5
+
+# ---------- 精确检索 ----------
+
+def test_exact_search_matches_brute_force(tmp_path):
+    collection, vectors = make_collection(tmp_path, rows=300)
+    rng = np.random.default_rng(1)
+    for query in rng.normal(size=(10, DIM)).astype(np.float32):
+        assert search_ids(collection, query, 10) == exact_top_k(vectors, query, 10)
+
+def test_search_scores_are_squared_l2(tmp_path):
+    collection, vectors = make_collection(tmp_path, rows=50)
+    query = vectors[7] + 0.1
+    hit = collection.search([query.tolist()], "embedding", {}, 1)[0][0]
+    assert hit.id == 7
+    assert hit.distance == pytest.approx(float(((vectors[7] - query) ** 2).sum()), rel=1e-4)
+
+def test_exact_search_with_filter(tmp_path):
+    collection, vectors = make_collection(tmp_path, rows=300)
+    allowed = np.array([i % 3 == 2 for i in range(len(vectors))])
+    query = np.random.default_rng(2).normal(size=DIM).astype(np.float32)
+    assert search_ids(collection, query, 10, expr="source in [\"book2.pdf\"]") == \
+        exact_top_k(vectors, query, 10, allowed)
+
+# ---------- 删除 ----------
+
+def test_deleted_rows_never_returned(tmp_path):
+    collection, vectors = make_collection(tmp_path, rows=200)
+    deleted = list(range(0, 200, 2))
+    collection.delete(f"id in {deleted}")
+    allowed = np.ones(len(vectors), dtype=bool)
+    allowed[deleted] = False
+    for query in vectors[:20]:
+        ids = search_ids(collection, query, 10)
+        assert not set(ids) & set(deleted)
+        assert ids == exact_top_k(vectors, query, 10, allowed)
+    assert collection.num_entities == 100
+    assert collection.query(f"id in {deleted[:5]}") == []
+
+def test_deleted_rows_stay_deleted_after_reload(tmp_path):
+    collection, vectors = make_collection(tmp_path, rows=100)
+    collection.delete("source in [\"book0.pdf\"]")
+    collection.release()
+    collection.load()
+    for query in vectors[:10]:
+        assert all(hit_id % 3 != 0 for hit_id in search_ids(collection, query, 20))
+
+def test_search_with_everything_deleted(tmp_path):
+    collection, vectors = make_collection(tmp_path, rows=20)
+    collection.delete("id >= 0")
+    assert search_ids(collection, vectors[0], 5) == []
+
+# ---------- IVF ----------
+
+def test_ivf_not_built_below_min_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_store, "LOCAL_IVF_MIN_ROWS", 10_000)
+    collection, _ = make_collection(tmp_path, IVF, rows=500)
+    assert collection._centroids is None
+
+def test_ivf_recall_against_exact_search(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_store, "LOCAL_IVF_MIN_ROWS", 1000)
+    collection, vectors = make_collection(tmp_path, IVF, rows=2000, clusters=16)
+    assert collection._centroids is not None
+    assert len(collection._assign) == len(vectors)
+
+    k = 10
+    queries = vectors[np.random.default_rng(3).choice(len(vectors), 50, replace=False)] + 0.05
+    recall = np.mean([
+        len(set(search_ids(collection, query, k, nprobe=4)) & set(exact_top_k(vectors, query, k))) / k
+        for query in queries
+    ])
+    assert recall >= 0.9
+    # 探查全部列表时与精确检索一致
+    for query in queries[:10]:
+        assert search_ids(collection, query, k, nprobe=len(collection._centroids)) == exact_top_k(vectors, query, k)
+
+def test_ivf_rows_inserted_after_build_are_searchable(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_store, "LOCAL_IVF_MIN_ROWS", 1000)
+    collection, vectors = make_collection(tmp_path, IVF, rows=1500, clusters=8)
+    extra = vectors[:5] + 0.01
+    ids = collection.insert([["new.pdf"] * 5, list(range(5)), extra.tolist()]).primary_keys
+    assert len(collection._assign) == len(vectors) + 5
+    for new_id, query in zip(ids, extra):
+        assert search_ids(collection, query, 1, expr="source in [\"new.pdf\"]", nprobe=2) == [new_id]
+
+# ---------- 压缩 ----------
+
+def test_compaction_drops_deleted_rows_from_files(tmp_path):
+    collection, vectors = make_collection(tmp_path, rows=100)
+    collection.delete("id < 10")
+    assert len(collection._ids) == 100  # 未达到压缩比例
+    collection.delete("id < 30")
+    assert collection._ids.tolist() == list(range(30, 100))
+    directory = tmp_path / "vector_db" / "test"
+    assert (directory / "ids.i64").stat().st_size == 70 * 8
+    assert (directory / "vectors.f32").stat().st_size == 70 * DIM * 4
+    assert not (directory / "compact").exists()
+
+    allowed = np.arange(100) >= 30
+    for query in vectors[:10]:
+        assert search_ids(collection, query, 10) == exact_top_k(vectors, query, 10, allowed)
+    new_id = collection.insert([["new.pdf"], [0], [vectors[0].tolist()]]).primary_keys[0]
+    assert new_id == 100
+    assert search_ids(collection, vectors[0], 1) == [new_id]
+    rows = collection.query("id in [50]", output_fields=["embedding"])
+    assert rows[0]["embedding"] == pytest.approx(vectors[50].tolist())
+
+def test_compaction_on_load(tmp_path, monkeypatch):
+    collection, vectors = make_collection(tmp_path, rows=50)
+    monkeypatch.setattr(local_store, "LOCAL_COMPACT_RATIO", 1.1)
+    collection.delete("source in [\"book0.pdf\"]")
+    collection.release()
+    monkeypatch.setattr(local_store, "LOCAL_COMPACT_RATIO", 0.2)
+    collection.load()
+    assert collection._alive.all() and len(collection._ids) == collection.num_entities
+    allowed = np.arange(50) % 3 != 0
+    for query in vectors[:10]:
+        assert search_ids(collection, query, 5) == exact_top_k(vectors, query, 5, allowed)
+
+def test_compaction_keeps_ivf_assignment(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_store, "LOCAL_IVF_MIN_ROWS", 1000)
+    collection, vectors = make_collection(tmp_path, IVF, rows=1500, clusters=8)
+    centroids = collection._centroids.copy()
+    expected = collection._assign[collection._ids % 3 != 0]
+    collection.delete("source in [\"book0.pdf\"]")
+    assert len(collection._assign) == len(collection._ids) == 1000
+    assert (collection._assign == expected).all()
+    collection.release()
+    collection.load()
+    assert (collection._centroids == centroids).all()
+    assert (collection._assign == expected).all()
+    for hit_id in (1, 2, 4):
+        assert search_ids(collection, vectors[hit_id], 1, nprobe=2) == [hit_id]
+
+def test_interrupted_compaction_is_finished_on_load(tmp_path, monkeypatch):
+    collection, vectors = make_collection(tmp_path, rows=40)
+    finish = local_store.LocalCollection._finish_compaction
+    monkeypatch.setattr(local_store.LocalCollection, "_finish_compaction", lambda self: None)
+    collection.delete("id < 20")
+    monkeypatch.setattr(local_store.LocalCollection, "_finish_compaction", finish)
+    directory = tmp_path / "vector_db" / "test"
+    assert (directory / "compact" / "done").exists()
+
+    reopened = LocalBackend(str(tmp_path / "vector_db")).open_collection("test")
+    assert not (directory / "compact").exists()
+    assert reopened._ids.tolist() == list(range(20, 40))
+    assert search_ids(reopened, vectors[25], 1) == [25]
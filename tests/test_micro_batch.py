@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from embedding_model.micro_batch import MicroBatcher, format_batch_stats
+
+class RecordingModel:
+    """记录每批输入；gate 未放行时阻塞计算（模拟模型忙于上一批）"""
+
+    def __init__(self, fail_on: str = None):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.busy = threading.Event()
+        self.fail_on = fail_on
+
+    def __call__(self, texts):
+        self.busy.set()
+        self.gate.wait(5)
+        self.batches.append(list(texts))
+        if self.fail_on in texts:
+            raise ValueError(f"无法向量化: {self.fail_on}")
+        return [[float(len(text)), float(i)] for i, text in enumerate(texts)]
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def make(model, **kwargs):
+        batcher = MicroBatcher(model, **kwargs)
+        batchers.append(batcher)
+        return batcher
+    yield make
+    for batcher in batchers:
+        batcher.close()
+
+def test_single_query_does_not_wait(make_batcher):
+    model = RecordingModel()
+    batcher = make_batcher(model, max_wait_ms=1000)
+    start = time.perf_counter()
+    assert batcher.embed("高血压") == [3.0, 0.0]
+    assert time.perf_counter() - start < 0.5
+    assert model.batches == [["高血压"]]
+
+def test_queued_requests_are_batched_in_order(make_batcher):
+    model = RecordingModel()
+    model.gate.clear()
+    batcher = make_batcher(model, max_batch=4, max_wait_ms=200)
+    first = batcher.submit("a")
+    model.busy.wait(5)
+    # 模型忙于第一批时到达的请求合并为后续批次，每批不超过 max_batch 条
+    futures = [batcher.submit("x" * i) for i in range(1, 7)]
+    model.gate.set()
+    assert first.result(5) == [1.0, 0.0]
+    assert [future.result(5) for future in futures] == [[float(i), float((i - 1) % 4)] for i in range(1, 7)]
+    assert model.batches == [["a"], ["x", "xx", "xxx", "xxxx"], ["xxxxx", "xxxxxx"]]
+    stats = batcher.stats()
+    assert stats["batch_sizes"] == {1: 1, 2: 1, 4: 1}
+    assert (stats["items"], stats["batches"], stats["max_queue_depth"]) == (7, 3, 6)
+    assert format_batch_stats(stats)[0].startswith("查询向量化微批: 7 条 / 3 批")
+
+def test_partial_batch_is_sent_after_max_wait(make_batcher):
+    model = RecordingModel()
+    model.gate.clear()
+    batcher = make_batcher(model, max_batch=16, max_wait_ms=50)
+    batcher.submit("a")
+    model.busy.wait(5)
+    futures = [batcher.submit(text) for text in ("b", "c")]
+    model.gate.set()
+    assert [future.result(5)[0] for future in futures] == [1.0, 1.0]
+    assert model.batches == [["a"], ["b", "c"]]
+
+def test_error_fails_only_its_batch(make_batcher):
+    model = RecordingModel(fail_on="坏")
+    model.gate.clear()
+    batcher = make_batcher(model, max_batch=2)
+    first = batcher.submit("好")
+    model.busy.wait(5)
+    failing = [batcher.submit("坏"), batcher.submit("好")]
+    later = batcher.submit("好好")
+    model.gate.set()
+    assert first.result(5) == [1.0, 0.0]
+    for future in failing:
+        with pytest.raises(ValueError, match="无法向量化"):
+            future.result(5)
+    # 出错后后台线程继续处理后续请求
+    assert later.result(5) == [2.0, 0.0]
+    assert batcher.embed("好") == [1.0, 0.0]
+
+def test_submit_after_close_raises():
+    batcher = MicroBatcher(RecordingModel())
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit("a")
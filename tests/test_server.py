@@ -0,0 +1,172 @@
+import asyncio
+import json
+import threading
+import time
+
+from server import ChatServer, SessionStore
+
+class FakeAgent:
+    """按片段返回固定回答；gate 未放行时每个片段前阻塞（模拟慢速生成）"""
+
+    def __init__(self, pieces=("高血压", "是一种", "常见病。")):
+        self.pieces = pieces
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+        self.closed = 0
+        self.embeddings = None
+        self.memory_summarizer = type("Summarizer", (), {"stats": lambda self: {}})()
+
+    def llm_stats(self):
+        return {}
+
+    def chat(self, query, memory):
+        self.started.set()
+        try:
+            for piece in self.pieces:
+                self.gate.wait(5)
+                yield piece
+            memory.add(query, "".join(self.pieces))
+        except GeneratorExit:
+            self.closed += 1
+            raise
+
+async def request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), payload.decode('utf-8')
+
+def parse_sse(payload: str):
+    events = []
+    for block in payload.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def run(agent, scenario, **kwargs):
+    """启动服务并运行 scenario(server, port)"""
+    async def main():
+        server = ChatServer(agent, **kwargs)
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            async with listener:
+                return await scenario(server, port)
+        finally:
+            agent.gate.set()
+            server.executor.shutdown(wait=True)
+    return asyncio.run(main())
+
+async def new_session(port) -> str:
+    status, payload = await request(port, "POST", "/sessions")
+    assert status == 200
+    return json.loads(payload)["session_id"]
+
+async def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+def test_chat_streams_sse_and_records_history():
+    agent = FakeAgent()
+
+    async def scenario(server, port):
+        session_id = await new_session(port)
+        status, payload = await request(port, "POST", f"/sessions/{session_id}/chat", {"query": "什么是高血压"})
+        assert status == 200
+        events = parse_sse(payload)
+        assert [data["text"] for event, data in events if event == "chunk"] == list(agent.pieces)
+        assert events[-1][0] == "done" and events[-1][1]["chars"] == len("".join(agent.pieces))
+        session = server.sessions.get(session_id)
+        assert len(session.memory) == 1 and not session.busy
+        status, payload = await request(port, "GET", "/stats")
+        stats = json.loads(payload)
+        assert (stats["sessions"], stats["completed"], stats["active"], stats["waiting"]) == (1, 1, 0, 0)
+
+    run(agent, scenario)
+
+def test_request_errors():
+    async def scenario(server, port):
+        session_id = await new_session(port)
+        assert (await request(port, "POST", "/sessions/missing/chat", {"query": "问题"}))[0] == 404
+        assert (await request(port, "POST", f"/sessions/{session_id}/chat", {"query": "  "}))[0] == 400
+        assert (await request(port, "POST", f"/sessions/{session_id}/chat", ["问题"]))[0] == 400
+        assert (await request(port, "GET", "/sessions"))[0] == 405
+        assert (await request(port, "GET", "/unknown"))[0] == 404
+        assert (await request(port, "DELETE", f"/sessions/{session_id}"))[0] == 204
+        assert (await request(port, "DELETE", f"/sessions/{session_id}"))[0] == 404
+
+    run(FakeAgent(), scenario)
+
+def test_second_question_in_same_session_conflicts():
+    agent = FakeAgent()
+    agent.gate.clear()
+
+    async def scenario(server, port):
+        session_id = await new_session(port)
+        first = asyncio.ensure_future(request(port, "POST", f"/sessions/{session_id}/chat", {"query": "问题1"}))
+        await wait_until(agent.started.is_set)
+        assert (await request(port, "POST", f"/sessions/{session_id}/chat", {"query": "问题2"}))[0] == 409
+        agent.gate.set()
+        assert (await first)[0] == 200
+        assert len(server.sessions.get(session_id).memory) == 1
+
+    run(agent, scenario)
+
+def test_full_queue_is_rejected():
+    agent = FakeAgent()
+    agent.gate.clear()
+
+    async def scenario(server, port):
+        sessions = [await new_session(port) for _ in range(3)]
+        chats = [asyncio.ensure_future(request(port, "POST", f"/sessions/{s}/chat", {"query": "问题"}))
+                 for s in sessions[:2]]
+        await wait_until(lambda: server.active == 1 and server.waiting == 1)
+        status, _ = await request(port, "POST", f"/sessions/{sessions[2]}/chat", {"query": "问题"})
+        assert status == 503 and server.rejected == 1
+        agent.gate.set()
+        assert [(await chat)[0] for chat in chats] == [200, 200]
+        assert server.completed == 2
+
+    run(agent, scenario, max_concurrent=1, max_queue=1)
+
+def test_disconnect_stops_generation_and_skips_history():
+    agent = FakeAgent()
+    agent.gate.clear()
+
+    async def scenario(server, port):
+        session_id = await new_session(port)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps({"query": "问题"}).encode()
+        writer.write(f"POST /sessions/{session_id}/chat HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+                     + body)
+        await writer.drain()
+        await wait_until(agent.started.is_set)
+        writer.close()
+        await wait_until(lambda: server.cancelled == 1)
+        agent.gate.set()
+        await wait_until(lambda: agent.closed == 1)
+        session = server.sessions.get(session_id)
+        assert len(session.memory) == 0 and not session.busy and server.completed == 0
+
+    run(agent, scenario)
+
+def test_session_store_expiry_and_capacity():
+    store = SessionStore(ttl=60, max_sessions=2)
+    first, second = store.create(), store.create()
+    first.last_used -= 30
+    third = store.create()
+    # 超出数量上限时删除最久未使用的空闲会话
+    assert store.get(first.id) is None and store.get(second.id) is second and len(store) == 2
+
+    second.busy = third.busy = True
+    assert store.create() is None
+    second.busy = third.busy = False
+    third.last_used -= 120
+    assert store.get(third.id) is None and len(store) == 1
@@ -0,0 +1,97 @@
+import pytest
+from langchain.schema import Document
+
+import vector_store
+from benchmarks.fake_embedding import HashEmbedder
+from utils import parallel_ingest, pdf_loader
+from utils.manifest import Manifest, chunk_hash
+from vector_store.local_store import LocalBackend
+
+FILENAME = "内科学.pdf"
+ORIGINAL = [["高血压", "高血压的诊断"], ["糖尿病", "糖尿病的治疗", "糖尿病的并发症"]]
+
+def split(items, size="500"):
+    """模拟分块结果：每个条目内的块从0开始编号"""
+    return [Document(page_content=text, metadata={"chunk_index": str(i), "chunk_total": str(len(texts)),
+                                                   "chunk_size": size, "chunk_overlap": "100"})
+            for texts in items for i, text in enumerate(texts)]
+
+class CountingEmbedder(HashEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return super().embed_documents(texts)
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    """本地向量库中已入库一个PDF，返回 (collection, manifest, pdf路径)"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(vector_store, "_backend", LocalBackend(str(tmp_path / "vector_db")))
+    monkeypatch.setattr(pdf_loader, "print_step", lambda text: None)
+    pdf_path = tmp_path / FILENAME
+    pdf_path.write_bytes(b"%PDF-1.4 v1")
+
+    collection = pdf_loader.init_collection(pdf_loader.get_collection_name(FILENAME))
+    ids = pdf_loader.index_documents(collection, split(ORIGINAL), HashEmbedder())
+    manifest = Manifest(str(tmp_path / "kb_manifest.json"))
+    manifest.record(FILENAME, str(pdf_path), collection.name, ids)
+    manifest.save()
+    return collection, manifest, str(pdf_path)
+
+def update(kb, monkeypatch, documents, embedder=None):
+    collection, manifest, pdf_path = kb
+    monkeypatch.setattr(parallel_ingest, "parse_and_split", lambda path: documents)
+    return pdf_loader.update_pdf(pdf_path, collection, embedder or HashEmbedder(), manifest)
+
+def contents(collection) -> dict:
+    return {row["content"]: row["id"] for row in collection.query("id >= 0", output_fields=["content"])}
+
+def test_only_changed_chunks_are_reembedded(kb, monkeypatch):
+    collection, manifest, _ = kb
+    before = contents(collection)
+    embedder = CountingEmbedder()
+    changed = [["高血压", "高血压的诊断标准"], ORIGINAL[1]]
+
+    assert update(kb, monkeypatch, split(changed), embedder) == (1, 1, 4)
+    assert embedder.texts == ["高血压的诊断标准"]
+    after = contents(collection)
+    assert set(after) == {text for texts in changed for text in texts}
+    # 未变化的块保留原有ID
+    assert all(after[text] == before[text] for text in after if text != "高血压的诊断标准")
+    # 清单中的块哈希与向量库一致，之后再次更新不需要任何向量化
+    assert sorted(i for ids in manifest.get(FILENAME, collection.name)["chunks"].values() for i in ids) \
+        == sorted(after.values())
+    assert update(kb, monkeypatch, split(changed), embedder) == (0, 0, 5)
+    assert embedder.texts == ["高血压的诊断标准"]
+
+def test_removed_chunk_renumbers_only_its_item(kb, monkeypatch):
+    collection, _, _ = kb
+    # 第二个条目删掉一块后 chunk_total 变化，该条目的块全部视为新块；第一个条目不受影响
+    assert update(kb, monkeypatch, split([ORIGINAL[0], ["糖尿病", "糖尿病的治疗"]])) == (2, 3, 2)
+    assert set(contents(collection)) == {"高血压", "高血压的诊断", "糖尿病", "糖尿病的治疗"}
+
+def test_duplicate_chunks_keep_one_id_each(kb, monkeypatch):
+    collection, _, _ = kb
+    duplicated = split(ORIGINAL) + split([ORIGINAL[0]])
+    assert update(kb, monkeypatch, duplicated) == (2, 0, 5)
+    assert collection.num_entities == 7
+
+def test_manifest_rebuilt_from_vector_store(kb, monkeypatch):
+    collection, manifest, pdf_path = kb
+    # 旧版本数据没有块清单，从向量库读出内容重新计算哈希
+    manifest.record(FILENAME, pdf_path, collection.name, None)
+    assert update(kb, monkeypatch, split(ORIGINAL)) == (0, 0, 5)
+    expected = {chunk_hash(doc.page_content, doc.metadata) for doc in split(ORIGINAL)}
+    assert set(manifest.get(FILENAME, collection.name)["chunks"]) == expected
+
+def test_full_reindex_of_data_from_older_splitter_is_announced(kb, monkeypatch):
+    collection, _, _ = kb
+    steps = []
+    monkeypatch.setattr(pdf_loader, "print_step", steps.append)
+    # 分块参数变化后所有块的哈希都对不上
+    assert update(kb, monkeypatch, split(ORIGINAL, size="800")) == (5, 5, 0)
+    assert any("全量重新向量化 5 块" in step for step in steps)
+    assert collection.num_entities == 5
@@ -0,0 +1,223 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+# 答案缓存配置，可通过环境变量调整
+CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "./answer_cache/answers.sqlite")
+CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))  # 秒
+CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # 语义命中的余弦相似度阈值
+
+def normalize_query(query: str) -> str:
+    """规范化问题文本：去除空白和标点，统一小写"""
+    return re.sub(r'[\s\W_]+', '', query.lower())
+
+def history_digest(history: str) -> str:
+    """历史对话（摘要 + 近期对话）的摘要值，没有历史时为空字符串
+
+    追问（如“它的常用剂量是多少？”）的答案取决于历史对话，只能在历史相同时复用。
+    """
+    if not history:
+        return ""
+    return hashlib.sha256(history.encode("utf-8")).hexdigest()[:16]
+
+def _cache_key(query: str, chunk_ids: Iterable[str], history: str = "") -> str:
+    raw = normalize_query(query) + "|" + ",".join(sorted(chunk_ids))
+    if history:
+        raw += "|" + history
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _scope_key(scope: Iterable[str], history: str = "") -> str:
+    """语义匹配的范围：知识库文件列表，有历史对话时再加上历史摘要值"""
+    key = json.dumps(sorted(scope), ensure_ascii=False)
+    return f"{key}|{history}" if history else key
+
+# 各缓存文件当前打开的实例，知识库更新时通过这些实例失效，保证内存中的问题向量同步
+_instances: Dict[str, "weakref.WeakSet[AnswerCache]"] = {}
+
+class AnswerCache:
+    """持久化答案缓存：按(规范化问题, 检索到的chunk ID)精确匹配，并支持按问题向量的语义匹配"""
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 ttl: float = CACHE_TTL, threshold: float = CACHE_SIMILARITY):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+        self._evict()
+        self._load_vectors()
+        _instances.setdefault(os.path.abspath(path), weakref.WeakSet()).add(self)
+
+    def _load_vectors(self):
+        """将问题向量载入内存，用于语义匹配
+
+        前 len(self._keys) 行有效，其余为预留空间；新增条目追加到末尾，删除条目时用最后一行填补。
+        """
+        rows = self._db.execute("SELECT key, scope, embedding FROM answers").fetchall()
+        self._keys = [row[0] for row in rows]
+        self._scopes = [row[1] for row in rows]
+        self._positions: Dict[str, int] = {key: i for i, key in enumerate(self._keys)}
+        if rows:
+            self._vectors = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        else:
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def _put_vector(self, key: str, scope: str, vector: np.ndarray):
+        i = self._positions.get(key)
+        if i is None:
+            i = len(self._keys)
+            if i >= self._vectors.shape[0] or self._vectors.shape[1] != vector.shape[0]:
+                grown = np.zeros((max(16, 2 * i), vector.shape[0]), dtype=np.float32)
+                if self._vectors.shape[1] == vector.shape[0]:
+                    grown[:i] = self._vectors[:i]
+                self._vectors = grown
+            self._keys.append(key)
+            self._scopes.append(scope)
+            self._positions[key] = i
+        else:
+            self._scopes[i] = scope
+        self._vectors[i] = vector
+
+    def _drop_vector(self, key: str):
+        i = self._positions.pop(key, None)
+        if i is None:
+            return
+        last = len(self._keys) - 1
+        if i != last:
+            self._keys[i] = self._keys[last]
+            self._scopes[i] = self._scopes[last]
+            self._vectors[i] = self._vectors[last]
+            self._positions[self._keys[i]] = i
+        self._keys.pop()
+        self._scopes.pop()
+
+    def _evict(self) -> List[str]:
+        """删除过期条目，超过容量时按最近访问时间淘汰，返回被删除的键"""
+        keys = [row[0] for row in self._db.execute("""
+            SELECT key FROM answers WHERE created < ? OR key NOT IN (
+                SELECT key FROM answers ORDER BY accessed DESC LIMIT ?
+            )
+        """, (time.time() - self.ttl, self.max_entries))]
+        if keys:
+            self._db.executemany("DELETE FROM answers WHERE key = ?", [(key,) for key in keys])
+            self._db.commit()
+        return keys
+
+    def _fetch(self, key: str) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT answer, created FROM answers WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time() - self.ttl:
+            return None
+        self._db.execute("UPDATE answers SET accessed = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        return row[0]
+
+    def lookup_semantic(self, query_embedding, scope: Iterable[str], history: str = "") -> Optional[str]:
+        """按问题向量查找相似问题的答案，仅匹配相同知识库范围、相同历史对话（history_digest）的条目"""
+        scope_key = _scope_key(scope, history)
+        with self._lock:
+            if len(self._keys):
+                vector = np.asarray(query_embedding, dtype=np.float32)
+                # 向量已归一化，点积即余弦相似度
+                scores = self._vectors[:len(self._keys)] @ vector
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    if self._scopes[i] != scope_key:
+                        continue
+                    answer = self._fetch(self._keys[i])
+                    if answer is not None:
+                        self.hits["semantic"] += 1
+                        return answer
+        return None
+
+    def lookup(self, query: str, chunk_ids: Iterable[str], history: str = "") -> Optional[str]:
+        """按规范化问题、检索到的chunk ID和历史对话摘要值精确查找"""
+        with self._lock:
+            answer = self._fetch(_cache_key(query, chunk_ids, history))
+            if answer is not None:
+                self.hits["exact"] += 1
+            else:
+                self.misses += 1
+            return answer
+
+    def store(self, query: str, chunk_ids: Iterable[str], sources: Iterable[str],
+              scope: Iterable[str], query_embedding, answer: str, history: str = ""):
+        """保存答案，history 为提问时的历史对话摘要值"""
+        key = _cache_key(query, chunk_ids, history)
+        scope_key = _scope_key(scope, history)
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, scope_key, json.dumps(sorted(set(sources)), ensure_ascii=False),
+                 vector.tobytes(), answer, now, now)
+            )
+            self._db.commit()
+            # 只更新内存中变化的条目，不重新读取全部问题向量
+            self._put_vector(key, scope_key, vector)
+            for evicted in self._evict():
+                self._drop_vector(evicted)
+
+    def invalidate_sources(self, sources: Iterable[str]) -> int:
+        """删除引用了指定文件的所有条目，返回删除数量"""
+        removed = 0
+        with self._lock:
+            for source in sources:
+                # sources 列存储JSON数组，按带引号的文件名匹配
+                pattern = "%" + json.dumps(source, ensure_ascii=False) + "%"
+                removed += self._db.execute(
+                    "DELETE FROM answers WHERE sources LIKE ? OR scope LIKE ?", (pattern, pattern)
+                ).rowcount
+            self._db.commit()
+            self._load_vectors()
+        return removed
+
+    def stats(self) -> dict:
+        """命中/未命中统计"""
+        lookups = self.hits["exact"] + self.hits["semantic"] + self.misses
+        with self._lock:
+            entries = len(self._keys)
+        return {
+            "entries": entries,
+            "exact_hits": self.hits["exact"],
+            "semantic_hits": self.hits["semantic"],
+            "misses": self.misses,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+        }
+
+def invalidate_source(source: str, path: str = CACHE_PATH) -> int:
+    """集合重建时调用：使引用该文件的缓存答案失效，该缓存已打开时通过同一实例删除"""
+    caches = list(_instances.get(os.path.abspath(path), ()))
+    if caches:
+        return sum(cache.invalidate_sources([source]) for cache in caches)
+    if not os.path.exists(path):
+        return 0
+    return AnswerCache(path).invalidate_sources([source])
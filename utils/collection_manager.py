@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterable, Optional
+from vector_store import VectorCollection
+
+# 是否按需加载collection（首次检索时才加载到内存），KB_LAZY_LOAD=0 时启动时全部加载
+LAZY_LOAD = os.getenv("KB_LAZY_LOAD", "1") != "0"
+# 已加载collection的内存预算（MB），0 表示不限制
+MEMORY_BUDGET_MB = float(os.getenv("KB_MEMORY_BUDGET_MB", "0"))
+# 每个文本块加载后的估计内存占用：1792维float32向量 + 标量字段（content等，平均约2KB）
+ROW_BYTES = int(os.getenv("KB_ROW_BYTES", str(1792 * 4 + 2048)))
+
+@dataclass
+class CollectionEvent:
+    kind: str  # load / evict / release
+    name: str
+    bytes: int
+    seconds: float
+    used_bytes: int
+    budget_bytes: int
+
+class _Entry:
+    def __init__(self, collection: VectorCollection):
+        self.collection = collection
+        self.lock = threading.Lock()  # 串行化同一collection的加载与释放
+        self.loaded = False
+        self.evicting = False
+        self.bytes = 0
+        self.pins = 0  # 正在使用（检索中）的次数，使用中的collection不会被释放
+        self.release_pending = False  # 使用中被要求释放，最后一个使用者结束后释放
+        self.retired = False  # 使用中被移出知识库，最后一个使用者结束后停止跟踪
+
+class CollectionManager:
+    """按需加载collection并跟踪其内存占用
+
+    已加载的collection按最近使用顺序排列，总占用超出预算时释放最久未使用且当前未在检索中的collection。
+    检索期间collection被固定，多个collection同时检索时总占用可能暂时超出预算，检索结束后再释放。
+    """
+
+    def __init__(self, budget_bytes: int = None, row_bytes: int = ROW_BYTES,
+                 on_event: Optional[Callable[[CollectionEvent], None]] = None, history: int = 100):
+        self.budget_bytes = int(MEMORY_BUDGET_MB * 1024 * 1024) if budget_bytes is None else budget_bytes
+        self.row_bytes = row_bytes
+        self.on_event = on_event
+        self.events: Deque[CollectionEvent] = deque(maxlen=history)
+        self.loads = 0
+        self.evictions = 0
+        self._entries: Dict[str, _Entry] = {}
+        self._lru: "OrderedDict[str, None]" = OrderedDict()  # 已加载的collection，最近使用的在末尾
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def estimate_bytes(self, collection: VectorCollection) -> int:
+        """按文本块数量估计collection加载后的内存占用（紧凑结构或降维的collection按向量类型和维度估计）"""
+        from utils.compact_schema import EMBEDDING_DIM, layout_of
+        layout = layout_of(collection)
+        full_size = not layout.compact and layout.dim == EMBEDDING_DIM
+        return collection.num_entities * (self.row_bytes if full_size else layout.row_bytes())
+
+    def _entry(self, collection: VectorCollection) -> _Entry:
+        entry = self._entries.get(collection.name)
+        if entry is None:
+            entry = self._entries[collection.name] = _Entry(collection)
+        else:
+            entry.collection = collection
+            entry.retired = False
+        return entry
+
+    def is_loaded(self, collection: VectorCollection) -> bool:
+        with self._lock:
+            entry = self._entries.get(collection.name)
+            return entry is not None and entry.loaded
+
+    @contextmanager
+    def use(self, collection: VectorCollection):
+        """使用collection进行检索：未加载时先加载，使用期间不会被释放"""
+        with self._lock:
+            entry = self._entry(collection)
+            entry.pins += 1
+        try:
+            self._ensure_loaded(entry)
+            with self._lock:
+                # 使用期间collection可能已被移出知识库（retain），此时不再计入LRU
+                if collection.name in self._lru:
+                    self._lru.move_to_end(collection.name)
+            yield entry.collection
+        finally:
+            with self._lock:
+                entry.pins -= 1
+                if entry.pins == 0 and entry.retired and self._entries.get(entry.collection.name) is entry:
+                    self._mark_unloaded(self._entries.pop(entry.collection.name))
+                release = entry.pins == 0 and entry.release_pending and not entry.retired
+            if release:
+                self._release(entry)
+            self._evict()
+
+    def track_loaded(self, collection: VectorCollection):
+        """登记已在内存中的collection（如启动时全部加载），超出预算时按LRU释放"""
+        with self._lock:
+            entry = self._entry(collection)
+        with entry.lock:
+            if not entry.loaded:
+                self._mark_loaded(entry, self.estimate_bytes(collection))
+        self._evict()
+
+    def release(self, collection: VectorCollection):
+        """释放collection并停止跟踪其占用，下次使用时重新加载；正在检索中时推迟到检索结束后释放"""
+        with self._lock:
+            entry = self._entry(collection)
+        self._release(entry)
+
+    def _release(self, entry: _Entry):
+        with entry.lock:
+            with self._lock:
+                if entry.pins > 0:
+                    entry.release_pending = True
+                    return
+                entry.release_pending = False
+            start = time.perf_counter()
+            entry.collection.release()
+            with self._lock:
+                freed = self._mark_unloaded(entry)
+            self._emit("release", entry, freed, time.perf_counter() - start)
+
+    def retain(self, collections: Iterable[VectorCollection]):
+        """只保留仍在知识库中的collection记录（已删除的collection不再计入占用）"""
+        names = {collection.name for collection in collections}
+        with self._lock:
+            for name in list(self._entries):
+                if name not in names:
+                    if self._entries[name].pins > 0:
+                        # 检索中的collection在检索结束后再停止跟踪，保证同一collection只有一份记录
+                        self._entries[name].retired = True
+                        continue
+                    self._mark_unloaded(self._entries.pop(name))
+
+    def _mark_loaded(self, entry: _Entry, size: int):
+        with self._lock:
+            entry.loaded = True
+            entry.evicting = False
+            if self._entries.get(entry.collection.name) is not entry:
+                # 已停止跟踪的collection不计入占用
+                entry.bytes = 0
+                return
+            entry.bytes = size
+            self._used += size
+            self._lru[entry.collection.name] = None
+
+    def _mark_unloaded(self, entry: _Entry) -> int:
+        """调用方需持有 self._lock，返回释放的字节数"""
+        freed = entry.bytes if entry.loaded else 0
+        if entry.loaded:
+            self._used -= entry.bytes
+        entry.loaded = False
+        entry.bytes = 0
+        self._lru.pop(entry.collection.name, None)
+        return freed
+
+    def _ensure_loaded(self, entry: _Entry):
+        with entry.lock:
+            if entry.loaded:
+                return
+            start = time.perf_counter()
+            entry.collection.load()
+            self._mark_loaded(entry, self.estimate_bytes(entry.collection))
+            self.loads += 1
+        self._emit("load", entry, entry.bytes, time.perf_counter() - start)
+
+    def _evict(self):
+        """释放最久未使用的collection，直到总占用不超过预算"""
+        if self.budget_bytes <= 0:
+            return
+        victims = []
+        with self._lock:
+            for name in list(self._lru):
+                if self._used <= self.budget_bytes:
+                    break
+                entry = self._entries[name]
+                if entry.pins > 0:
+                    continue
+                entry.evicting = True
+                victims.append((entry, self._mark_unloaded(entry)))
+        for entry, freed in victims:
+            with entry.lock:
+                with self._lock:
+                    # 标记之后又被重新加载或正在被使用时放弃释放
+                    if not entry.evicting or entry.pins > 0 or entry.loaded:
+                        entry.evicting = False
+                        continue
+                    entry.evicting = False
+                start = time.perf_counter()
+                entry.collection.release()
+                self.evictions += 1
+            self._emit("evict", entry, freed, time.perf_counter() - start)
+
+    def _emit(self, kind: str, entry: _Entry, size: int, seconds: float):
+        event = CollectionEvent(kind, entry.collection.name, size, seconds, self._used, self.budget_bytes)
+        self.events.append(event)
+        if self.on_event:
+            self.on_event(event)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": list(self._lru),
+                "used_bytes": self._used,
+                "budget_bytes": self.budget_bytes,
+                "tracked": len(self._entries),
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+def format_event(event: CollectionEvent) -> str:
+    labels = {"load": "载入", "evict": "释放(超出预算)", "release": "释放"}
+    budget = f"{event.budget_bytes / 2**20:.0f} MB" if event.budget_bytes > 0 else "不限"
+    return (f"[{labels.get(event.kind, event.kind)}] {event.name}: {event.bytes / 2**20:.1f} MB, "
+            f"{event.seconds:.1f} 秒 (已用 {event.used_bytes / 2**20:.0f} MB / {budget})")
@@ -0,0 +1,193 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator, List
+import numpy as np
+from vector_store import FieldSpec, VectorCollection, get_backend
+from embedding_model.projection import get_projection
+from utils.content_store import get_content_store
+
+# 新建collection使用的结构：legacy 与早期版本一致；compact 使用整数元数据、量化向量，文本存于旁路存储
+SCHEMA_MODE = os.getenv("KB_SCHEMA", "legacy")
+# 紧凑结构的向量类型：float16（半精度）或 binary（按符号位量化，检索后用float16副本重排）
+VECTOR_TYPE = os.getenv("KB_VECTOR_TYPE", "float16")
+# 二值向量检索时的候选放大倍数，重排后保留 limit 个
+RESCORE_FACTOR = int(os.getenv("KB_RESCORE_FACTOR", "4"))
+EMBEDDING_DIM = 1792
+CHUNK_FIELDS = ["chunk_index", "chunk_total", "chunk_size", "chunk_overlap"]
+
+@dataclass(frozen=True)
+class Layout:
+    compact: bool
+    vector_type: str
+    dim: int = EMBEDDING_DIM
+
+    @property
+    def binary(self) -> bool:
+        return self.vector_type == "binary_vector"
+
+    def row_bytes(self, text_bytes: int = 2048) -> int:
+        """每行在向量库中的估计内存占用：向量 + 标量字段（legacy 结构含平均 text_bytes 的文本）"""
+        if self.binary:
+            return self.dim // 8 + 64
+        if self.compact:
+            return self.dim * 2 + 64
+        return self.dim * 4 + text_bytes
+
+def collection_fields(with_source: bool = False, schema: str = SCHEMA_MODE,
+                      vector_type: str = VECTOR_TYPE, dim: int = EMBEDDING_DIM) -> List[FieldSpec]:
+    """生成新collection的字段定义，默认按 KB_SCHEMA / KB_VECTOR_TYPE，dim 为（降维后的）向量维度"""
+    fields = [FieldSpec(name="id", dtype="int64", is_primary=True, auto_id=True)]
+    if with_source:
+        fields.append(FieldSpec(name="source", dtype="varchar", max_length=512, is_partition_key=True))
+    if schema != "compact":
+        fields += [FieldSpec(name=name, dtype="varchar", max_length=10) for name in CHUNK_FIELDS]
+        fields += [
+            FieldSpec(name="content", dtype="varchar", max_length=5000),
+            FieldSpec(name="embedding", dtype="float_vector", dim=dim),
+        ]
+        return fields
+    fields += [FieldSpec(name=name, dtype="int32") for name in CHUNK_FIELDS]
+    vector_dtype = "binary_vector" if vector_type == "binary" else "float16_vector"
+    fields.append(FieldSpec(name="embedding", dtype=vector_dtype, dim=dim))
+    return fields
+
+_layouts: Dict[str, Layout] = {}
+_layouts_lock = threading.Lock()
+
+def layout_of(collection: VectorCollection) -> Layout:
+    """collection的存储结构（按字段判断，已有collection不受 KB_SCHEMA 影响）"""
+    with _layouts_lock:
+        layout = _layouts.get(collection.name)
+    if layout is None:
+        fields = get_backend().describe(collection)
+        vector = next(spec for spec in fields if spec.dtype.endswith("vector"))
+        layout = Layout(not any(spec.name == "content" for spec in fields), vector.dtype, vector.dim)
+        with _layouts_lock:
+            _layouts[collection.name] = layout
+    return layout
+
+def forget_layout(collection_name: str):
+    with _layouts_lock:
+        _layouts.pop(collection_name, None)
+
+def encode_vectors(vectors, vector_type: str) -> list:
+    """将float32向量转换为写入或检索所需的格式"""
+    if vector_type == "float16_vector":
+        return [np.asarray(vector, dtype=np.float16) for vector in vectors]
+    if vector_type == "binary_vector":
+        return [np.packbits(np.asarray(vector) > 0).tobytes() for vector in vectors]
+    return list(vectors)
+
+def project(collection: VectorCollection, vectors):
+    """按collection建立时保存的投影对模型输出的向量降维，写入和检索都经过这里"""
+    projection = get_projection(collection.name)
+    return vectors if projection is None else projection.apply(vectors).tolist()
+
+def insert_rows(collection: VectorCollection, documents, vectors, source: str = None,
+                projected: bool = False) -> List[int]:
+    """写入一批文本块，紧凑结构下文本和float16向量副本写入旁路存储，返回ID列表
+
+    vectors 为模型输出的原始向量；projected 表示已按该collection的投影降维（如迁移时读出的向量）。
+    """
+    layout = layout_of(collection)
+    if not projected:
+        vectors = project(collection, vectors)
+    if not layout.compact:
+        data = [[doc.metadata[name] for doc in documents] for name in CHUNK_FIELDS]
+        data += [[doc.page_content for doc in documents], vectors]
+    else:
+        data = [[int(doc.metadata[name]) for doc in documents] for name in CHUNK_FIELDS]
+        data.append(encode_vectors(vectors, layout.vector_type))
+    if source is not None:
+        data.insert(0, [source] * len(documents))
+    ids = list(collection.insert(data).primary_keys)
+    if layout.compact:
+        # 只有二值向量需要重排，float16 的检索距离已足够精确，不再保存副本
+        get_content_store(collection.name).put_many(
+            ids, [doc.page_content for doc in documents], vectors if layout.binary else None
+        )
+    return ids
+
+def iter_rows(collection: VectorCollection, expr: str, fields: List[str], batch_size: int = 1000) -> Iterator[dict]:
+    """逐行读取文本块，紧凑结构下从旁路存储补全 content，元数据统一为字符串"""
+    layout = layout_of(collection)
+    query_fields = [name for name in fields if not (layout.compact and name == "content")]
+    iterator = collection.query_iterator(batch_size=batch_size, expr=expr, output_fields=query_fields)
+    while True:
+        rows = iterator.next()
+        if not rows:
+            iterator.close()
+            return
+        if layout.compact and "content" in fields:
+            contents = get_content_store(collection.name).get_contents([row["id"] for row in rows])
+            for row in rows:
+                row["content"] = contents.get(row["id"], "")
+        if layout.compact and "embedding" in fields:
+            _decode_embeddings(collection, layout, rows)
+        for row in rows:
+            for name in CHUNK_FIELDS:
+                if name in row:
+                    row[name] = str(row[name])
+            yield row
+
+def _decode_embeddings(collection: VectorCollection, layout: Layout, rows: List[dict]):
+    """将紧凑结构的向量还原为float32（二值向量使用旁路存储中的float16副本）"""
+    if layout.binary:
+        vectors = get_content_store(collection.name).get_vectors([row["id"] for row in rows])
+        for row in rows:
+            row["embedding"] = vectors[row["id"]]
+        return
+    for row in rows:
+        vector = row["embedding"]
+        if isinstance(vector, list) and vector and isinstance(vector[0], bytes):
+            # pymilvus 查询float16向量时返回 [bytes]
+            vector = vector[0]
+        if isinstance(vector, bytes):
+            vector = np.frombuffer(vector, dtype=np.float16)
+        row["embedding"] = np.asarray(vector, dtype=np.float32)
+
+def delete_content(collection: VectorCollection, ids: List[int]):
+    if ids and layout_of(collection).compact:
+        get_content_store(collection.name).delete(ids)
+
+def search(collection: VectorCollection, query_embedding, search_params: Dict, limit: int,
+           output_fields: List[str], expr: str = None, timeout: float = None) -> List[dict]:
+    """检索并返回 [{id, score, fields}]，按距离升序
+
+    紧凑结构下不返回 content（由 fill_contents 只为最终结果读取）；二值向量先按汉明距离
+    取 limit × RESCORE_FACTOR 个候选，再用float16副本计算与查询向量的L2距离重排。
+    """
+    layout = layout_of(collection)
+    query_embedding = project(collection, query_embedding)
+    fields = [name for name in output_fields if not (layout.compact and name == "content")]
+    candidates = limit * RESCORE_FACTOR if layout.binary else limit
+    results = collection.search(
+        encode_vectors([query_embedding], layout.vector_type), "embedding", search_params,
+        limit=candidates, expr=expr, output_fields=fields, timeout=timeout
+    )
+    hits = [{"id": hit.id, "score": hit.score, "fields": {name: hit.get(name) for name in fields}}
+            for hit in results[0]]
+    if layout.binary and hits:
+        vectors = get_content_store(collection.name).get_vectors([hit["id"] for hit in hits])
+        query = np.asarray(query_embedding, dtype=np.float32)
+        for hit in hits:
+            vector = vectors.get(hit["id"])
+            hit["score"] = float(((vector - query) ** 2).sum()) if vector is not None else float("inf")
+        hits.sort(key=lambda hit: hit["score"])
+    for hit in hits:
+        for name in CHUNK_FIELDS:
+            if hit["fields"].get(name) is not None:
+                hit["fields"][name] = str(hit["fields"][name])
+    return hits[:limit]
+
+def fill_contents(docs: List[dict], collections: Dict[str, VectorCollection]):
+    """为紧凑结构的检索结果按ID读取文本，docs 的 metadata 中 source 为文件名"""
+    pending: Dict[str, List[dict]] = {}
+    for doc in docs:
+        if doc['page_content'] is None:
+            pending.setdefault(collections[doc['metadata']['source']].name, []).append(doc)
+    for name, group in pending.items():
+        contents = get_content_store(name).get_contents([doc['metadata']['id'] for doc in group])
+        for doc in group:
+            doc['page_content'] = contents.get(doc['metadata']['id'], "")
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+# 紧凑模式下文本块内容和float16向量副本的存放目录，每个collection一个SQLite文件
+CONTENT_STORE_DIR = os.getenv("CONTENT_STORE_DIR", "./content_store")
+
+class ContentStore:
+    """文本块旁路存储：按向量库ID保存zlib压缩的文本和float16向量（用于二值向量检索后的重排）"""
+
+    def __init__(self, collection_name: str, directory: str = CONTENT_STORE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{collection_name}.sqlite")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, content BLOB NOT NULL, vector BLOB)"
+        )
+        self._db.commit()
+
+    def put_many(self, ids: List[int], contents: List[str], vectors: Optional[Iterable] = None):
+        vectors = [None] * len(ids) if vectors is None else [
+            np.asarray(vector, dtype=np.float16).tobytes() for vector in vectors
+        ]
+        rows = [(int(chunk_id), zlib.compress(content.encode('utf-8'), 6), vector)
+                for chunk_id, content, vector in zip(ids, contents, vectors)]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO chunks (id, content, vector) VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def _select(self, column: str, ids: List[int]) -> Dict[int, bytes]:
+        result = {}
+        with self._lock:
+            # SQLite 单条语句的参数数量有限，分批查询
+            for i in range(0, len(ids), 500):
+                batch = [int(chunk_id) for chunk_id in ids[i:i + 500]]
+                sql = f"SELECT id, {column} FROM chunks WHERE id IN ({', '.join('?' * len(batch))})"
+                result.update(self._db.execute(sql, batch).fetchall())
+        return result
+
+    def get_contents(self, ids: List[int]) -> Dict[int, str]:
+        return {chunk_id: zlib.decompress(blob).decode('utf-8')
+                for chunk_id, blob in self._select("content", ids).items()}
+
+    def get_vectors(self, ids: List[int]) -> Dict[int, np.ndarray]:
+        return {chunk_id: np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+                for chunk_id, blob in self._select("vector", ids).items() if blob is not None}
+
+    def delete(self, ids: List[int]):
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                batch = [int(chunk_id) for chunk_id in ids[i:i + 500]]
+                self._db.execute(f"DELETE FROM chunks WHERE id IN ({', '.join('?' * len(batch))})", batch)
+            self._db.commit()
+
+    def size_bytes(self) -> int:
+        return os.path.getsize(self.path)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_stores: Dict[str, ContentStore] = {}
+_stores_lock = threading.Lock()
+
+def get_content_store(collection_name: str) -> ContentStore:
+    """获取collection对应的旁路存储（进程内共享）"""
+    with _stores_lock:
+        store = _stores.get(collection_name)
+        if store is None:
+            store = _stores[collection_name] = ContentStore(collection_name)
+        return store
+
+def drop_content_store(collection_name: str):
+    """collection删除时一并删除其旁路存储"""
+    with _stores_lock:
+        store = _stores.pop(collection_name, None)
+    if store is not None:
+        store.close()
+    path = os.path.join(CONTENT_STORE_DIR, f"{collection_name}.sqlite")
+    if os.path.exists(path):
+        os.remove(path)
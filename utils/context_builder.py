@@ -0,0 +1,109 @@
+import os
+from typing import List, Optional, Tuple
+
+from utils.tokens import estimate_tokens
+
+# 参考资料的token预算：min(CONTEXT_MAX_TOKENS, CONTEXT_BASE_TOKENS + 问题字数 × CONTEXT_TOKENS_PER_QUERY_CHAR)
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "8000"))
+CONTEXT_BASE_TOKENS = int(os.getenv("CONTEXT_BASE_TOKENS", "3000"))
+CONTEXT_TOKENS_PER_QUERY_CHAR = int(os.getenv("CONTEXT_TOKENS_PER_QUERY_CHAR", "10"))
+# 判定两个文本块首尾重叠的最短重叠字数，以及定位重叠时取后一块开头的字数
+MIN_OVERLAP_CHARS = 20
+PROBE_CHARS = 32
+
+def context_budget(query: str) -> int:
+    return min(CONTEXT_MAX_TOKENS, CONTEXT_BASE_TOKENS + len(query) * CONTEXT_TOKENS_PER_QUERY_CHAR)
+
+def find_overlap(head: str, tail: str) -> Optional[int]:
+    """tail 开头与 head 结尾重叠时返回 head 中重叠开始的位置；tail 完全包含在 head 中时返回 len(head)；否则返回 None
+
+    分块时窗口之间重叠 chunk_overlap 个词，前一块又被截断到最后一个句末标点，
+    因此相邻两块的重叠部分是前一块的结尾、后一块的开头。
+    """
+    if tail in head:
+        return len(head)
+    probe = tail[:PROBE_CHARS]
+    pos = head.find(probe)
+    while pos != -1:
+        overlap = len(head) - pos
+        if overlap >= MIN_OVERLAP_CHARS and tail.startswith(head[pos:]):
+            return pos
+        pos = head.find(probe, pos + 1)
+    return None
+
+def _chunk_index(doc: dict) -> Optional[int]:
+    try:
+        return int(doc['metadata'].get('chunk_index'))
+    except (TypeError, ValueError):
+        return None
+
+class Span:
+    """同一来源中首尾相连的一段文本，由一个或多个相邻文本块去重合并而成"""
+
+    def __init__(self, doc: dict, rank: int):
+        self.source = doc['metadata']['source']
+        self.last = _chunk_index(doc)
+        self.text = doc['page_content']
+        self.rank = rank
+        self.docs = [doc]
+
+    def try_merge(self, doc: dict, rank: int) -> bool:
+        """doc 是本段下一个（或同一个）文本块且文本重叠时并入本段"""
+        index = _chunk_index(doc)
+        if self.last is None or index is None or index - self.last not in (0, 1):
+            return False
+        text = doc['page_content']
+        pos = find_overlap(self.text, text)
+        if pos is None:
+            # 后一块也可能完全包含前面的内容（分块时短块被合并）
+            if self.text not in text:
+                return False
+            self.text = text
+        elif pos < len(self.text):
+            self.text += text[len(self.text) - pos:]
+        self.last = index
+        self.rank = min(self.rank, rank)
+        self.docs.append(doc)
+        return True
+
+def merge_spans(ranked: List[Tuple[int, dict]]) -> List[Span]:
+    """将 (相关度名次, 文本块) 按来源和 chunk_index 合并为段，按段内最相关的块排序
+
+    chunk_index 在每个条目内从0开始编号，同一来源中不同条目的块编号会交错（A0, B0, A1, ...），
+    因此每个块依次尝试并入该来源已有的各段，只有编号相邻且文本首尾重叠时才会并入。
+    """
+    spans: List[Span] = []
+    by_source = {}
+    for rank, doc in ranked:
+        by_source.setdefault(doc['metadata']['source'], []).append((rank, doc))
+    for group in by_source.values():
+        group.sort(key=lambda item: (_chunk_index(item[1]) is None, _chunk_index(item[1]) or 0, item[0]))
+        source_spans: List[Span] = []
+        for rank, doc in group:
+            if not any(span.try_merge(doc, rank) for span in reversed(source_spans)):
+                source_spans.append(Span(doc, rank))
+        spans.extend(source_spans)
+    spans.sort(key=lambda span: span.rank)
+    return spans
+
+def build_context(docs: List[dict], budget: int) -> Tuple[str, dict]:
+    """将检索结果拼接为参考资料
+
+    docs 按相关度从高到低排列。同一来源中 chunk_index 相邻且文本重叠的块合并为一段并去掉重复部分；
+    按相关度依次选入文本块，每块按合并去重后实际增加的token数计入 budget，放不下的块跳过。
+    返回 (参考资料文本, 统计)，统计中 saved_tokens 为去重节省的token数。
+    """
+    ranked = [(rank, doc) for rank, doc in enumerate(docs) if doc['page_content']]
+    selected = []
+    used = 0
+    for item in ranked:
+        tokens = sum(estimate_tokens(span.text) for span in merge_spans(selected + [item]))
+        if tokens <= budget:
+            selected.append(item)
+            used = tokens
+    spans = merge_spans(selected)
+    raw = sum(estimate_tokens(doc['page_content']) for _, doc in selected)
+    stats = {"chunks": len(ranked), "selected_chunks": len(selected), "spans": len(spans),
+             "dropped_chunks": len(ranked) - len(selected), "raw_tokens": raw, "tokens": used,
+             "saved_tokens": raw - used}
+    return "".join(f"\n\n{span.text}" for span in spans), stats
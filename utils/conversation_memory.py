@@ -0,0 +1,209 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, List, Optional, Tuple
+
+from utils.tokens import estimate_tokens, truncate_tokens
+
+# 历史对话（早先对话摘要 + 近期对话原文）在提示词中的token预算
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "3000"))
+# 为早先对话摘要预留的token数，摘要超出时保留最近的部分
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "600"))
+# 最多保留原文的轮数，更早的对话并入摘要
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "10"))
+# 摘要方式：llm（调用LLM压缩，失败时退回抽取）或 extract（只抽取每轮的问题和回答首句，不调用LLM）
+MEMORY_SUMMARIZER = os.getenv("MEMORY_SUMMARIZER", "llm")
+# 每轮回答后在终端打印提示词的token构成
+PROMPT_TOKEN_REPORT = os.getenv("PROMPT_TOKEN_REPORT", "0") != "0"
+
+SUMMARY_PROMPT = """将下面的早先对话摘要和新的对话合并压缩为一份新的摘要，供后续回答参考。
+只保留用户问过的问题、回答中的关键结论和涉及的知识点，不要开场白，不超过{chars}字。
+
+早先对话摘要:
+{summary}
+
+新的对话:
+{turns}
+
+新的摘要："""
+
+class Turn:
+    def __init__(self, query: str, answer: str):
+        self.query = query
+        self.answer = answer
+        # 按渲染后的文本计数，包含“问：”“答：”标记
+        self.tokens = estimate_tokens(self._prefix()) + estimate_tokens(answer)
+
+    def _prefix(self) -> str:
+        return f"问：{self.query}\n答："
+
+    def render(self, max_tokens: int = None) -> str:
+        answer = self.answer
+        if max_tokens is not None and self.tokens > max_tokens:
+            answer = truncate_tokens(answer, max(0, max_tokens - estimate_tokens(self._prefix())))
+        return self._prefix() + answer
+
+class ConversationMemory:
+    """一个会话的对话记忆：近期对话保留原文，超出预算的早先对话由 MemorySummarizer 在后台并入摘要
+
+    提示词中的历史对话 = 摘要 + 从最新一轮往前、在剩余预算内能放下的原文；摘要尚未更新完成时，
+    放不下的早先对话暂时不出现在提示词中，不会让本轮等待摘要。
+    """
+
+    def __init__(self, budget: int = MEMORY_TOKEN_BUDGET, summary_tokens: int = MEMORY_SUMMARY_TOKENS,
+                 max_turns: int = MEMORY_MAX_TURNS, reports: int = 50):
+        self.budget = budget
+        self.summary_tokens = min(summary_tokens, budget)
+        self.max_turns = max(1, max_turns)
+        self.turns: List[Turn] = []
+        self.summary = ""
+        self.summarized_turns = 0
+        self.compacting = False
+        # 每轮提示词的token构成，最新的在最后
+        self.reports: Deque[dict] = deque(maxlen=reports)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.summarized_turns + len(self.turns)
+
+    def add(self, query: str, answer: str):
+        with self._lock:
+            self.turns.append(Turn(query, answer))
+
+    def clear(self):
+        with self._lock:
+            self.turns.clear()
+            self.summary = ""
+            self.summarized_turns = 0
+
+    def render(self) -> Tuple[str, str, dict]:
+        """返回 (摘要文本, 近期对话文本, 统计)，两段合计不超过 budget 个token"""
+        with self._lock:
+            summary = self.summary
+            turns = list(self.turns)
+        summary_text = f"早先对话摘要：\n{summary}\n" if summary else ""
+        remaining = self.budget - estimate_tokens(summary_text)
+        recent = []
+        for turn in reversed(turns[-self.max_turns:]):
+            if turn.tokens <= remaining:
+                recent.append(turn.render())
+                remaining -= turn.tokens
+            elif not recent and remaining > 0:
+                # 最新一轮本身超出预算时截断其回答，保证至少保留最近一轮的上下文
+                recent.append(turn.render(remaining))
+                remaining = 0
+            else:
+                break
+        recent.reverse()
+        stats = {"recent_turns": len(recent), "omitted_turns": len(turns) - len(recent),
+                 "summarized_turns": self.summarized_turns}
+        return summary_text, "\n".join(recent), stats
+
+    def overflow(self) -> int:
+        """按预留摘要空间后的预算计算，需要并入摘要的早先对话轮数（从最早的一轮算起）"""
+        with self._lock:
+            return self._overflow()
+
+    def _overflow(self) -> int:
+        remaining = self.budget - self.summary_tokens
+        keep = 0
+        for turn in reversed(self.turns[-self.max_turns:]):
+            if turn.tokens > remaining and keep:
+                break
+            remaining -= turn.tokens
+            keep += 1
+        return len(self.turns) - keep
+
+    def record_report(self, report: dict):
+        with self._lock:
+            self.reports.append(report)
+
+    @property
+    def last_report(self) -> Optional[dict]:
+        with self._lock:
+            return self.reports[-1] if self.reports else None
+
+def extract_summary(summary: str, turns: List[Turn], max_tokens: int) -> str:
+    """不调用LLM的摘要：每轮保留问题和回答的第一句，超出 max_tokens 时保留最近的部分"""
+    lines = [summary] if summary else []
+    for turn in turns:
+        first = re.split(r'(?<=[。！？!?\n])', turn.answer.strip(), 1)[0].strip()
+        lines.append(f"- 问：{turn.query}；答：{truncate_tokens(first, 80)}")
+    return truncate_tokens("\n".join(lines), max_tokens, keep_tail=True)
+
+class MemorySummarizer:
+    """在后台线程中将各会话超出预算的早先对话并入摘要，不占用回答生成的关键路径
+
+    generate 为调用LLM的函数（提示词 -> 摘要文本），为 None 或调用失败时使用 extract_summary。
+    同一会话同一时间只有一个压缩任务，期间新增的对话在任务结束后继续处理。
+    """
+
+    def __init__(self, generate: Callable[[str], str] = None, workers: int = 1):
+        self.generate = generate
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="memory")
+        self.compactions = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def schedule(self, memory: ConversationMemory):
+        with memory._lock:
+            if memory.compacting:
+                return
+            memory.compacting = True
+        self.executor.submit(self._compact, memory)
+
+    def _compact(self, memory: ConversationMemory):
+        try:
+            while True:
+                with memory._lock:
+                    count = memory._overflow()
+                    if count <= 0:
+                        # 与判断在同一把锁内清除标记，避免漏掉刚加入的对话
+                        memory.compacting = False
+                        return
+                    turns = memory.turns[:count]
+                    summary = memory.summary
+                start = time.perf_counter()
+                new_summary = self._summarize(summary, turns, memory.summary_tokens)
+                with self._lock:
+                    self.compactions += 1
+                    self.seconds += time.perf_counter() - start
+                with memory._lock:
+                    # 压缩期间会话可能被清空，此时丢弃结果
+                    if memory.turns[:count] == turns:
+                        del memory.turns[:count]
+                        memory.summary = new_summary
+                        memory.summarized_turns += count
+        except Exception:
+            with memory._lock:
+                memory.compacting = False
+            raise
+
+    def _summarize(self, summary: str, turns: List[Turn], max_tokens: int) -> str:
+        if self.generate is not None:
+            prompt = SUMMARY_PROMPT.format(chars=max_tokens, summary=summary or "（无）",
+                                           turns="\n".join(turn.render() for turn in turns))
+            try:
+                text = (self.generate(prompt) or "").strip()
+                if text:
+                    return truncate_tokens(text, max_tokens, keep_tail=True)
+            except Exception:
+                pass
+            with self._lock:
+                self.failures += 1
+        return extract_summary(summary, turns, max_tokens)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "compactions": self.compactions,
+                "failures": self.failures,
+                "mean_ms": self.seconds / self.compactions * 1000 if self.compactions else 0.0,
+            }
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,40 @@
+import os
+import re
+import time
+from typing import Iterator
+
+# 模拟LLM的首个片段延迟与片段间隔（秒），以及回答长度（字符）
+FAKE_LLM_FIRST_DELAY = float(os.getenv("FAKE_LLM_FIRST_DELAY", "0.3"))
+FAKE_LLM_CHUNK_DELAY = float(os.getenv("FAKE_LLM_CHUNK_DELAY", "0.05"))
+FAKE_LLM_ANSWER_CHARS = int(os.getenv("FAKE_LLM_ANSWER_CHARS", "400"))
+FAKE_LLM_CHUNK_CHARS = 20
+
+class FakeChunk:
+    """与Gemini流式响应片段相同的接口（parts / text）"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = [text]
+
+class FakeModel:
+    """本地模拟的LLM，不调用任何外部服务，用于测试服务端并发、流式输出和压测
+
+    回答内容包含问题和参考资料长度，按固定间隔分片输出。
+    """
+
+    def __init__(self, first_delay: float = FAKE_LLM_FIRST_DELAY, chunk_delay: float = FAKE_LLM_CHUNK_DELAY,
+                 answer_chars: int = FAKE_LLM_ANSWER_CHARS):
+        self.first_delay = first_delay
+        self.chunk_delay = chunk_delay
+        self.answer_chars = answer_chars
+
+    def generate_content(self, prompt: str, stream: bool = True) -> Iterator[FakeChunk]:
+        question = prompt.rsplit("问题：", 1)[-1].strip()
+        context = re.search(r"参考资料:\n(.*?)\n历史对话:", prompt, re.S)
+        answer = f"# 模拟回答\n问题：{question}\n参考资料共 {len(context.group(1).strip()) if context else 0} 字。\n"
+        answer += "-" * max(0, self.answer_chars - len(answer))
+        time.sleep(self.first_delay)
+        for i in range(0, len(answer), FAKE_LLM_CHUNK_CHARS):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield FakeChunk(answer[i:i + FAKE_LLM_CHUNK_CHARS])
@@ -0,0 +1,146 @@
+"""本地模拟的Gemini REST服务，模拟首片段延迟、慢请求长尾和429/503错误，用于离线测试和压测LLM客户端
+
+    python -m utils.fake_llm_server --port 8001 --error-rate 0.1 --slow-rate 0.05 --slow-delay 10
+    LLM_BASE_URL=http://127.0.0.1:8001 python main.py
+
+支持 POST /v1beta/models/<model>:streamGenerateContent?alt=sse 与 :generateContent，回答内容由 FakeModel 生成。
+"""
+import argparse
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.fake_llm import FAKE_LLM_ANSWER_CHARS, FAKE_LLM_CHUNK_DELAY, FAKE_LLM_FIRST_DELAY, FakeModel
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, first_delay: float = FAKE_LLM_FIRST_DELAY, chunk_delay: float = FAKE_LLM_CHUNK_DELAY,
+                 answer_chars: int = FAKE_LLM_ANSWER_CHARS, error_rate: float = 0.0, slow_rate: float = 0.0,
+                 slow_delay: float = 10.0, seed: int = None):
+        super().__init__(address, FakeGeminiHandler)
+        self.first_delay = first_delay
+        self.chunk_delay = chunk_delay
+        self.answer_chars = answer_chars
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "errors": 0, "slow": 0, "connections": 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self) -> tuple:
+        """为一个请求抽取 (是否返回错误, 首片段延迟)"""
+        with self.lock:
+            self.counters["requests"] += 1
+            if self.random.random() < self.error_rate:
+                self.counters["errors"] += 1
+                return True, 0.0
+            if self.random.random() < self.slow_rate:
+                self.counters["slow"] += 1
+                return False, self.slow_delay
+            return False, self.first_delay
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持长连接，以便测试客户端的连接复用
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.counters["connections"] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, data: dict, headers: dict = None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode('latin-1') + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path = self.path.split("?", 1)[0]
+        if not path.startswith("/v1beta/models/") or ":" not in path:
+            self._send_json(404, {"error": {"code": 404, "message": "not found"}})
+            return
+        method = path.rsplit(":", 1)[1]
+        try:
+            prompt = json.loads(body)["contents"][-1]["parts"][0]["text"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            self._send_json(400, {"error": {"code": 400, "message": "invalid request"}})
+            return
+
+        failed, first_delay = self.server.draw()
+        if failed:
+            status = self.server.random.choice((429, 503))
+            self._send_json(status, {"error": {"code": status, "message": "simulated overload"}},
+                            {"Retry-After": "0"} if status == 429 else None)
+            return
+
+        model = FakeModel(first_delay, self.server.chunk_delay, self.server.answer_chars)
+        if method == "generateContent":
+            text = "".join(chunk.text for chunk in model.generate_content(prompt))
+            self._send_json(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]})
+        elif method == "streamGenerateContent":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for chunk in model.generate_content(prompt):
+                    data = {"candidates": [{"content": {"role": "model", "parts": [{"text": chunk.text}]}}]}
+                    self._write_chunk(f"data: {json.dumps(data, ensure_ascii=False)}\r\n\r\n".encode('utf-8'))
+                self._write_chunk(b"")
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端关闭连接（取消或对冲请求落败）
+                self.close_connection = True
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": f"unknown method {method}"}})
+
+def start_fake_server(host: str = "127.0.0.1", port: int = 0, **options) -> FakeGeminiServer:
+    """在后台线程中启动模拟服务（port=0 时自动分配端口），返回服务对象，用 shutdown() 停止"""
+    server = FakeGeminiServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的Gemini REST服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-delay", type=float, default=FAKE_LLM_FIRST_DELAY, help="首片段延迟（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=FAKE_LLM_CHUNK_DELAY, help="片段间隔（秒）")
+    parser.add_argument("--answer-chars", type=int, default=FAKE_LLM_ANSWER_CHARS, help="回答长度（字符）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回429/503的请求比例")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="慢请求的比例")
+    parser.add_argument("--slow-delay", type=float, default=10.0, help="慢请求的首片段延迟（秒）")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = FakeGeminiServer((args.host, args.port), args.first_delay, args.chunk_delay, args.answer_chars,
+                              args.error_rate, args.slow_rate, args.slow_delay, args.seed)
+    print(f"模拟Gemini服务已启动: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.counters, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import os
+import queue
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+# 流水线参数，可通过环境变量调整
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+SEGMENT_PAGES = int(os.getenv("INGEST_SEGMENT_PAGES", "20"))
+EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+INSERT_BATCH = int(os.getenv("INGEST_INSERT_BATCH", "256"))
+
+_DONE = object()  # 阶段结束标记
+
+@dataclass
+class StageStats:
+    name: str
+    unit: str
+    items: int = 0
+    busy: float = 0.0  # 阶段实际工作时间（不含排队等待）
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.busy if self.busy > 0 else 0.0
+
+def _cut_segment(text: str, item_pattern: str):
+    """在最后一个条目标记处切分，保证条目不会跨段被截断"""
+    text = re.sub(r'\s+', ' ', text)
+    last = None
+    for match in re.finditer(item_pattern, text):
+        if match.start() > 0:
+            last = match.start()
+    if last is None:
+        return text, ""
+    return text[:last], text[last:]
+
+def iter_segments(pages: Iterable[str], item_pattern: str, segment_pages: int = SEGMENT_PAGES):
+    """将逐页文本合并为若干段落，每累计 segment_pages 页在条目边界处切出一段"""
+    buffer: List[str] = []
+    for page in pages:
+        buffer.append(page)
+        if len(buffer) >= segment_pages:
+            head, tail = _cut_segment("\n\n".join(buffer), item_pattern)
+            buffer = [tail] if tail else []
+            yield head
+    if buffer:
+        yield "\n\n".join(buffer)
+
+class IngestPipeline:
+    """解析 → 分割 → 向量化 → 写入 的流式入库流水线，各阶段在独立线程中运行，之间用有界队列衔接"""
+
+    def __init__(self, splitter, embeddings, insert: Callable[[list, list], None],
+                 queue_size: int = QUEUE_SIZE, segment_pages: int = SEGMENT_PAGES,
+                 embed_batch: int = EMBED_BATCH, insert_batch: int = INSERT_BATCH,
+                 on_inserted: Optional[Callable[[int], None]] = None):
+        self.splitter = splitter
+        self.embeddings = embeddings
+        self.insert = insert
+        self.segment_pages = segment_pages
+        self.embed_batch = embed_batch
+        self.insert_batch = insert_batch
+        self.on_inserted = on_inserted
+
+        self._pages = queue.Queue(maxsize=queue_size)
+        self._docs = queue.Queue(maxsize=queue_size)
+        self._vectors = queue.Queue(maxsize=queue_size)
+        self._failed = threading.Event()
+        self._error: Optional[BaseException] = None
+
+        self.stats: Dict[str, StageStats] = {
+            "parse": StageStats("解析", "页"),
+            "split": StageStats("分割", "块"),
+            "embed": StageStats("向量化", "块"),
+            "insert": StageStats("写入", "块"),
+        }
+
+    def run(self, pages: Iterable[str]) -> Dict[str, StageStats]:
+        """运行流水线直至所有页面写入完成，任一阶段出错时抛出该异常"""
+        threads = [
+            threading.Thread(target=self._guard, args=(self._parse, pages), daemon=True),
+            threading.Thread(target=self._guard, args=(self._split,), daemon=True),
+            threading.Thread(target=self._guard, args=(self._embed,), daemon=True),
+            threading.Thread(target=self._guard, args=(self._insert,), daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.stats
+
+    def _guard(self, target, *args):
+        try:
+            target(*args)
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._failed.set()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """向下游队列放入数据，队列满时阻塞（背压），其他阶段失败时放弃"""
+        while not self._failed.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._failed.is_set():
+                    return _DONE
+
+    def _parse(self, pages: Iterable[str]):
+        stats = self.stats["parse"]
+        iterator = iter(pages)
+        while True:
+            start = time.perf_counter()
+            try:
+                page = next(iterator)
+            except StopIteration:
+                break
+            stats.busy += time.perf_counter() - start
+            stats.items += 1
+            if not self._put(self._pages, page):
+                return
+        self._put(self._pages, _DONE)
+
+    def _emit_segment(self, text: str) -> bool:
+        """流式分割一段文本，每凑满一个向量化批次就交给下游，不必等整段分割完成"""
+        stats = self.stats["split"]
+        batch: list = []
+        documents = self.splitter.iter_documents(text)
+        while True:
+            start = time.perf_counter()
+            doc = next(documents, None)
+            stats.busy += time.perf_counter() - start
+            if doc is None:
+                break
+            stats.items += 1
+            batch.append(doc)
+            if len(batch) >= self.embed_batch:
+                if not self._put(self._docs, batch):
+                    return False
+                batch = []
+        return not batch or self._put(self._docs, batch)
+
+    def _iter_queue(self, q: queue.Queue):
+        while True:
+            item = self._get(q)
+            if item is _DONE:
+                return
+            yield item
+
+    def _split(self):
+        pattern = self.splitter.section_patterns['item']
+        for segment in iter_segments(self._iter_queue(self._pages), pattern, self.segment_pages):
+            if not self._emit_segment(segment):
+                return
+        if not self._failed.is_set():
+            self._put(self._docs, _DONE)
+
+    def _embed_batch(self, documents: list) -> bool:
+        stats = self.stats["embed"]
+        start = time.perf_counter()
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in documents])
+        stats.busy += time.perf_counter() - start
+        stats.items += len(documents)
+        return self._put(self._vectors, (documents, vectors))
+
+    def _embed(self):
+        pending: list = []
+        while True:
+            documents = self._get(self._docs)
+            if documents is _DONE:
+                break
+            pending.extend(documents)
+            while len(pending) >= self.embed_batch:
+                batch, pending = pending[:self.embed_batch], pending[self.embed_batch:]
+                if not self._embed_batch(batch):
+                    return
+        if self._failed.is_set():
+            return
+        if pending and not self._embed_batch(pending):
+            return
+        self._put(self._vectors, _DONE)
+
+    def _flush(self, documents: list, vectors: list):
+        stats = self.stats["insert"]
+        start = time.perf_counter()
+        self.insert(documents, vectors)
+        stats.busy += time.perf_counter() - start
+        stats.items += len(documents)
+        if self.on_inserted:
+            self.on_inserted(len(documents))
+
+    def _insert(self):
+        documents: list = []
+        vectors: list = []
+        while True:
+            item = self._get(self._vectors)
+            if item is _DONE:
+                break
+            documents.extend(item[0])
+            vectors.extend(item[1])
+            if len(documents) >= self.insert_batch:
+                self._flush(documents, vectors)
+                documents, vectors = [], []
+        if documents and not self._failed.is_set():
+            self._flush(documents, vectors)
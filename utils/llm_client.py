@@ -0,0 +1,296 @@
+"""Gemini REST客户端：连接复用、时限、带抖动的重试、对冲请求和并发限制
+
+接口与 google.generativeai 的 GenerativeModel 一致（generate_content 返回带 parts / text 的片段），
+ChatAgent 无需区分。只有在收到第一个片段之前失败的请求才会重试或对冲，已经输出的回答不会重复。
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Deque, Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+
+# Gemini REST 地址，可指向本地模拟服务（python -m utils.fake_llm_server）
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://generativelanguage.googleapis.com")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash-thinking-exp-01-21")
+# 建立连接、等待下一个片段（含第一个片段）的时限，以及整个回答的总时限（秒）
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "300"))
+# 429/5xx、连接失败或超时的重试次数，以及指数退避的基数和上限（秒，实际等待在 [0, 退避] 内随机）
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# 超过该时间（秒）仍未收到第一个片段时，再发出一个相同的请求，取先返回的一个；0 表示关闭
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+# 同时进行的请求数上限（对冲请求也占用名额）和连接池大小
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "8"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", str(LLM_MAX_CONCURRENT * 2)))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+_CONFIG_KEYS = {"temperature": "temperature", "top_p": "topP", "top_k": "topK",
+                "max_output_tokens": "maxOutputTokens", "stop_sequences": "stopSequences"}
+
+class LLMError(Exception):
+    def __init__(self, message: str, status: int = None, retryable: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+class LLMChunk:
+    """与Gemini流式响应片段相同的接口（parts / text）"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = [text] if text else []
+
+class LLMResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = [text] if text else []
+
+class _Stream:
+    """已收到第一个片段的流式响应"""
+
+    def __init__(self, response: requests.Response, lines: Iterator[bytes], first: Optional[str], started: float):
+        self.response = response
+        self.lines = lines
+        self.first = first
+        self.started = started
+
+    def close(self):
+        self.response.close()
+
+def _chunk_text(data: dict) -> str:
+    candidates = data.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts if not part.get("thought"))
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+class GeminiClient:
+    def __init__(self, api_key: str = None, model: str = LLM_MODEL, generation_config: dict = None,
+                 base_url: str = LLM_BASE_URL, max_retries: int = LLM_MAX_RETRIES,
+                 hedge_after: float = LLM_HEDGE_AFTER, max_concurrent: int = LLM_MAX_CONCURRENT,
+                 deadline: float = LLM_DEADLINE, connect_timeout: float = LLM_CONNECT_TIMEOUT,
+                 read_timeout: float = LLM_READ_TIMEOUT, pool_size: int = LLM_POOL_SIZE):
+        self.api_key = api_key
+        self.model = model
+        self.generation_config = generation_config or {}
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+        self.deadline = deadline
+        self.timeout = (connect_timeout, read_timeout)
+
+        # 所有请求共用一个连接池，保持长连接
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.session.headers["x-goog-api-key"] = api_key
+
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._hedge_executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                         "timeouts": 0, "errors": 0, "rejected": 0}
+        self._first_token: Deque[float] = deque(maxlen=1000)
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def _body(self, prompt: str, generation_config: dict = None) -> dict:
+        config = {**self.generation_config, **(generation_config or {})}
+        return {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": {_CONFIG_KEYS.get(key, key): value for key, value in config.items()},
+        }
+
+    def _acquire(self, deadline: float, blocking: bool = True) -> bool:
+        if not blocking:
+            return self._slots.acquire(blocking=False)
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self._count("rejected")
+            raise LLMError("LLM请求排队超时", retryable=False)
+        return True
+
+    def _post(self, method: str, body: dict, deadline: float, stream: bool) -> requests.Response:
+        url = f"{self.base_url}/v1beta/models/{self.model}:{method}"
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMError("LLM请求超过总时限", retryable=False)
+        timeout = (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+        self._count("attempts")
+        try:
+            response = self.session.post(url, params={"alt": "sse"} if stream else None,
+                                         data=json.dumps(body), timeout=timeout, stream=stream)
+        except requests.Timeout as e:
+            self._count("timeouts")
+            raise LLMError(f"LLM请求超时: {e}", retryable=True)
+        except requests.ConnectionError as e:
+            raise LLMError(f"无法连接LLM服务: {e}", retryable=True)
+        if response.status_code != 200:
+            retry_after = response.headers.get("Retry-After")
+            message = response.text[:200]
+            response.close()
+            raise LLMError(f"LLM服务返回 {response.status_code}: {message}", status=response.status_code,
+                           retryable=response.status_code in RETRY_STATUS,
+                           retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        return response
+
+    def _open_stream(self, body: dict, deadline: float) -> _Stream:
+        """发出流式请求并读到第一个片段（或结束）"""
+        started = time.monotonic()
+        response = self._post("streamGenerateContent", body, deadline, stream=True)
+        # chunk_size=None：收到多少数据就处理多少，不等缓冲区填满
+        lines = response.iter_lines(chunk_size=None)
+        try:
+            for text in self._iter_text(lines):
+                if text:
+                    return _Stream(response, lines, text, started)
+        except LLMError:
+            response.close()
+            raise
+        return _Stream(response, iter(()), None, started)
+
+    def _iter_text(self, lines: Iterator[bytes]) -> Iterator[str]:
+        try:
+            for line in lines:
+                if not line.startswith(b"data:"):
+                    continue
+                data = json.loads(line[5:])
+                if "error" in data:
+                    raise LLMError(f"LLM服务错误: {data['error'].get('message', data['error'])}")
+                yield _chunk_text(data)
+        except requests.RequestException as e:
+            # 读取超时在 iter_lines 中表现为包装了 ReadTimeoutError 的 ConnectionError
+            if isinstance(e.args[0] if e.args else None, ReadTimeoutError):
+                self._count("timeouts")
+            raise LLMError(f"LLM响应中断或超时: {e}", retryable=True)
+
+    def _open_hedged(self, body: dict, deadline: float) -> _Stream:
+        """超过 hedge_after 未收到第一个片段时再发一个请求，取先成功的一个，另一个关闭"""
+        first = self._hedge_executor.submit(self._open_stream, body, deadline)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done or not self._acquire(deadline, blocking=False):
+            return first.result()
+        self._count("hedges")
+        second = self._hedge_executor.submit(self._open_stream, body, deadline)
+        second.add_done_callback(lambda _: self._slots.release())
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for other in pending:
+                    other.add_done_callback(lambda f: f.exception() is None and f.result().close())
+                if future is second:
+                    self._count("hedge_wins")
+                return future.result()
+        for future in pending:
+            future.add_done_callback(lambda f: f.exception() is None and f.result().close())
+        raise error or LLMError("LLM请求超过总时限", retryable=False)
+
+    def _with_retries(self, open_fn, deadline: float):
+        attempt = 0
+        while True:
+            try:
+                return open_fn()
+            except LLMError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    self._count("errors")
+                    if attempt:
+                        raise LLMError(f"{e}（已重试 {attempt} 次）", e.status)
+                    raise
+                # 全抖动的指数退避；服务端给出 Retry-After 时不少于该值
+                delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                if time.monotonic() + delay >= deadline:
+                    self._count("errors")
+                    raise
+                attempt += 1
+                self._count("retries")
+                time.sleep(delay)
+
+    def generate_content(self, prompt: str, stream: bool = False, generation_config: dict = None):
+        body = self._body(prompt, generation_config)
+        if stream:
+            return self._generate_stream(body)
+        deadline = time.monotonic() + self.deadline
+        self._count("requests")
+        self._acquire(deadline)
+        try:
+            def request():
+                response = self._post("generateContent", body, deadline, stream=False)
+                return _chunk_text(response.json())
+            return LLMResponse(self._with_retries(request, deadline))
+        finally:
+            self._slots.release()
+
+    def _generate_stream(self, body: dict) -> Iterator[LLMChunk]:
+        deadline = time.monotonic() + self.deadline
+        self._count("requests")
+        self._acquire(deadline)
+        try:
+            if self.hedge_after > 0:
+                opened = self._with_retries(lambda: self._open_hedged(body, deadline), deadline)
+            else:
+                opened = self._with_retries(lambda: self._open_stream(body, deadline), deadline)
+            with self._lock:
+                self._first_token.append(time.monotonic() - opened.started)
+            try:
+                if opened.first is not None:
+                    yield LLMChunk(opened.first)
+                for text in self._iter_text(opened.lines):
+                    if time.monotonic() > deadline:
+                        self._count("timeouts")
+                        raise LLMError("LLM回答超过总时限，已中止")
+                    if text:
+                        yield LLMChunk(text)
+            finally:
+                opened.close()
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            samples = list(self._first_token)
+            return {
+                **self.counters,
+                "max_concurrent": self.max_concurrent,
+                "first_token_p50_ms": _percentile(samples, 0.5) * 1000,
+                "first_token_p99_ms": _percentile(samples, 0.99) * 1000,
+            }
+
+    def close(self):
+        self._hedge_executor.shutdown(wait=False)
+        self.session.close()
+
+def format_llm_stats(stats: dict) -> str:
+    return (f"LLM请求: {stats['requests']} 次, 实际发出 {stats['attempts']} 次, 重试 {stats['retries']}, "
+            f"对冲 {stats['hedges']}（胜出 {stats['hedge_wins']}）, 超时 {stats['timeouts']}, 失败 {stats['errors']}, "
+            f"首片段 p50 {stats['first_token_p50_ms']:.0f} ms / p99 {stats['first_token_p99_ms']:.0f} ms")
@@ -0,0 +1,80 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional
+
+# 知识库清单：记录每个PDF的文件哈希以及每个文本块的内容哈希和对应的向量库ID
+MANIFEST_PATH = os.getenv("KB_MANIFEST_PATH", "./kb_manifest.json")
+
+def file_hash(path: str) -> str:
+    """计算文件内容的SHA-256"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_hash(content: str, metadata: dict) -> str:
+    """文本块哈希，包含内容和写入向量库的元数据，任一变化都视为新块"""
+    key = "\x1f".join([
+        content,
+        str(metadata['chunk_index']),
+        str(metadata['chunk_total']),
+        str(metadata['chunk_size']),
+        str(metadata['chunk_overlap']),
+    ])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+class Manifest:
+    """知识库清单，格式为 {文件名: {collection, file_hash, size, mtime, chunks: {块哈希: [ID, ...]}}}"""
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.files: Dict[str, dict] = json.load(f).get("files", {})
+        except FileNotFoundError:
+            self.files = {}
+
+    def save(self):
+        """原子写入清单文件"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"files": self.files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, filename: str, collection_name: str) -> Optional[dict]:
+        """获取文件记录，记录所属collection与当前不一致（如迁移后）时视为不存在"""
+        entry = self.files.get(filename)
+        if entry is None or entry.get("collection") != collection_name:
+            return None
+        return entry
+
+    def record(self, filename: str, pdf_path: str, collection_name: str,
+               chunks: Optional[Dict[str, List[int]]]):
+        """记录文件当前版本，chunks 为 None 表示块信息未知（需要时再从向量库重建）"""
+        stat = os.stat(pdf_path)
+        self.files[filename] = {
+            "collection": collection_name,
+            "file_hash": file_hash(pdf_path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "chunks": chunks,
+        }
+
+    def remove(self, filename: str):
+        self.files.pop(filename, None)
+
+    def is_changed(self, filename: str, pdf_path: str, collection_name: str) -> bool:
+        """文件内容是否与记录不同；大小和修改时间未变时跳过哈希计算"""
+        entry = self.get(filename, collection_name)
+        if entry is None:
+            return True
+        stat = os.stat(pdf_path)
+        if stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]:
+            return False
+        if file_hash(pdf_path) == entry["file_hash"]:
+            # 内容未变（如仅被复制或touch），更新时间戳即可
+            entry["size"], entry["mtime"] = stat.st_size, stat.st_mtime
+            return False
+        return True
@@ -0,0 +1,27 @@
+from typing import List
+from langchain.schema import Document
+from langchain_community.document_loaders import PyPDFLoader
+from utils.text_splitter.medical_splitter import AdaptiveMedicalSplitter
+from utils.ingest_pipeline import iter_segments
+
+# 每个工作进程持有一个分割器，避免重复注册医学词典
+_splitter = None
+
+def init_worker():
+    """工作进程初始化：加载jieba词典（复用磁盘缓存）并注册医学术语"""
+    global _splitter
+    from utils.startup import init_jieba
+    init_jieba()
+    # 已按文件分配到多个进程，进程内不再并行分词
+    _splitter = AdaptiveMedicalSplitter(workers=1)
+
+def parse_and_split(pdf_path: str) -> List[Document]:
+    """在工作进程中解析并分割单个PDF，返回文本块列表"""
+    global _splitter
+    if _splitter is None:
+        init_worker()
+    pages = (doc.page_content for doc in PyPDFLoader(pdf_path).lazy_load())
+    documents = []
+    for segment in iter_segments(pages, _splitter.section_patterns['item']):
+        documents.extend(_splitter.iter_documents(segment))
+    return documents
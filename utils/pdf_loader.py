@@ -1,11 +1,27 @@
 from langchain_community.document_loaders import PyPDFLoader
-from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
+from langchain.schema import Document
 import os
-from typing import List, Set, Dict
+import json
+import time
+from typing import Any, Callable, Iterable, List, Optional, Set, Dict, Tuple
 import re
 from tqdm import tqdm
 from utils.text_splitter.medical_splitter import AdaptiveMedicalSplitter
-from embedding_model import embedding_model
+from utils.ingest_pipeline import IngestPipeline, INSERT_BATCH
+from utils.manifest import Manifest, chunk_hash
+from embedding_model.projection import drop_projection, get_projection, new_projection, save_projection
+from utils.compact_schema import EMBEDDING_DIM, collection_fields, delete_content, forget_layout, insert_rows, \
+    iter_rows, layout_of
+from utils.content_store import drop_content_store
+from utils.tracing import TRACE_PROFILE, Trace
+from vector_store import VectorCollection, get_backend
+from vector_store.index_policy import choose_index, ensure_index, get_registry
+
+# 存储模式：per_file 每个PDF一个collection；single 所有PDF共用一个collection，按source分区
+STORAGE_MODE = os.getenv("KB_STORAGE_MODE", "per_file")
+CONSOLIDATED_COLLECTION = "medical_knowledge_base"
+# 启动时并发打开collection的线程数
+OPEN_WORKERS = int(os.getenv("KB_OPEN_WORKERS", "8"))
 
 def get_pdf_files(pdf_dir: str, specific_files: List[str] = None) -> Set[str]:
     """获取目录下的PDF文件"""
@@ -65,89 +81,368 @@ def get_collection_name(filename: str) -> str:
         
     return f"medical_kb_{clean_name}"
 
-def init_collection(collection_name: str):
-    """为单个PDF文件初始化collection"""
-    fields = [
-        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-        FieldSchema(name="chunk_index", dtype=DataType.VARCHAR, max_length=10),
-        FieldSchema(name="chunk_total", dtype=DataType.VARCHAR, max_length=10),
-        FieldSchema(name="chunk_size", dtype=DataType.VARCHAR, max_length=10),
-        FieldSchema(name="chunk_overlap", dtype=DataType.VARCHAR, max_length=10),
-        FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=5000),
-        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=1792)
-    ]
-    schema = CollectionSchema(fields, f"Collection for {collection_name}")
-    collection = Collection(collection_name, schema)
-    
-    index_params = {
-        "metric_type": "L2",
-        "index_type": "IVF_PQ",
-        "params": {"nlist": 1024, "m": 16},
-        "device": "cuda"
-    }
-    collection.create_index("embedding", index_params)
-    collection.load()
+def is_single_collection() -> bool:
+    """是否使用单一collection存储所有PDF"""
+    return STORAGE_MODE == "single"
+
+def source_expr(files) -> str:
+    """构造按来源文件过滤的表达式"""
+    return f"source in {json.dumps(sorted(files), ensure_ascii=False)}"
+
+def init_collection(collection_name: str, with_source: bool = False):
+    """初始化collection，with_source 时增加作为分区键的 source 字段
+
+    字段结构由 KB_SCHEMA 决定，向量维度由 EMBEDDING_PROJECTION 决定（投影随collection保存）。
+    """
+    projection = new_projection()
+    fields = collection_fields(with_source, dim=projection.dim if projection else EMBEDDING_DIM)
+    vector_type = fields[-1].dtype
+
+    # 新集合为空，先用精确检索，写入数据后由 refresh_index 按数据量重新选择索引
+    store = get_backend()
+    forget_layout(collection_name)
+    save_projection(collection_name, projection)
+    config = choose_index(0, store.index_types, vector_type)
+    collection = store.create_collection(collection_name, fields, config.index_params, f"Collection for {collection_name}")
+    get_registry().record(collection_name, config, 0, "auto")
     return collection
 
+def refresh_index(collection: VectorCollection):
+    """写入数据后按文本块数量重新选择索引，配置变化时重建"""
+    config = ensure_index(collection, get_backend())
+    if config is not None:
+        print_step(f"      → 索引: {config.label()} ({collection.num_entities} 块)")
+
+def get_consolidated_collection() -> VectorCollection:
+    """获取（必要时创建）存放所有PDF的单一collection"""
+    store = get_backend()
+    if store.has_collection(CONSOLIDATED_COLLECTION):
+        return store.open_collection(CONSOLIDATED_COLLECTION)
+    return init_collection(CONSOLIDATED_COLLECTION, with_source=True)
+
+def has_source(collection: VectorCollection, filename: str) -> bool:
+    """单一collection中是否已有该文件的数据"""
+    return bool(collection.query(expr=source_expr([filename]), output_fields=["id"], limit=1))
+
+def delete_source(collection: VectorCollection, filename: str):
+    """删除单一collection中该文件的全部数据"""
+    expr = source_expr([filename])
+    if layout_of(collection).compact:
+        # 旁路存储按ID保存文本，需要先查出该文件的全部ID
+        collection.load()
+        ids = [row['id'] for row in iter_rows(collection, expr, ["id"])]
+        collection.delete(expr=expr)
+        delete_content(collection, ids)
+        return
+    collection.delete(expr=expr)
+
+def drop_collection(collection_name: str):
+    """删除collection及其索引配置、旁路存储和投影"""
+    get_backend().drop_collection(collection_name)
+    get_registry().remove(collection_name)
+    drop_content_store(collection_name)
+    drop_projection(collection_name)
+    forget_layout(collection_name)
+
+def prepare_collection(filename: str) -> VectorCollection:
+    """为待处理文件准备collection：单集合模式下清除该文件旧数据，否则新建独立collection"""
+    # 集合重建后，引用该文件的缓存答案随之失效
+    from utils.answer_cache import invalidate_source
+    invalidate_source(filename)
+    if is_single_collection():
+        collection = get_consolidated_collection()
+        delete_source(collection, filename)
+        return collection
+    return init_collection(get_collection_name(filename))
+
+def document_source(filename: str):
+    """写入时的 source 字段值，仅单集合模式需要"""
+    return filename if is_single_collection() else None
+
 def print_step(text):
     """打印步骤信息，确保清除loading残留"""
     from main import print_with_loading_clear
     print_with_loading_clear(text)
 
-def load_pdf(pdf_path: str, embeddings) -> Collection:
-    """处理单个PDF文件"""
+def insert_documents(collection: VectorCollection, documents, vectors, source: str = None):
+    """将一批文本块及其向量写入collection"""
+    return insert_rows(collection, documents, vectors, source)
+
+def record_chunk_ids(chunks: Dict[str, List[int]], documents, ids):
+    """将写入的文本块ID按块哈希记入清单"""
+    for doc, chunk_id in zip(documents, ids):
+        chunks.setdefault(chunk_hash(doc.page_content, doc.metadata), []).append(chunk_id)
+
+def print_pipeline_stats(stats, elapsed: float):
+    """打印流水线各阶段吞吐量"""
+    for stage in stats.values():
+        print_step(f"      → {stage.name}: {stage.items} {stage.unit}, "
+                   f"{stage.throughput:.1f} {stage.unit}/秒 (工作 {stage.busy:.1f} 秒)")
+    chunks = stats["insert"].items
+    print_step(f"      → 总计: {chunks / max(elapsed, 1e-6):.1f} 块/秒 (耗时 {elapsed:.1f} 秒)")
+
+def finish_ingest_trace(trace: Trace, status: str = "ok", **attrs):
+    """结束入库追踪，--profile 时打印各阶段耗时"""
+    trace.finish(status, **attrs)
+    if TRACE_PROFILE:
+        for line in trace.format():
+            print_step(f"      {line}")
+
+def record_pipeline_spans(trace: Trace, stats, start: float, end: float):
+    """流水线各阶段并发执行，各阶段的span从流水线开始计，时长为该阶段实际工作时间"""
+    trace.add_span("pipeline", start, end)
+    for key, stage in stats.items():
+        trace.add_span(key, start, start + stage.busy, items=stage.items, unit=stage.unit)
+    trace.count("pages", stats["parse"].items)
+    trace.count("chunks", stats["insert"].items)
+
+def load_pdf(pdf_path: str, embeddings, manifest: Manifest = None, split_workers: int = None,
+             pages: Iterable[str] = None) -> VectorCollection:
+    """处理单个PDF文件，split_workers > 1 时分词分散到多个进程
+
+    pages 为已解析的逐页文本时不再解析PDF（基准测试用合成页面入库），pdf_path 仍用于清单记录。
+    """
+    manifest = manifest or Manifest()
     filename = os.path.basename(pdf_path)
-    collection_name = get_collection_name(filename)
+    source = document_source(filename)
+    trace = Trace("ingest", file=filename, mode="full")
     
     print_step(f"\n开始处理文档: [{filename}]")
-    splitter = AdaptiveMedicalSplitter()
-    loader = PyPDFLoader(pdf_path)
-    raw_docs = loader.load()
-    
-    print_step("   1. 分割文档")
-    full_text = "\n\n".join(doc.page_content for doc in raw_docs)
-    documents = splitter.split_document(full_text)
-    chunks_count = len(documents)
-    print_step(f"      → 得到 {chunks_count} 个文本块")
     
-    # 创建新的collection
-    print_step("   2. 初始化向量集合")
-    collection = init_collection(collection_name)
-    
-    # 插入数据
-    if documents:
-        print_step("   3. 开始向量化")
-        with tqdm(total=len(documents), desc="      进度", ncols=70) as pbar:
-            data = [
-                [doc.metadata['chunk_index'] for doc in documents],
-                [doc.metadata['chunk_total'] for doc in documents],
-                [doc.metadata['chunk_size'] for doc in documents],
-                [doc.metadata['chunk_overlap'] for doc in documents],
-                [doc.page_content for doc in documents],
-                []  # 预分配embedding列表
-            ]
-            
-            # 分批处理向量化
-            batch_size = 4  # 可以根据需要调整批大小
-            for i in range(0, len(documents), batch_size):
-                batch = documents[i:i + batch_size]
-                embeddings_batch = [embeddings.embed_query(doc.page_content) for doc in batch]
-                data[5].extend(embeddings_batch)
-                pbar.update(len(batch))
+    try:
+        # 创建新的collection
+        print_step("   1. 初始化向量集合")
+        with trace.span("init_collection"):
+            collection = prepare_collection(filename)
         
-        collection.insert(data)
-    
+        # 解析、分割、向量化、写入以流水线方式并行进行
+        print_step("   2. 流水线处理 (解析 → 分割 → 向量化 → 写入)")
+        splitter = AdaptiveMedicalSplitter(workers=split_workers)
+        if pages is None:
+            pages = (doc.page_content for doc in PyPDFLoader(pdf_path).lazy_load())
+        chunks = {}
+
+        def insert(docs, vectors):
+            record_chunk_ids(chunks, docs, insert_documents(collection, docs, vectors, source))
+
+        start = time.perf_counter()
+        with tqdm(desc="      进度", unit="块", ncols=70) as pbar:
+            pipeline = IngestPipeline(splitter, embeddings, insert=insert, on_inserted=pbar.update)
+            try:
+                stats = pipeline.run(pages)
+            finally:
+                splitter.close()
+        end = time.perf_counter()
+        print_pipeline_stats(stats, end - start)
+        record_pipeline_spans(trace, stats, start, end)
+        with trace.span("index"):
+            refresh_index(collection)
+        
+        with trace.span("manifest"):
+            manifest.record(filename, pdf_path, collection.name, chunks)
+            manifest.save()
+    except Exception as e:
+        finish_ingest_trace(trace, "error", error=str(e))
+        raise
+    finish_ingest_trace(trace)
     return collection
 
-def load_pdfs(pdf_dir: str, specific_files: List[str] = None) -> Dict[str, Collection]:
-    """加载PDF文件到向量库"""
-    print_step("\n初始化中...")
-    print_step("1. 加载embedding模型 (TencentBAC/Conan-embedding-v1)")
-    embeddings = embedding_model
-    print_step("   ✓ 模型加载完成")
+def query_chunk_ids(collection: VectorCollection, filename: str) -> Dict[str, List[int]]:
+    """从向量库中读取文件的全部文本块，重建块哈希到ID的映射（用于没有清单记录的旧数据）"""
+    fields = ["chunk_index", "chunk_total", "chunk_size", "chunk_overlap", "content"]
+    expr = source_expr([filename]) if is_single_collection() else "id >= 0"
+    chunks = {}
+    # 按需加载模式下collection可能尚未加载，而Milvus的查询要求collection已加载
+    collection.load()
+    for row in iter_rows(collection, expr, fields):
+        chunks.setdefault(chunk_hash(row['content'], row), []).append(row['id'])
+    return chunks
+
+def delete_ids(collection: VectorCollection, ids: List[int], batch_size: int = 1000):
+    """按主键分批删除"""
+    for i in range(0, len(ids), batch_size):
+        collection.delete(expr=f"id in {ids[i:i + batch_size]}")
+    delete_content(collection, ids)
+
+def update_pdf(pdf_path: str, collection: VectorCollection, embeddings, manifest: Manifest) -> Tuple[int, int, int]:
+    """增量更新单个PDF：只向量化写入内容变化的文本块并删除已移除的块，返回(新增, 删除, 保留)数量"""
+    from utils.parallel_ingest import parse_and_split
+    from utils.answer_cache import invalidate_source
+
+    filename = os.path.basename(pdf_path)
+    print_step(f"\n增量更新文档: [{filename}]")
+    start = time.perf_counter()
+    trace = Trace("ingest", file=filename, mode="update")
+
+    try:
+        entry = manifest.get(filename, collection.name)
+        if entry is None or entry["chunks"] is None:
+            print_step("   → 从向量库重建文本块清单")
+            with trace.span("rebuild_manifest"):
+                old_chunks = query_chunk_ids(collection, filename)
+        else:
+            old_chunks = {h: list(ids) for h, ids in entry["chunks"].items()}
+
+        # 逐块比对哈希：未变化的块沿用原有ID，其余重新向量化
+        chunks = {}
+        changed = []
+        with trace.span("parse_split"):
+            for doc in parse_and_split(pdf_path):
+                h = chunk_hash(doc.page_content, doc.metadata)
+                ids = old_chunks.get(h)
+                if ids:
+                    chunks.setdefault(h, []).append(ids.pop())
+                else:
+                    changed.append(doc)
+        stale = [chunk_id for ids in old_chunks.values() for chunk_id in ids]
+        kept = sum(len(ids) for ids in chunks.values())
+        if stale and not kept:
+            # 旧版本分块程序生成的数据（如按段落分块前入库的collection）哈希全部对不上，只能整体重建一次
+            print_step(f"   ! 向量库中的 {len(stale)} 个文本块与当前分块结果均不一致（可能由旧版本程序入库），"
+                       f"将全量重新向量化 {len(changed)} 块；此后的更新只处理变化的块")
 
-    print_step("\n2. 连接Milvus向量数据库")
-    connections.connect("default", host="localhost", port="19530")
+        # 先写入新块再删除旧块，中途失败时旧版本数据仍然完整
+        source = document_source(filename)
+        for i in range(0, len(changed), INSERT_BATCH):
+            batch = changed[i:i + INSERT_BATCH]
+            with trace.span("embed", items=len(batch)):
+                vectors = embeddings.embed_documents([doc.page_content for doc in batch])
+            with trace.span("insert", items=len(batch)):
+                record_chunk_ids(chunks, batch, insert_documents(collection, batch, vectors, source))
+        with trace.span("delete", items=len(stale)):
+            delete_ids(collection, stale)
+        with trace.span("index"):
+            refresh_index(collection)
+
+        with trace.span("manifest"):
+            manifest.record(filename, pdf_path, collection.name, chunks)
+            manifest.save()
+        invalidate_source(filename)
+    except Exception as e:
+        finish_ingest_trace(trace, "error", error=str(e))
+        raise
+    trace.count("chunks", len(changed))
+    trace.count("deleted_chunks", len(stale))
+    finish_ingest_trace(trace)
+    print_step(f"   ✓ 新增 {len(changed)} 块, 删除 {len(stale)} 块, 保留 {kept} 块 "
+               f"(耗时 {time.perf_counter() - start:.1f} 秒)")
+    return len(changed), len(stale), kept
+
+def remove_pdf(filename: str, collection: VectorCollection, manifest: Manifest):
+    """将已删除的PDF移出知识库"""
+    from utils.answer_cache import invalidate_source
+    if is_single_collection():
+        delete_source(collection, filename)
+    else:
+        collection.release()
+        drop_collection(collection.name)
+    manifest.remove(filename)
+    manifest.save()
+    invalidate_source(filename)
+
+def index_documents(collection: VectorCollection, documents, embeddings, source: str = None) -> Dict[str, List[int]]:
+    """分批向量化已分割好的文本块并写入collection，返回块哈希到ID的映射"""
+    chunks = {}
+    for i in range(0, len(documents), INSERT_BATCH):
+        batch = documents[i:i + INSERT_BATCH]
+        vectors = embeddings.embed_documents([doc.page_content for doc in batch])
+        record_chunk_ids(chunks, batch, insert_documents(collection, batch, vectors, source))
+    return chunks
+
+def drop_failed_collection(filename: str):
+    """删除处理失败文件的残缺数据，下次启动时重新处理"""
+    collection_name = CONSOLIDATED_COLLECTION if is_single_collection() else get_collection_name(filename)
+    store = get_backend()
+    try:
+        if not store.has_collection(collection_name):
+            return
+        if is_single_collection():
+            delete_source(store.open_collection(collection_name), filename)
+        else:
+            drop_collection(collection_name)
+    except Exception as e:
+        print_step(f"      ! 无法清理残缺数据 {collection_name}: {e}")
+
+def load_pdfs_serial(pdf_dir: str, files: Set[str], embeddings, manifest: Manifest,
+                     split_workers: int = None) -> Tuple[Dict[str, VectorCollection], Dict[str, str]]:
+    """逐个处理PDF文件，单个文件失败不影响其他文件"""
+    collections = {}
+    failed = {}
+    for file in files:
+        pdf_path = os.path.join(pdf_dir, file)
+        try:
+            collections[file] = load_pdf(pdf_path, embeddings, manifest, split_workers)
+        except Exception as e:
+            failed[file] = str(e)
+            drop_failed_collection(file)
+            manifest.remove(file)
+            print_step(f"   ✗ 处理失败: [{file}] {e}")
+            continue
+        # 在打印完成提示前清除残留的loading文本
+        from main import clear_loading_line
+        clear_loading_line()
+        print_step(f"   ✓ 向量化完成")
+    return collections, failed
+
+def load_pdfs_parallel(pdf_dir: str, files: Set[str], embeddings, workers: int, manifest: Manifest) -> Tuple[Dict[str, VectorCollection], Dict[str, str]]:
+    """多进程并行解析、分割PDF，主进程负责向量化和写入，单个文件失败不影响其他文件"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from utils.parallel_ingest import init_worker, parse_and_split
+
+    collections = {}
+    failed = {}
+    total = len(files)
+    print_step(f"\n   并行解析 {total} 个文件 ({workers} 个进程)")
+    # 启动时预热线程仍在加载embedding模型和jieba词典，fork 可能复制其他线程持有的锁导致工作进程死锁；
+    # init_worker 会重建全部状态，使用 spawn
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            pool.submit(parse_and_split, os.path.join(pdf_dir, file)): file
+            for file in sorted(files)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            file = futures[future]
+            start = time.perf_counter()
+            # 解析和分割在工作进程中完成，这里只记录主进程中的阶段
+            trace = Trace("ingest", file=file, mode="parallel")
+            try:
+                documents = future.result()
+                with trace.span("init_collection"):
+                    collection = prepare_collection(file)
+                with trace.span("embed_insert", items=len(documents)):
+                    chunks = index_documents(collection, documents, embeddings, document_source(file))
+                with trace.span("index"):
+                    refresh_index(collection)
+            except Exception as e:
+                failed[file] = str(e)
+                drop_failed_collection(file)
+                manifest.remove(file)
+                print_step(f"   [{done}/{total}] ✗ {file}: {e}")
+                finish_ingest_trace(trace, "error", error=str(e))
+                continue
+            collections[file] = collection
+            with trace.span("manifest"):
+                manifest.record(file, os.path.join(pdf_dir, file), collection.name, chunks)
+                manifest.save()
+            trace.count("chunks", len(documents))
+            finish_ingest_trace(trace)
+            elapsed = time.perf_counter() - start
+            print_step(f"   [{done}/{total}] ✓ {file}: {len(documents)} 块, "
+                       f"向量化 {len(documents) / max(elapsed, 1e-6):.1f} 块/秒")
+    return collections, failed
+
+def load_pdfs(pdf_dir: str, specific_files: List[str] = None, workers: int = 1,
+              get_embeddings: Callable[[], Any] = None, load: bool = True) -> Dict[str, VectorCollection]:
+    """加载PDF文件到向量库，workers > 1 时多进程并行处理新文件
+
+    get_embeddings 返回embedding模型（可以是后台加载任务的 result），只在有文件需要入库时才等待模型就绪。
+    load 为 False 时不把collection加载到内存，由调用方在首次检索时按需加载。
+    """
+    print_step("\n初始化中...")
+    print_step("1. 连接向量数据库")
+    get_backend().connect()
     from main import clear_loading_line
     clear_loading_line()  # 清除连接过程中残留的loading文本
     print_step("   ✓ 向量数据库连接成功")
@@ -161,50 +456,152 @@ def load_pdfs(pdf_dir: str, specific_files: List[str] = None) -> Dict[str, Colle
     # 在扫描阶段开始前先清除loading残留
     from main import clear_loading_line
     clear_loading_line()
-    print_step("\n3. 扫描PDF文件和向量库")
-    # 获取所有collection名称
+    print_step("\n2. 扫描PDF文件和向量库")
     existing_collections = {}
     new_files = set()
     
     # 处理当前文件
-    print_step("\n4. 处理当前文件")
-    for file in current_files:
-        collection_name = get_collection_name(file)
-        if utility.has_collection(collection_name):
-            collection = Collection(collection_name)
-            collection.load()
-            existing_collections[file] = collection
-        else:
+    print_step("\n3. 处理当前文件")
+    manifest = Manifest()
+    changed_files = set()
+    for file, collection in open_collections(current_files, load).items():
+        if collection is None:
             new_files.add(file)
+            continue
+        existing_collections[file] = collection
+        pdf_path = os.path.join(pdf_dir, file)
+        if manifest.get(file, collection.name) is None:
+            # 旧版本数据没有清单记录，以当前文件为准登记，块信息在首次更新时再从向量库重建
+            manifest.record(file, pdf_path, collection.name, None)
+        elif manifest.is_changed(file, pdf_path, collection.name):
+            changed_files.add(file)
+    manifest.save()
 
-    if not new_files:
+    if not new_files and not changed_files:
         print_step("   ✓ 所有文件已加载")
     else:
         for file in new_files:
             print_step(f"   → 待处理: [{file}]")
+        for file in changed_files:
+            print_step(f"   → 内容已变化: [{file}]")
     
+    failed = {}
+    embeddings = None
+    if new_files or changed_files:
+        print_step("\n4. 加载embedding模型 (TencentBAC/Conan-embedding-v1)")
+        if get_embeddings is None:
+            from embedding_model import embedding_model
+            embeddings = embedding_model
+        else:
+            embeddings = get_embeddings()
+        print_step("   ✓ 模型加载完成")
+
     # 处理新文件
     if new_files:
-        # print_step("\n5. 处理新文件")
-        for file in new_files:
-            pdf_path = os.path.join(pdf_dir, file)
-            # print_step(f"\n5. 处理文件: {file}")
-            collection = load_pdf(pdf_path, embeddings)
-            existing_collections[file] = collection
-            # 在打印完成提示前清除残留的loading文本
-            from main import clear_loading_line
-            clear_loading_line()
-            print_step(f"   ✓ 向量化完成")
+        if workers > 1 and len(new_files) > 1:
+            collections, failed = load_pdfs_parallel(pdf_dir, new_files, embeddings, workers, manifest)
+        else:
+            # 只有一个新文件时无法按文件并行，改为在文件内部并行分词
+            collections, failed = load_pdfs_serial(pdf_dir, new_files, embeddings, manifest,
+                                                   split_workers=workers if workers > 1 else None)
+        existing_collections.update(collections)
+
+    # 增量更新内容变化的文件
+    for file in sorted(changed_files):
+        try:
+            update_pdf(os.path.join(pdf_dir, file), existing_collections[file], embeddings, manifest)
+        except Exception as e:
+            failed[file] = str(e)
+            print_step(f"   ✗ 更新失败: [{file}] {e}")
+
+    if not load and not is_single_collection():
+        # 入库和增量更新时加载的collection释放掉，保持按需加载
+        for file in (new_files | changed_files) & existing_collections.keys():
+            existing_collections[file].release()
     
     print_step("\n" + "="*50 +"\n")
     print_step("知识库加载完成，包含以下文件：")
     for file in sorted(current_files):
-        status = "[新文件]" if file in new_files else "[已加载]"
+        if file in failed:
+            status = "[失败]"
+        elif file in changed_files:
+            status = "[已更新]"
+        else:
+            status = "[新文件]" if file in new_files else "[已加载]"
         print_step(f"  {status} {file}")
     print_step("\n"+"="*50)
     
     return existing_collections
 
+def open_collections(files: Set[str], load: bool = True) -> Dict[str, Optional[VectorCollection]]:
+    """并发打开各文件的collection（has_collection + load 都是网络往返），文件尚未入库的值为 None"""
+    from concurrent.futures import ThreadPoolExecutor
+    files = sorted(files)
+    if len(files) <= 1:
+        return {file: open_collection(file, load) for file in files}
+    if is_single_collection():
+        # 先在当前线程中打开（必要时创建）单一collection，避免并发创建
+        collection = get_consolidated_collection()
+        opener = lambda file: collection if has_source(collection, file) else None
+    else:
+        opener = lambda file: open_collection(file, load)
+    with ThreadPoolExecutor(max_workers=min(OPEN_WORKERS, len(files)), thread_name_prefix="open") as pool:
+        return dict(zip(files, pool.map(opener, files)))
+
+def open_collection(filename: str, load: bool = True):
+    """打开文件已入库的collection，文件尚未入库时返回 None
+
+    load 为 False 时只获取句柄（按需加载）；单一collection需要查询source，始终加载。
+    """
+    if is_single_collection():
+        # 所有文件共用一个collection，按source判断文件是否已入库
+        collection = get_consolidated_collection()
+        return collection if has_source(collection, filename) else None
+    collection_name = get_collection_name(filename)
+    store = get_backend()
+    if not store.has_collection(collection_name):
+        return None
+    return store.open_collection(collection_name, load=load)
+
+def sync_knowledge_base(pdf_dir: str, collections: Dict[str, VectorCollection], specific_files: List[str] = None) -> Dict[str, str]:
+    """同步知识库与PDF目录：新文件全量入库，内容变化的文件增量更新，已删除的文件移出知识库
+
+    直接修改传入的 collections，返回 {文件名: 变化类型}
+    """
+    from embedding_model import embedding_model
+    manifest = Manifest()
+    current_files = get_pdf_files(pdf_dir, specific_files)
+    changes = {}
+
+    for file in sorted(set(collections) - current_files):
+        try:
+            remove_pdf(file, collections.pop(file), manifest)
+            changes[file] = "removed"
+        except Exception as e:
+            changes[file] = f"failed: {e}"
+
+    for file in sorted(current_files):
+        pdf_path = os.path.join(pdf_dir, file)
+        try:
+            collection = collections.get(file) or open_collection(file)
+            if collection is None:
+                try:
+                    collections[file] = load_pdf(pdf_path, embedding_model, manifest)
+                except Exception:
+                    drop_failed_collection(file)
+                    manifest.remove(file)
+                    raise
+                changes[file] = "added"
+                continue
+            collections[file] = collection
+            if manifest.is_changed(file, pdf_path, collection.name):
+                update_pdf(pdf_path, collection, embedding_model, manifest)
+                changes[file] = "updated"
+        except Exception as e:
+            changes[file] = f"failed: {e}"
+    manifest.save()
+    return changes
+
 def get_original_filename(collection_name: str) -> str:
     """从collection名称反推原始文件名"""
     # 移除前缀
@@ -225,4 +622,54 @@ def get_original_filename(collection_name: str) -> str:
         if get_collection_name(pdf_file)[len("medical_kb_"):] == name:
             return pdf_file
     
-    return None
\ No newline at end of file
+    return None
+
+def migrate_to_single_collection(drop_old: bool = False) -> Dict[str, int]:
+    """将按文件划分的collection迁移到单一collection中，可重复执行"""
+    store = get_backend()
+    store.connect()
+    target = get_consolidated_collection()
+    target_projection = get_projection(target.name)
+    fields = ["chunk_index", "chunk_total", "chunk_size", "chunk_overlap", "content", "embedding"]
+    migrated = {}
+
+    print_step("\n开始迁移到单一collection")
+    for name in sorted(store.list_collections()):
+        if not name.startswith("medical_kb_"):
+            continue
+        source = get_original_filename(name) or name
+        # 已降维的向量无法还原，只能迁移到使用相同投影的目标中
+        projection = get_projection(name)
+        projected = projection is not None
+        if projected and (target_projection is None or projection.fingerprint() != target_projection.fingerprint()):
+            print_step(f"   ! {name}: 向量降维方式与目标不同，无法迁移，请重新入库该文件")
+            continue
+        collection = store.open_collection(name)
+        # 先清除目标中该文件的旧数据，保证重复迁移不会产生重复数据
+        delete_source(target, source)
+
+        # 源与目标的字段结构可能不同（legacy / compact），统一还原为文本块和float32向量后写入
+        count = 0
+        batch = []
+        for row in iter_rows(collection, "id >= 0", ["id"] + fields):
+            metadata = {field: row[field] for field in fields[:4]}
+            batch.append((Document(page_content=row['content'], metadata=metadata), row['embedding']))
+            if len(batch) == INSERT_BATCH:
+                insert_rows(target, [doc for doc, _ in batch], [vector for _, vector in batch], source, projected)
+                count += len(batch)
+                batch = []
+        if batch:
+            insert_rows(target, [doc for doc, _ in batch], [vector for _, vector in batch], source, projected)
+            count += len(batch)
+        migrated[source] = count
+        print_step(f"   ✓ {name} → [{source}]: {count} 条")
+
+        if drop_old:
+            collection.release()
+            drop_collection(name)
+    refresh_index(target)
+
+    print_step(f"\n迁移完成，共 {len(migrated)} 个文件、{sum(migrated.values())} 条数据")
+    if not drop_old:
+        print_step("原有collection已保留，确认无误后可使用 --drop-old 重新迁移以删除")
+    return migrated
@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# jieba 词典缓存目录：默认缓存写在系统临时目录中，容易被清理，放到项目目录下可长期复用
+JIEBA_CACHE_DIR = os.getenv("JIEBA_CACHE_DIR", "./jieba_cache")
+# 启动预热使用的线程数
+WARMUP_THREADS = int(os.getenv("STARTUP_WARMUP_THREADS", "4"))
+
+class StartupTimer:
+    """记录启动各阶段耗时，阶段可以在多个线程中并发执行"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._phases: Dict[str, Tuple[float, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        with self._lock:
+            self._phases[name] = (start, None)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._phases[name] = (start, time.perf_counter())
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """包装函数，使其执行时间记入指定阶段（用于提交到线程池）"""
+        def run(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return run
+
+    def report(self) -> List[str]:
+        """启动耗时明细：各阶段相对启动时刻的起止时间，尚未结束的阶段标记为后台进行中"""
+        now = time.perf_counter()
+        lines = [f"启动耗时 {now - self.started:.1f} 秒"]
+        with self._lock:
+            phases = sorted(self._phases.items(), key=lambda item: item[1][0])
+        busy = sum(end - start for _, (start, end) in phases if end is not None)
+        for name, (start, end) in phases:
+            offset = start - self.started
+            if end is None:
+                lines.append(f"  - {name}: {offset:.1f}s 起，后台进行中")
+            else:
+                lines.append(f"  - {name}: {end - start:.1f} 秒 ({offset:.1f}s → {end - self.started:.1f}s)")
+        lines.append(f"  各阶段合计 {busy:.1f} 秒，并发节省 {max(0.0, busy - (now - self.started)):.1f} 秒")
+        return lines
+
+def init_jieba():
+    """加载jieba词典并注册医学术语，词典缓存写入项目目录以便下次启动直接读取"""
+    import logging
+    import jieba
+    from utils.text_splitter.medical_splitter import register_medical_terms
+
+    jieba.setLogLevel(logging.WARNING)
+    os.makedirs(JIEBA_CACHE_DIR, exist_ok=True)
+    jieba.dt.tmp_dir = JIEBA_CACHE_DIR
+    jieba.initialize()
+    register_medical_terms()
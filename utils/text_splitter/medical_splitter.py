@@ -1,6 +1,11 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 from dataclasses import dataclass
+from itertools import accumulate
+import os
 import re
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Iterator, Optional
 import jieba
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -11,8 +16,72 @@ class TextStats:
     avg_paragraph_length: float
     term_density: float
 
+# 医学词典
+MEDICAL_TERMS = [
+    "药理学", "病理学", "生理学", "解剖学", "生物化学",
+    "免疫学", "微生物学", "寄生虫学", "内科学", "外科学",
+    "妇产科学", "儿科学", "神经病学", "精神病学", "肿瘤学",
+    "心脏病学", "肾脏病学", "呼吸病学", "消化病学", "内分泌学",
+    "血液学", "传染病学", "皮肤病学", "眼科学", "耳鼻喉科学",
+    "口腔科学", "麻醉学", "急诊医学", "康复医学", "医学影像学",
+    "临床药理学", "药物代谢动力学", "药物效应动力学", "不良反应", "药物相互作用",
+    "剂量", "给药途径", "适应症", "禁忌症", "注意事项",
+    "处方", "非处方药", "中药", "西药", "生物制剂",
+    "疫苗", "诊断", "治疗", "预防", "预后",
+    "症状", "体征", "实验室检查", "影像学检查", "病理学检查",
+    "基因检测", "临床试验", "循证医学", "安慰剂", "双盲",
+    "随机对照试验", "Meta分析", "系统评价", "指南", "共识",
+    "发生机制", "病因", "临床表现", "伴随症状", "参考区间",
+    "药理作用及机制", "药理作用", "临床应用", "不良反应及注意事项",
+    "体内过程", "病因和病理", "临床表现和并发症", "诊断与鉴别诊断",
+    "解剖概要", "应用解剖", "病理生理", "分型", "病理", "生理", "分类"
+]
+
+_terms_registered = False
+_terms_lock = threading.Lock()
+
+def register_medical_terms():
+    """向jieba注册医学词典，每个进程只注册一次"""
+    global _terms_registered
+    with _terms_lock:
+        if _terms_registered:
+            return
+        for term in MEDICAL_TERMS:
+            jieba.add_word(term)
+        _terms_registered = True
+
+def _init_segment_worker():
+    """分词工作进程初始化：加载jieba词典并注册医学术语"""
+    import logging
+    jieba.setLogLevel(logging.WARNING)
+    register_medical_terms()
+    jieba.initialize()
+
+def _segment_item(args) -> List[str]:
+    """在工作进程中对单个条目分词并切分窗口"""
+    return AdaptiveMedicalSplitter._window_chunks(*args)
+
+# 分词进程数，1 表示在当前进程中串行分词
+SPLIT_WORKERS = int(os.getenv("SPLIT_WORKERS", "1"))
+# 每个进程任务包含的条目数，条目通常较短，成批发送以减少进程间通信开销
+SPLIT_TASK_ITEMS = 16
+
+_WHITESPACE = re.compile(r'\s+')
+_SENTENCE_END = ("。", "！", "？")
+
+def _clean_chunk(chunk: str) -> str:
+    """截断到最后一个句末标点，去除首尾空白"""
+    if not chunk.endswith(_SENTENCE_END):
+        last_period = max(chunk.rfind("。"), chunk.rfind("！"), chunk.rfind("？"))
+        if last_period != -1:
+            chunk = chunk[:last_period + 1]
+    return chunk.strip()
+
 class AdaptiveMedicalSplitter:
-    def __init__(self):
+    def __init__(self, workers: int = None):
+        # workers > 1 时分词分散到多个进程，分块结果与串行模式完全一致
+        self.workers = SPLIT_WORKERS if workers is None else workers
+        self._executor: Optional[ProcessPoolExecutor] = None
         self.term_patterns = [
             r'[A-Z][a-z]+(?:[ -][A-Z][a-z]+)*',  # 医学术语
             r'\d+(?:\.\d+)?%?(?:[ -][A-Za-z]+)+', # 剂量/数值
@@ -25,38 +94,22 @@ class AdaptiveMedicalSplitter:
             'subsection': r'^\d+\.\d+\.\d+\s+[^\n]+',
             'item':r'^[一二三四五六七八九十]、|\d+、|\d+\. |\（\d+\）|\d+\)'
         }
-        # 添加医学词典
-        medical_terms = [
-            "药理学", "病理学", "生理学", "解剖学", "生物化学",
-            "免疫学", "微生物学", "寄生虫学", "内科学", "外科学",
-            "妇产科学", "儿科学", "神经病学", "精神病学", "肿瘤学",
-            "心脏病学", "肾脏病学", "呼吸病学", "消化病学", "内分泌学",
-            "血液学", "传染病学", "皮肤病学", "眼科学", "耳鼻喉科学",
-            "口腔科学", "麻醉学", "急诊医学", "康复医学", "医学影像学",
-            "临床药理学", "药物代谢动力学", "药物效应动力学", "不良反应", "药物相互作用",
-            "剂量", "给药途径", "适应症", "禁忌症", "注意事项",
-            "处方", "非处方药", "中药", "西药", "生物制剂",
-            "疫苗", "诊断", "治疗", "预防", "预后",
-            "症状", "体征", "实验室检查", "影像学检查", "病理学检查",
-            "基因检测", "临床试验", "循证医学", "安慰剂", "双盲",
-            "随机对照试验", "Meta分析", "系统评价", "指南", "共识",
-            "发生机制", "病因", "临床表现", "伴随症状", "参考区间",
-            "药理作用及机制", "药理作用", "临床应用", "不良反应及注意事项",
-            "体内过程", "病因和病理", "临床表现和并发症", "诊断与鉴别诊断",
-            "解剖概要", "应用解剖", "病理生理", "分型", "病理", "生理", "分类"
-        ]
-        for term in medical_terms:
-            jieba.add_word(term)
+        # 预编译正则，避免每次分割重复编译
+        self._term_regexes = [re.compile(pattern) for pattern in self.term_patterns]
+        self._section_regexes = {name: re.compile(pattern) for name, pattern in self.section_patterns.items()}
+        # 添加医学词典（每个进程只注册一次）
+        register_medical_terms()
 
     def analyze_text(self, text: str) -> TextStats:
         """分析文本特征"""
-        sentences = re.split(r'[。！？]', text)
-        paragraphs = text.split('\n\n')
+        # 用计数代替 split 得到句子/段落的平均长度，结果与逐段求和相同
+        sentence_breaks = sum(text.count(mark) for mark in _SENTENCE_END)
+        paragraph_breaks = text.count('\n\n')
 
-        avg_sent_len = sum(len(s) for s in sentences) / max(len(sentences), 1)
-        avg_para_len = sum(len(p) for p in paragraphs) / max(len(paragraphs), 1)
+        avg_sent_len = (len(text) - sentence_breaks) / (sentence_breaks + 1)
+        avg_para_len = (len(text) - 2 * paragraph_breaks) / (paragraph_breaks + 1)
 
-        term_count = sum(len(re.findall(pattern, text)) for pattern in self.term_patterns)
+        term_count = sum(sum(1 for _ in regex.finditer(text)) for regex in self._term_regexes)
         term_density = term_count / len(text) if text else 0
 
         return TextStats(avg_sent_len, avg_para_len, term_density)
@@ -76,9 +129,87 @@ class AdaptiveMedicalSplitter:
             "chunk_overlap": chunk_overlap
         }
 
-    def split_document(self, text: str, metadata: Dict[str, Any] = None) -> List[Document]:
+    def _iter_parts(self, text: str, pattern_name: str) -> Iterator[tuple]:
+        """单次扫描按标题分割，产出 (标题, 内容)
+
+        标题的分配方式与 re.split + re.findall 的组合一致：跳过空白部分，
+        第 n 个非空部分对应第 n 个匹配到的标题，多余的部分标题为空。
+        """
+        titles = []
+        start = 0
+        title_index = 0
+        pending = []
+        for match in self._section_regexes[pattern_name].finditer(text):
+            titles.append(match.group())
+            pending.append(text[start:match.start()])
+            start = match.end()
+            # 已知标题数量足够时即可产出前面的部分
+            while pending and title_index < len(titles):
+                part = pending.pop(0)
+                if part.strip():
+                    yield titles[title_index], part
+                    title_index += 1
+        pending.append(text[start:])
+        for part in pending:
+            if not part.strip():
+                continue
+            yield (titles[title_index] if title_index < len(titles) else ''), part
+            title_index += 1
+
+    @staticmethod
+    def _window_chunks(text: str, chunk_size_words: int, chunk_overlap_words: int) -> List[str]:
+        """按词数切分重叠窗口，用词的字符偏移直接切片，不再维护词列表
+
+        结果与逐词累积、满 chunk_size 后保留末尾 chunk_overlap 个词的做法一致（要求 overlap < size）。
+        """
+        offsets = [0]
+        offsets.extend(accumulate(len(word) for word in jieba.cut(text)))
+        n = len(offsets) - 1
+        step = chunk_size_words - chunk_overlap_words
+
+        chunks = []
+        start = 0
+        while start + chunk_size_words <= n:
+            chunks.append(text[offsets[start]:offsets[start + chunk_size_words]])
+            start += step
+        if start < n:
+            chunks.append(text[offsets[start]:offsets[n]])
+        return chunks
+
+    def close(self):
+        """关闭分词进程池"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _iter_items(self, text: str) -> Iterator[tuple]:
+        """多级标题分割，产出 (章标题, 节标题, 条目标题, 条目内容)"""
+        for chapter_title, chapter_content in self._iter_parts(text, 'chapter'):
+            for section_title, section_content in self._iter_parts(chapter_content, 'section'):
+                for item_title, item_content in self._iter_parts(section_content, 'item'):
+                    yield chapter_title, section_title, item_title, item_content
+
+    def _segment(self, items: Iterator[tuple], chunk_size_words: int, chunk_overlap_words: int) -> Iterator[tuple]:
+        """对各条目分词切窗口，按条目原顺序产出 (条目, 窗口列表)"""
+        if self.workers <= 1:
+            for item in items:
+                yield item, self._window_chunks(item[3], chunk_size_words, chunk_overlap_words)
+            return
+        # 并行模式先切出全部条目（只做正则扫描，开销很小）再分发分词
+        items = list(items)
+        if self._executor is None:
+            # 分割器常在多线程环境中创建（入库流水线的分割线程运行时向量化线程也在运行），
+            # fork 可能复制其他线程持有的锁（如jieba词典锁）导致工作进程死锁；初始化函数会重建全部状态，使用 spawn
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_segment_worker,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        tasks = ((item[3], chunk_size_words, chunk_overlap_words) for item in items)
+        # executor.map 按提交顺序返回，保证块顺序与串行模式一致
+        yield from zip(items, self._executor.map(_segment_item, tasks, chunksize=SPLIT_TASK_ITEMS))
+
+    def iter_documents(self, text: str, metadata: Dict[str, Any] = None) -> Iterator[Document]:
+        """流式分割文档，逐个产出文本块"""
         # 预处理：去除不必要的空格和换行符
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = _WHITESPACE.sub(' ', text).strip()
 
         stats = self.analyze_text(text)
         params = self.get_optimal_chunk_size(stats)
@@ -86,113 +217,46 @@ class AdaptiveMedicalSplitter:
         # chunk_size 和 chunk_overlap 使用词数而不是字符数
         chunk_size_words = params["chunk_size"]
         chunk_overlap_words = params["chunk_overlap"]
-        
-        documents = []
-
-        # 多级标题分割
-        def split_by_pattern(text, pattern_name):
-            pattern = self.section_patterns[pattern_name]
-            parts = re.split(pattern, text)
-            titles = re.findall(pattern, text)
-            return parts, titles
-        
-        chapters, chapter_titles = split_by_pattern(text, 'chapter')
-        #如果无法匹配到章节
-        if len(chapters) <= 1:
-            chapters = [text]
-            chapter_titles = ['']
-
-        chapter_index = 0
-        for i, chapter_content in enumerate(chapters):
-            if not chapter_content.strip():
-                continue
-
-            chapter_title = chapter_titles[chapter_index] if chapter_index < len(chapter_titles) else ''
-            chapter_index += 1
+        merge_limit = params["chunk_size"] * 0.7
 
-            sections, section_titles = split_by_pattern(chapter_content, 'section')
-            section_index = 0
-            
-            for j, section_content in enumerate(sections):
-                if not section_content.strip():
+        # 按条目顺序生成文本块，边生成边合并短chunk
+        temp_doc = None
+        segmented = self._segment(self._iter_items(text), chunk_size_words, chunk_overlap_words)
+        for (chapter_title, section_title, item_title, _), chunks in segmented:
+            for l, chunk in enumerate(chunks):
+                clean_text = _clean_chunk(chunk)
+                if len(clean_text) > 4500:
+                    clean_text = clean_text[:4500]
+                if not clean_text:
                     continue
 
-                section_title = section_titles[section_index] if section_index < len(section_titles) else ''
-                section_index += 1
-                
-                items, item_titles = split_by_pattern(section_content, 'item')
-                item_index = 0
-
-                for k, item_content in enumerate(items):
-                    if not item_content.strip():
-                        continue
-                    
-                    item_title = item_titles[item_index] if item_index < len(item_titles) else ''
-                    item_index += 1
-
-                    # 使用 jieba 分词
-                    words = list(jieba.cut(item_content))
-
-                    chunks = []
-                    current_chunk = []
-                    current_length = 0
-
-                    for word in words:
-                        current_chunk.append(word)
-                        current_length += 1
-                        if current_length >= chunk_size_words:
-                            chunks.append("".join(current_chunk))
-                            current_chunk = current_chunk[-chunk_overlap_words:]
-                            current_length = len(current_chunk)
-
-                    if current_chunk:
-                        chunks.append("".join(current_chunk))
-
-                    def clean_chunk(chunk: str) -> str:
-                        if not chunk.endswith(("。", "！", "？")):
-                            last_period = max(chunk.rfind("。"), chunk.rfind("！"), chunk.rfind("？"))
-                            if last_period != -1:
-                                chunk = chunk[:last_period + 1]
-                        return chunk.strip()
-
-
-                    for l, chunk in enumerate(chunks):
-                        clean_text = clean_chunk(chunk)
-                        if len(clean_text) > 4500:
-                            clean_text = clean_text[:4500]
-                        if not clean_text:
-                            continue
-
-                        # 修改元数据格式，只保留简单类型
-                        chunk_metadata = {
-                            **(metadata or {}),
-                            "chapter_title": chapter_title,  # 添加章节标题
-                            "section_title": section_title, # 添加节标题
-                            "item_title": item_title, # 添加小标题
-                            "chunk_index": str(l),
-                            "chunk_total": str(len(chunks)),
-                            "chunk_size": str(params["chunk_size"]),
-                            "chunk_overlap": str(params["chunk_overlap"])
-                        }
-
-                        documents.append(Document(
-                            page_content=clean_text,
-                            metadata=chunk_metadata
-                        ))
-        #后处理，合并短chunk
-        merged_documents = []
-        temp_doc = None
-        for doc in documents:
-            if temp_doc is None:
-                temp_doc = doc
-            elif len(temp_doc.page_content) + len(doc.page_content) < params["chunk_size"] * 0.7:
-                temp_doc.page_content += doc.page_content
-                #只更新chunk_total
-                temp_doc.metadata["chunk_total"] = str(int(temp_doc.metadata["chunk_total"]) + int(doc.metadata["chunk_total"]))
-
-            else:
-                merged_documents.append(temp_doc)
-                temp_doc = doc
+                # 修改元数据格式，只保留简单类型
+                doc = Document(
+                    page_content=clean_text,
+                    metadata={
+                        **(metadata or {}),
+                        "chapter_title": chapter_title,  # 添加章节标题
+                        "section_title": section_title, # 添加节标题
+                        "item_title": item_title, # 添加小标题
+                        "chunk_index": str(l),
+                        "chunk_total": str(len(chunks)),
+                        "chunk_size": str(params["chunk_size"]),
+                        "chunk_overlap": str(params["chunk_overlap"])
+                    }
+                )
+
+                #后处理，合并短chunk
+                if temp_doc is None:
+                    temp_doc = doc
+                elif len(temp_doc.page_content) + len(doc.page_content) < merge_limit:
+                    temp_doc.page_content += doc.page_content
+                    #只更新chunk_total
+                    temp_doc.metadata["chunk_total"] = str(int(temp_doc.metadata["chunk_total"]) + int(doc.metadata["chunk_total"]))
+                else:
+                    yield temp_doc
+                    temp_doc = doc
         if temp_doc:
-            merged_documents.append(temp_doc)
-        return merged_documents
\ No newline at end of file
+            yield temp_doc
+
+    def split_document(self, text: str, metadata: Dict[str, Any] = None) -> List[Document]:
+        return list(self.iter_documents(text, metadata))
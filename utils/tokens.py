@@ -0,0 +1,53 @@
+import math
+import re
+from typing import Dict
+
+# 粗略的token估计（不依赖具体模型的分词器）：汉字及全角标点约每字 1 个token，
+# 其余非空白字符（英文、数字、半角符号）约每 4 个字符 1 个token
+_CJK = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+_SPACE = re.compile(r'\s')
+CJK_TOKENS = 1.0
+OTHER_TOKENS = 0.25
+
+def _char_tokens(ch: str) -> float:
+    if _CJK.match(ch):
+        return CJK_TOKENS
+    if _SPACE.match(ch):
+        return 0.0
+    return OTHER_TOKENS
+
+def estimate_tokens(text: str) -> int:
+    """估计文本的token数"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    other = len(text) - cjk - len(_SPACE.findall(text))
+    return math.ceil(cjk * CJK_TOKENS + other * OTHER_TOKENS)
+
+def truncate_tokens(text: str, max_tokens: int, keep_tail: bool = False, marker: str = "……") -> str:
+    """将文本截断到约 max_tokens 个token（默认保留开头，keep_tail=True 时保留结尾），截断处加省略号"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max(0, max_tokens - estimate_tokens(marker))
+    chars = reversed(text) if keep_tail else text
+    used = 0.0
+    count = 0
+    for ch in chars:
+        used += _char_tokens(ch)
+        if used > budget:
+            break
+        count += 1
+    if keep_tail:
+        return marker + text[len(text) - count:] if count else marker
+    return text[:count] + marker
+
+def format_token_report(report: Dict[str, int]) -> str:
+    """将提示词各部分的token数格式化为一行，如「提示词 3120 tokens: 指令 420 · 参考资料 1900 · ...」"""
+    if report.get("cached"):
+        return "答案来自缓存，未调用LLM"
+    labels = {"instructions": "指令", "context": "参考资料", "summary": "对话摘要", "history": "近期对话", "query": "问题"}
+    parts = " · ".join(f"{label} {report.get(key, 0)}" for key, label in labels.items())
+    line = f"提示词 {report.get('total', 0)} tokens: {parts}"
+    if report.get("context_saved"):
+        line += f"（相邻文本块去重节省 {report['context_saved']}）"
+    return line
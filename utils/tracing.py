@@ -0,0 +1,217 @@
+"""问答与入库的分阶段耗时追踪
+
+每次提问或入库对应一个 Trace，其中各阶段记为 span（名称、相对开始时刻、耗时、附加属性）。
+Trace 结束时：
+    - 设置了 TRACE_LOG 时以一行JSON追加到该文件；
+    - 各阶段耗时和计数累计到进程内的 Prometheus 指标（服务模式下 GET /metrics，或写入 METRICS_FILE）；
+    - 设置了 TRACE_PROFILE（main.py --profile）时可打印逐阶段耗时明细。
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Tuple
+
+# JSON格式的追踪日志（每行一个Trace），为空时不写
+TRACE_LOG = os.getenv("TRACE_LOG", "")
+# Prometheus文本格式的指标文件，为空时不写；写入间隔（秒）
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_WRITE_INTERVAL = float(os.getenv("METRICS_WRITE_INTERVAL", "5"))
+# 打印每次提问/入库的阶段耗时明细
+TRACE_PROFILE = os.getenv("TRACE_PROFILE", "0") != "0"
+
+METRIC_PREFIX = "medqa"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(**labels) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels: Labels, extra: Dict[str, str] = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+class Metrics:
+    """进程内的计数器和直方图，按 Prometheus 文本格式输出"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, list]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels):
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._counters.setdefault(name, {})
+            key = _labels(**labels)
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, help: str = "", **labels):
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._histograms.setdefault(name, {})
+            # [各桶计数..., 总和, 总数]
+            state = series.setdefault(_labels(**labels), [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help.get(name) or name}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name) or name}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, state in sorted(series.items()):
+                    for bound, count in zip(self.buckets, state):
+                        lines.append(f"{name}_bucket{_format_labels(labels, {'le': f'{bound:g}'})} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, {'le': '+Inf'})} {state[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {state[-2]:.6f}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """原子地写入指标文件（供 node_exporter textfile collector 等读取）"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+metrics = Metrics()
+_log_lock = threading.Lock()
+_metrics_written = 0.0
+
+class Span:
+    def __init__(self, name: str, start: float, duration: float, attrs: dict):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.attrs = attrs
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "start_ms": round(self.start * 1000, 2),
+                "duration_ms": round(self.duration * 1000, 2), **self.attrs}
+
+class Trace:
+    """一次提问（kind="chat"）或一个文件入库（kind="ingest"）的阶段耗时记录，可在多个线程中记录span"""
+
+    def __init__(self, kind: str, **attrs):
+        self.id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.attrs = attrs
+        self.timestamp = time.time()
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.status = None
+        self.spans: List[Span] = []
+        self.counts: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """记录一个阶段，yield 的字典可在阶段内补充属性"""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.add_span(name, start, time.perf_counter(), **attrs)
+
+    def add_span(self, name: str, start: float, end: float, **attrs):
+        """记录已知起止时刻（time.perf_counter）的阶段"""
+        with self._lock:
+            self.spans.append(Span(name, start - self.started, end - start, attrs))
+
+    def set(self, **attrs):
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def count(self, name: str, value: float = 1):
+        """累计计数（如入库的文本块数），结束时计入 <前缀>_<kind>_<name>_total 指标"""
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def finish(self, status: str = "ok", **attrs):
+        """结束追踪：写日志并累计指标，重复调用无效"""
+        with self._lock:
+            if self.duration is not None:
+                return
+            self.duration = time.perf_counter() - self.started
+            self.status = status
+            self.attrs.update(attrs)
+        _record(self)
+
+    def stage_totals(self) -> Dict[str, float]:
+        """各阶段名称的耗时合计（秒），同名span（如各collection的检索）相加"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return totals
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "trace_id": self.id,
+                "kind": self.kind,
+                "timestamp": round(self.timestamp, 3),
+                "duration_ms": round((self.duration or 0.0) * 1000, 2),
+                "status": self.status,
+                **self.attrs,
+                "counts": dict(self.counts),
+                "spans": [span.to_dict() for span in sorted(self.spans, key=lambda s: s.start)],
+            }
+
+    def format(self) -> List[str]:
+        """逐阶段耗时明细，用于终端打印"""
+        data = self.to_dict()
+        lines = [f"[{self.kind} {self.id}] 总耗时 {data['duration_ms']:.0f} ms ({self.status})"]
+        for span in data["spans"]:
+            extra = {key: value for key, value in span.items() if key not in ("name", "start_ms", "duration_ms")}
+            detail = " ".join(f"{key}={value}" for key, value in extra.items())
+            lines.append(f"  {span['start_ms']:>8.0f} ms  +{span['duration_ms']:>7.0f} ms  {span['name']} {detail}".rstrip())
+        for name, value in data["counts"].items():
+            lines.append(f"  {name}: {value:g}")
+        return lines
+
+def maybe_span(trace: Optional[Trace], name: str, **attrs):
+    """trace 为 None 时不记录"""
+    return trace.span(name, **attrs) if trace is not None else nullcontext(attrs)
+
+def _record(trace: Trace):
+    global _metrics_written
+    for name, seconds in trace.stage_totals().items():
+        metrics.observe(f"{METRIC_PREFIX}_stage_seconds", seconds, "各阶段耗时（秒）", kind=trace.kind, stage=name)
+    metrics.observe(f"{METRIC_PREFIX}_{trace.kind}_seconds", trace.duration, f"{trace.kind} 总耗时（秒）")
+    metrics.inc(f"{METRIC_PREFIX}_{trace.kind}_total", 1, f"{trace.kind} 次数", status=trace.status)
+    for name, value in trace.counts.items():
+        metrics.inc(f"{METRIC_PREFIX}_{trace.kind}_{name}_total", value, f"{trace.kind} {name} 累计")
+
+    if TRACE_LOG:
+        line = json.dumps(trace.to_dict(), ensure_ascii=False)
+        with _log_lock:
+            os.makedirs(os.path.dirname(TRACE_LOG) or ".", exist_ok=True)
+            with open(TRACE_LOG, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+    if METRICS_FILE and time.monotonic() - _metrics_written >= METRICS_WRITE_INTERVAL:
+        _metrics_written = time.monotonic()
+        metrics.write(METRICS_FILE)
+
+def flush_metrics():
+    """进程退出前写入最新的指标"""
+    if METRICS_FILE:
+        metrics.write(METRICS_FILE)
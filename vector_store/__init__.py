@@ -0,0 +1,23 @@
+import os
+from .base import FieldSpec, VectorBackend, VectorCollection
+
+# 向量库后端：milvus（默认，需要docker-compose启动的Milvus服务）或 local（进程内，无需服务端）
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "milvus")
+
+_backend = None
+
+def get_backend() -> VectorBackend:
+    """获取当前配置的向量库后端（进程内单例）"""
+    global _backend
+    if _backend is None:
+        if VECTOR_BACKEND == "milvus":
+            from .milvus_store import MilvusBackend
+            _backend = MilvusBackend()
+        elif VECTOR_BACKEND == "local":
+            from .local_store import LocalBackend
+            _backend = LocalBackend()
+        else:
+            raise ValueError(f"未知的向量库后端: {VECTOR_BACKEND}")
+    return _backend
+
+__all__ = ["FieldSpec", "VectorBackend", "VectorCollection", "get_backend"]
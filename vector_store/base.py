@@ -0,0 +1,71 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Protocol
+
+@dataclass
+class FieldSpec:
+    """与后端无关的字段定义
+
+    dtype 取值：int32 / int64 / varchar / float_vector / float16_vector / binary_vector（dim 为比特数）
+    """
+    name: str
+    dtype: str
+    max_length: Optional[int] = None
+    dim: Optional[int] = None
+    is_primary: bool = False
+    auto_id: bool = False
+    is_partition_key: bool = False
+
+class VectorCollection(Protocol):
+    """向量集合需要提供的接口（pymilvus.Collection 的子集）"""
+    name: str
+    num_entities: int
+
+    def load(self) -> None: ...
+    def release(self) -> None: ...
+    def flush(self) -> None: ...
+    def insert(self, data: List[list]) -> Any: ...
+    def delete(self, expr: str) -> Any: ...
+    def query(self, expr: str, output_fields: List[str] = None, limit: int = None) -> List[Dict]: ...
+    def query_iterator(self, batch_size: int, expr: str, output_fields: List[str]) -> Any: ...
+    def search(self, data: List[List[float]], anns_field: str, param: Dict, limit: int,
+               expr: str = None, output_fields: List[str] = None, timeout: float = None) -> List[list]: ...
+
+class VectorBackend(ABC):
+    """向量库后端：负责连接以及集合的创建、打开和删除"""
+
+    # 后端支持的向量索引类型
+    index_types: tuple = ("FLAT",)
+
+    @abstractmethod
+    def connect(self) -> None:
+        """建立连接，重复调用不会重复连接"""
+
+    @abstractmethod
+    def has_collection(self, name: str) -> bool:
+        ...
+
+    @abstractmethod
+    def open_collection(self, name: str, load: bool = True) -> VectorCollection:
+        """打开已存在的集合，load 为 False 时只获取句柄，不加载到内存"""
+
+    @abstractmethod
+    def create_collection(self, name: str, fields: List[FieldSpec], index_params: Dict,
+                          description: str = "") -> VectorCollection:
+        """创建集合、建立向量索引并加载"""
+
+    @abstractmethod
+    def describe(self, collection: VectorCollection) -> List[FieldSpec]:
+        """集合的字段定义"""
+
+    @abstractmethod
+    def set_index(self, collection: VectorCollection, index_params: Dict) -> None:
+        """用新的参数重建集合的向量索引，完成后集合处于已加载状态"""
+
+    @abstractmethod
+    def drop_collection(self, name: str) -> None:
+        ...
+
+    @abstractmethod
+    def list_collections(self) -> List[str]:
+        ...
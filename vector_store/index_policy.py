@@ -0,0 +1,153 @@
+import json
+import math
+import os
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterable, List, Optional
+
+# 按文本块数量选择索引：不超过 FLAT_MAX_ROWS 精确检索，不超过 HNSW_MAX_ROWS 用HNSW，更大的用IVF
+FLAT_MAX_ROWS = int(os.getenv("INDEX_FLAT_MAX_ROWS", "20000"))
+HNSW_MAX_ROWS = int(os.getenv("INDEX_HNSW_MAX_ROWS", "500000"))
+# 每个collection实际使用的索引配置（自动选择或调优得到），检索时从这里读取检索参数
+INDEX_CONFIG_PATH = os.getenv("INDEX_CONFIG_PATH", "./index_configs.json")
+# 没有记录时使用的检索参数（与早期版本的 IVF_PQ 索引一致）
+DEFAULT_SEARCH_PARAMS = {"metric_type": "L2", "params": {"nprobe": 16}}
+# 每次检索返回的最大数量，HNSW 的 ef 不能小于它
+SEARCH_LIMIT = 12
+
+@dataclass
+class IndexConfig:
+    index_type: str
+    build: Dict = field(default_factory=dict)
+    search: Dict = field(default_factory=dict)
+    metric: str = "L2"  # 二值向量为 HAMMING
+
+    @property
+    def index_params(self) -> Dict:
+        return {"metric_type": self.metric, "index_type": self.index_type, "params": dict(self.build)}
+
+    @property
+    def search_params(self) -> Dict:
+        return {"metric_type": self.metric, "params": dict(self.search)}
+
+    def label(self) -> str:
+        params = ", ".join(f"{k}={v}" for k, v in {**self.build, **self.search}.items())
+        return f"{self.index_type}({params})" if params else self.index_type
+
+def ivf_nlist(rows: int) -> int:
+    """IVF聚类数取 4·√N 附近的2的幂，并保证每个列表平均至少约39个向量（Milvus训练要求）"""
+    target = max(1, min(4 * math.sqrt(rows), rows / 39))
+    return int(min(65536, max(16, 2 ** round(math.log2(target)))))
+
+def choose_index(rows: int, index_types: Iterable[str] = ("FLAT", "HNSW", "IVF_FLAT", "IVF_SQ8"),
+                 vector_type: str = "float_vector") -> IndexConfig:
+    """根据文本块数量和向量类型选择索引类型和参数"""
+    index_types = set(index_types)
+    if vector_type == "binary_vector":
+        if rows <= FLAT_MAX_ROWS or "BIN_IVF_FLAT" not in index_types:
+            return IndexConfig("BIN_FLAT", metric="HAMMING")
+        nlist = ivf_nlist(rows)
+        return IndexConfig("BIN_IVF_FLAT", {"nlist": nlist}, {"nprobe": max(8, nlist // 32)}, "HAMMING")
+    if rows <= FLAT_MAX_ROWS or index_types == {"FLAT"}:
+        return IndexConfig("FLAT")
+    if rows <= HNSW_MAX_ROWS and "HNSW" in index_types:
+        return IndexConfig("HNSW", {"M": 16, "efConstruction": 200}, {"ef": 64})
+    nlist = ivf_nlist(rows)
+    index_type = "IVF_SQ8" if "IVF_SQ8" in index_types else "IVF_FLAT"
+    # 探查约 1/32 的列表，兼顾召回率与延迟
+    return IndexConfig(index_type, {"nlist": nlist}, {"nprobe": max(8, nlist // 32)})
+
+def candidate_configs(rows: int, index_types: Iterable[str]) -> List[IndexConfig]:
+    """调优时比较的候选配置：精确检索作为基准，其余按数据量展开参数网格"""
+    index_types = set(index_types)
+    candidates = [IndexConfig("FLAT")]
+    if "HNSW" in index_types:
+        for m in (8, 16, 32):
+            for ef in (SEARCH_LIMIT * 2, 64, 128, 256):
+                candidates.append(IndexConfig("HNSW", {"M": m, "efConstruction": 200}, {"ef": ef}))
+    nlist = ivf_nlist(rows)
+    for index_type in ("IVF_FLAT", "IVF_SQ8"):
+        if index_type not in index_types:
+            continue
+        for build_nlist in sorted({max(16, nlist // 2), nlist, min(65536, nlist * 2)}):
+            for nprobe in sorted({max(1, build_nlist // 64), max(1, build_nlist // 32),
+                                  max(1, build_nlist // 16), max(1, build_nlist // 8)}):
+                candidates.append(IndexConfig(index_type, {"nlist": build_nlist}, {"nprobe": nprobe}))
+    return candidates
+
+class IndexRegistry:
+    """记录每个collection的索引配置，格式为 {collection名称: {index_type, build, search, rows, source, ...}}"""
+
+    def __init__(self, path: str = INDEX_CONFIG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries: Dict[str, dict] = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def get(self, name: str) -> Optional[IndexConfig]:
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        return IndexConfig(entry["index_type"], entry.get("build", {}), entry.get("search", {}),
+                           entry.get("metric", "L2"))
+
+    def search_params(self, name: str) -> Dict:
+        config = self.get(name)
+        return config.search_params if config else DEFAULT_SEARCH_PARAMS
+
+    def record(self, name: str, config: IndexConfig, rows: int, source: str, **metrics):
+        """记录collection当前使用的配置，source 为 auto（按数据量选择）或 tuned（调优结果）"""
+        with self._lock:
+            self.entries[name] = {**asdict(config), "rows": rows, "source": source, **metrics}
+            self._save()
+
+    def remove(self, name: str):
+        with self._lock:
+            if self.entries.pop(name, None) is not None:
+                self._save()
+
+    def _save(self):
+        """原子写入配置文件"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+_registry = None
+
+def get_registry() -> IndexRegistry:
+    global _registry
+    if _registry is None:
+        _registry = IndexRegistry()
+    return _registry
+
+def vector_type_of(collection, backend) -> str:
+    return next(spec.dtype for spec in backend.describe(collection) if spec.dtype.endswith("vector"))
+
+def ensure_index(collection, backend) -> Optional[IndexConfig]:
+    """数据量变化后按规则重新选择索引，配置不变时不重建；返回新配置，未重建时返回 None
+
+    调优得到的配置在数据量未跨越 FLAT/HNSW/IVF 档位前保持不变。
+    """
+    collection.flush()
+    rows = collection.num_entities
+    registry = get_registry()
+    vector_type = vector_type_of(collection, backend)
+    config = choose_index(rows, backend.index_types, vector_type)
+    current = registry.get(collection.name)
+    entry = registry.entries.get(collection.name, {})
+    if current is not None:
+        previous = choose_index(entry.get("rows", 0), backend.index_types, vector_type)
+        same_tier = previous.index_type == config.index_type
+        if entry.get("source") == "tuned" and same_tier:
+            return None
+        if current.index_type == config.index_type and current.build == config.build:
+            if current.search != config.search:
+                registry.record(collection.name, config, rows, "auto")
+            return None
+    backend.set_index(collection, config.index_params)
+    registry.record(collection.name, config, rows, "auto")
+    return config
@@ -0,0 +1,524 @@
+import os
+import re
+import json
+import shutil
+import sqlite3
+import threading
+from dataclasses import asdict
+from typing import Dict, List, Optional
+import numpy as np
+from .base import FieldSpec, VectorBackend
+
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "./vector_db")
+# 向量数少于该值时始终精确检索，超过后按索引参数构建IVF
+LOCAL_IVF_MIN_ROWS = int(os.getenv("LOCAL_IVF_MIN_ROWS", "50000"))
+# 已删除的行占比达到该值时压缩向量文件、ID文件和IVF分配文件，去掉已删除的行
+LOCAL_COMPACT_RATIO = float(os.getenv("LOCAL_COMPACT_RATIO", "0.2"))
+_BLOCK_ROWS = 65536  # 分块计算距离，避免一次性读入整个向量文件
+# 每个字节中1的个数，用于计算二值向量的汉明距离
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int32)
+
+def _vector_file(dtype: str) -> str:
+    # float32 向量沿用原有文件名，其他类型按原始字节存储
+    return "vectors.f32" if dtype == "float_vector" else "vectors.bin"
+
+_IN_EXPR = re.compile(r'^\s*(\w+)\s+in\s+(\[.*\])\s*$', re.S)
+_CMP_EXPR = re.compile(r'^\s*(\w+)\s*(==|!=|>=|<=|>|<)\s*(.+?)\s*$', re.S)
+
+def _expr_to_sql(expr: Optional[str], columns: List[str]):
+    """将本项目用到的过滤表达式（field in [...] / field op value）转换为SQL条件"""
+    if not expr:
+        return "1 = 1", []
+    match = _IN_EXPR.match(expr)
+    if match:
+        field, values = match.group(1), json.loads(match.group(2))
+        if field not in columns:
+            raise ValueError(f"未知字段: {field}")
+        if not values:
+            return "0 = 1", []
+        return f"{field} IN ({', '.join('?' * len(values))})", values
+    match = _CMP_EXPR.match(expr)
+    if match:
+        field, op, value = match.group(1), match.group(2), json.loads(match.group(3))
+        if field not in columns:
+            raise ValueError(f"未知字段: {field}")
+        return f"{field} {'=' if op == '==' else op} ?", [value]
+    raise ValueError(f"不支持的过滤表达式: {expr}")
+
+class Hit:
+    """检索结果，接口与 pymilvus 的 Hit 一致"""
+
+    def __init__(self, id: int, score: float, fields: Dict):
+        self.id = id
+        self.score = score
+        self.distance = score
+        self.fields = fields
+
+    def get(self, field: str):
+        return self.fields.get(field)
+
+class InsertResult:
+    def __init__(self, primary_keys: List[int]):
+        self.primary_keys = primary_keys
+
+class QueryIterator:
+    """按主键顺序分批读取，接口与 pymilvus 的 QueryIterator 一致"""
+
+    def __init__(self, collection: "LocalCollection", batch_size: int, expr: str, output_fields: List[str]):
+        self._collection = collection
+        self._batch_size = batch_size
+        self._expr = expr
+        self._output_fields = output_fields
+        self._last_id = -1
+
+    def next(self) -> List[Dict]:
+        rows = self._collection._select(self._expr, self._output_fields, self._batch_size, after_id=self._last_id)
+        if rows:
+            self._last_id = rows[-1]["id"]
+        return rows
+
+    def close(self):
+        pass
+
+class LocalCollection:
+    """进程内向量集合
+
+    向量（float32 / float16 / 按位打包的二值向量）追加写入内存映射文件，标量字段存于SQLite；
+    检索时对向量做分块矢量化的精确计算（浮点向量为L2，二值向量为汉明距离），
+    浮点向量数据量较大且索引类型为IVF时先用k-means聚类中心粗筛再精确计算。
+    删除只从SQLite中删行并在内存中标记，已删除行占比达到 LOCAL_COMPACT_RATIO 时压缩文件。
+    """
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        self._dir = directory
+        with open(os.path.join(directory, "schema.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.fields = [FieldSpec(**field) for field in meta["fields"]]
+        self.index_params = meta["index_params"]
+        self._primary = next(f.name for f in self.fields if f.is_primary)
+        self._vector_field = next(f for f in self.fields if f.dtype.endswith("vector"))
+        self._scalar_fields = [f.name for f in self.fields if not f.is_primary and f is not self._vector_field]
+        self.dim = self._vector_field.dim
+        self._binary = self._vector_field.dtype == "binary_vector"
+        if self._binary:
+            self._vector_dtype, self._width = np.uint8, self.dim // 8
+        elif self._vector_field.dtype == "float16_vector":
+            self._vector_dtype, self._width = np.float16, self.dim
+        else:
+            self._vector_dtype, self._width = np.float32, self.dim
+        self._row_bytes = self._width * np.dtype(self._vector_dtype).itemsize
+        self._vectors_file = _vector_file(self._vector_field.dtype)
+
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(directory, "rows.sqlite"), check_same_thread=False)
+        self._loaded = False
+        self._centroids = self._assign = None
+        self._filter_cache: Dict[str, np.ndarray] = {}
+
+    # ---------- 存储 ----------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._dir, name)
+
+    def _stored_rows(self) -> int:
+        """向量文件和ID文件中完整写入的行数，并截掉中断写入留下的不完整尾部"""
+        ids_path, vectors_path = self._path("ids.i64"), self._path(self._vectors_file)
+        rows = min(os.path.getsize(ids_path) // 8, os.path.getsize(vectors_path) // self._row_bytes)
+        for path, row_size in ((ids_path, 8), (vectors_path, self._row_bytes)):
+            if os.path.getsize(path) != rows * row_size:
+                with open(path, 'r+b') as f:
+                    f.truncate(rows * row_size)
+        return rows
+
+    def load(self):
+        with self._lock:
+            self._finish_compaction()
+            rows = self._stored_rows()
+            self._ids = np.fromfile(self._path("ids.i64"), dtype=np.int64, count=rows)
+            self._vectors = self._map_vectors(rows)
+            alive_ids = np.array([row[0] for row in self._db.execute(f"SELECT {self._primary} FROM rows")],
+                                 dtype=np.int64)
+            self._alive = np.isin(self._ids, alive_ids)
+            self._norms = np.concatenate(
+                [self._row_norms(self._vectors[i:i + _BLOCK_ROWS]) for i in range(0, rows, _BLOCK_ROWS)]
+            ) if rows else np.zeros(0, dtype=np.float32)
+            self._filter_cache.clear()
+            self._load_ivf()
+            self._loaded = True
+            self._maybe_compact()
+
+    def _map_vectors(self, rows: int) -> np.ndarray:
+        if not rows:
+            return np.zeros((0, self._width), dtype=self._vector_dtype)
+        return np.memmap(self._path(self._vectors_file), dtype=self._vector_dtype, mode='r', shape=(rows, self._width))
+
+    def _row_norms(self, vectors: np.ndarray) -> np.ndarray:
+        """浮点向量的平方范数（二值向量不需要）"""
+        if self._binary:
+            return np.zeros(len(vectors), dtype=np.float32)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return np.einsum('ij,ij->i', vectors, vectors)
+
+    def _encode(self, data) -> np.ndarray:
+        """将写入或检索的向量转换为存储格式：二值向量接受 bytes，浮点向量接受数值列表或数组"""
+        if self._binary:
+            return np.frombuffer(b"".join(bytes(vector) for vector in data), dtype=np.uint8).reshape(-1, self._width)
+        return np.asarray(data, dtype=self._vector_dtype).reshape(-1, self._width)
+
+    def release(self):
+        with self._lock:
+            self._loaded = False
+            self._vectors = self._ids = self._alive = self._norms = None
+            self._centroids = self._assign = None
+            self._filter_cache.clear()
+
+    def flush(self):
+        with self._lock:
+            self._db.commit()
+
+    @property
+    def num_entities(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def insert(self, data: List[list]) -> InsertResult:
+        """按字段顺序（不含自增主键）写入列数据"""
+        columns = dict(zip(self._scalar_fields + [self._vector_field.name], data))
+        vectors = self._encode(columns[self._vector_field.name])
+        count = len(vectors)
+        with self._lock:
+            meta_path = self._path("schema.json")
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            ids = np.arange(meta["next_id"], meta["next_id"] + count, dtype=np.int64)
+            meta["next_id"] += count
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+            # 先写向量再写ID，中断时 _stored_rows 会截断到两者一致的行数
+            with open(self._path(self._vectors_file), 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self._path("ids.i64"), 'ab') as f:
+                f.write(ids.tobytes())
+            placeholders = ", ".join("?" * (len(self._scalar_fields) + 1))
+            self._db.executemany(
+                f"INSERT INTO rows ({', '.join([self._primary] + self._scalar_fields)}) VALUES ({placeholders})",
+                zip(ids.tolist(), *(columns[name] for name in self._scalar_fields))
+            )
+            self._db.commit()
+            if self._loaded:
+                self._append_loaded(ids, vectors)
+        return InsertResult(ids.tolist())
+
+    def _append_loaded(self, ids: np.ndarray, vectors: np.ndarray):
+        rows = len(self._ids) + len(ids)
+        self._ids = np.concatenate([self._ids, ids])
+        self._vectors = self._map_vectors(rows)
+        self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+        self._norms = np.concatenate([self._norms, self._row_norms(vectors)])
+        if self._centroids is not None:
+            assign = self._nearest_centroids(vectors)
+            self._assign = np.concatenate([self._assign, assign])
+            with open(self._path("ivf_assign.i32"), 'ab') as f:
+                f.write(assign.astype(np.int32).tobytes())
+        self._filter_cache.clear()
+
+    def delete(self, expr: str):
+        where, params = _expr_to_sql(expr, [self._primary] + self._scalar_fields)
+        with self._lock:
+            ids = [row[0] for row in self._db.execute(f"SELECT {self._primary} FROM rows WHERE {where}", params)]
+            self._db.execute(f"DELETE FROM rows WHERE {where}", params)
+            self._db.commit()
+            if self._loaded and ids:
+                self._alive &= ~np.isin(self._ids, np.array(ids, dtype=np.int64))
+                self._filter_cache.clear()
+                self._maybe_compact()
+        return InsertResult(ids)
+
+    # ---------- 压缩 ----------
+
+    def _maybe_compact(self):
+        rows = len(self._ids)
+        if rows and (rows - int(self._alive.sum())) / rows >= LOCAL_COMPACT_RATIO:
+            self.compact()
+
+    def compact(self):
+        """去掉已删除的行：有效行写入 compact 子目录，写完后放置 done 标记再替换原文件
+
+        替换中途中断时，下次加载由 _finish_compaction 根据 done 标记继续替换；
+        没有 done 标记的 compact 目录是未写完的结果，直接丢弃。
+        """
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            keep = np.flatnonzero(self._alive)
+            if len(keep) == len(self._ids):
+                return
+            staging = self._path("compact")
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            with open(os.path.join(staging, self._vectors_file), 'wb') as f:
+                for i in range(0, len(keep), _BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(self._vectors[keep[i:i + _BLOCK_ROWS]]).tobytes())
+            self._ids[keep].tofile(os.path.join(staging, "ids.i64"))
+            if self._assign is not None:
+                self._assign[keep].astype(np.int32).tofile(os.path.join(staging, "ivf_assign.i32"))
+            elif os.path.exists(self._path("ivf_assign.i32")):
+                # 未启用的IVF分配文件与压缩后的行数不再对应
+                os.remove(self._path("ivf_assign.i32"))
+            open(os.path.join(staging, "done"), 'w').close()
+
+            self._vectors = None
+            self._finish_compaction()
+            self._ids = self._ids[keep]
+            self._vectors = self._map_vectors(len(keep))
+            self._alive = np.ones(len(keep), dtype=bool)
+            self._norms = self._norms[keep]
+            if self._assign is not None:
+                self._assign = self._assign[keep]
+            self._filter_cache.clear()
+
+    def _finish_compaction(self):
+        staging = self._path("compact")
+        if not os.path.isdir(staging):
+            return
+        if os.path.exists(os.path.join(staging, "done")):
+            for filename in os.listdir(staging):
+                if filename != "done":
+                    os.replace(os.path.join(staging, filename), self._path(filename))
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def _select(self, expr: str, output_fields: List[str] = None, limit: int = None,
+                after_id: int = None) -> List[Dict]:
+        fields = [self._primary] + [f for f in (output_fields or []) if f in self._scalar_fields]
+        where, params = _expr_to_sql(expr, [self._primary] + self._scalar_fields)
+        if after_id is not None:
+            where = f"({where}) AND {self._primary} > ?"
+            params = params + [after_id]
+        sql = f"SELECT {', '.join(fields)} FROM rows WHERE {where} ORDER BY {self._primary}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = [dict(zip(fields, row)) for row in self._db.execute(sql, params)]
+        if self._vector_field.name in (output_fields or []) and rows:
+            self._attach_vectors(rows)
+        return rows
+
+    def _attach_vectors(self, rows: List[Dict]):
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            order = np.argsort(self._ids)
+            wanted = np.array([row[self._primary] for row in rows], dtype=np.int64)
+            positions = order[np.searchsorted(self._ids, wanted, sorter=order)]
+            vectors = self._vectors[positions]
+        for row, vector in zip(rows, vectors):
+            row[self._vector_field.name] = vector.tobytes() if self._binary else vector.astype(np.float32).tolist()
+
+    def query(self, expr: str, output_fields: List[str] = None, limit: int = None) -> List[Dict]:
+        return self._select(expr, output_fields, limit)
+
+    def query_iterator(self, batch_size: int = 1000, expr: str = None,
+                       output_fields: List[str] = None) -> QueryIterator:
+        return QueryIterator(self, batch_size, expr, output_fields)
+
+    # ---------- 检索 ----------
+
+    def _filter_mask(self, expr: Optional[str]) -> np.ndarray:
+        """有效且满足过滤条件的行，按表达式缓存，写入或删除后失效"""
+        if not expr:
+            return self._alive
+        mask = self._filter_cache.get(expr)
+        if mask is None:
+            where, params = _expr_to_sql(expr, [self._primary] + self._scalar_fields)
+            ids = np.array([row[0] for row in self._db.execute(
+                f"SELECT {self._primary} FROM rows WHERE {where}", params)], dtype=np.int64)
+            mask = self._alive & np.isin(self._ids, ids)
+            self._filter_cache[expr] = mask
+        return mask
+
+    def _l2(self, positions: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """平方L2距离（与Milvus的L2度量一致），二值向量为汉明距离"""
+        distances = np.empty(len(positions), dtype=np.float32)
+        if self._binary:
+            for i in range(0, len(positions), _BLOCK_ROWS):
+                block = positions[i:i + _BLOCK_ROWS]
+                distances[i:i + _BLOCK_ROWS] = _POPCOUNT[np.bitwise_xor(self._vectors[block], query)].sum(axis=1)
+            return distances
+        for i in range(0, len(positions), _BLOCK_ROWS):
+            block = positions[i:i + _BLOCK_ROWS]
+            distances[i:i + _BLOCK_ROWS] = self._norms[block] - 2 * (np.asarray(self._vectors[block], dtype=np.float32) @ query)
+        return np.maximum(distances + float(query @ query), 0)
+
+    def search(self, data: List[List[float]], anns_field: str, param: Dict, limit: int,
+               expr: str = None, output_fields: List[str] = None, timeout: float = None, **kwargs) -> List[List[Hit]]:
+        queries = self._encode(data)
+        if not self._binary:
+            queries = queries.astype(np.float32)
+        nprobe = (param or {}).get("params", {}).get("nprobe", 16)
+        results = []
+        with self._lock:
+            if not self._loaded:
+                raise RuntimeError(f"collection {self.name} 未加载")
+            mask = self._filter_mask(expr)
+            for query in queries:
+                candidates = mask
+                if self._centroids is not None:
+                    probes = np.argsort(((self._centroids - query) ** 2).sum(axis=1))[:nprobe]
+                    candidates = mask & np.isin(self._assign, probes)
+                positions = np.flatnonzero(candidates)
+                if not len(positions):
+                    results.append([])
+                    continue
+                distances = self._l2(positions, query)
+                k = min(limit, len(positions))
+                top = np.argpartition(distances, k - 1)[:k]
+                top = top[np.argsort(distances[top])]
+                results.append([(int(self._ids[positions[i]]), float(distances[i])) for i in top])
+
+        hits = []
+        for result in results:
+            ids = [hit_id for hit_id, _ in result]
+            rows = {row[self._primary]: row for row in self._select(
+                f"{self._primary} in {json.dumps(ids)}", output_fields)} if ids else {}
+            hits.append([Hit(hit_id, score, rows.get(hit_id, {})) for hit_id, score in result])
+        return hits
+
+    # ---------- IVF ----------
+
+    def set_index(self, index_params: Dict):
+        """更换索引参数：丢弃已训练的聚类中心，重新加载时按新参数训练"""
+        with self._lock:
+            meta_path = self._path("schema.json")
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            meta["index_params"] = index_params
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            self.index_params = index_params
+            for filename in ("ivf_centroids.npy", "ivf_assign.i32"):
+                if os.path.exists(self._path(filename)):
+                    os.remove(self._path(filename))
+            self.load()
+
+    def _load_ivf(self):
+        self._centroids = self._assign = None
+        index_type = self.index_params.get("index_type", "FLAT")
+        if not index_type.startswith("IVF") or self._binary:
+            return
+        centroids_path, assign_path = self._path("ivf_centroids.npy"), self._path("ivf_assign.i32")
+        rows = len(self._ids)
+        if (os.path.exists(centroids_path) and os.path.exists(assign_path)
+                and os.path.getsize(assign_path) // 4 == rows):
+            self._centroids = np.load(centroids_path)
+            self._assign = np.fromfile(assign_path, dtype=np.int32)
+        elif int(self._alive.sum()) >= LOCAL_IVF_MIN_ROWS:
+            self._train_ivf()
+
+    def _nearest_centroids(self, vectors: np.ndarray) -> np.ndarray:
+        norms = (self._centroids ** 2).sum(axis=1)
+        return np.concatenate([
+            np.argmin(norms - 2 * (vectors[i:i + _BLOCK_ROWS] @ self._centroids.T), axis=1)
+            for i in range(0, len(vectors), _BLOCK_ROWS)
+        ]).astype(np.int32)
+
+    def _train_ivf(self, iterations: int = 10, seed: int = 0):
+        """在抽样数据上训练k-means聚类中心并为所有向量分配所属列表"""
+        alive = np.flatnonzero(self._alive)
+        nlist = max(1, min(self.index_params.get("params", {}).get("nlist", 1024), len(alive) // 39))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(alive, size=min(len(alive), nlist * 64), replace=False))
+        points = np.asarray(self._vectors[sample], dtype=np.float32)
+        self._centroids = points[rng.choice(len(points), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = self._nearest_centroids(points)
+            for c in range(nlist):
+                members = points[assign == c]
+                if len(members):
+                    self._centroids[c] = members.mean(axis=0)
+        self._assign = self._nearest_centroids(self._vectors)
+        np.save(self._path("ivf_centroids.npy"), self._centroids)
+        self._assign.tofile(self._path("ivf_assign.i32"))
+
+class LocalBackend(VectorBackend):
+    """进程内向量库后端，每个集合对应 LOCAL_VECTOR_DIR 下的一个目录"""
+
+    _SQL_TYPES = {"int32": "INTEGER", "int64": "INTEGER", "varchar": "TEXT"}
+    # 其余类型（如HNSW）按精确检索处理
+    index_types = ("FLAT", "IVF_FLAT", "BIN_FLAT")
+
+    def __init__(self, root: str = LOCAL_VECTOR_DIR):
+        self.root = root
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+
+    def connect(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    def _dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def has_collection(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self._dir(name), "schema.json"))
+
+    def _get(self, name: str) -> LocalCollection:
+        # 同一集合在进程内共享一个实例，保证写入和检索看到一致的内存状态
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = LocalCollection(self._dir(name), name)
+            return self._collections[name]
+
+    def open_collection(self, name: str, load: bool = True) -> LocalCollection:
+        collection = self._get(name)
+        if load and not collection._loaded:
+            collection.load()
+        return collection
+
+    def create_collection(self, name: str, fields: List[FieldSpec], index_params: Dict,
+                          description: str = "") -> LocalCollection:
+        directory = self._dir(name)
+        os.makedirs(directory, exist_ok=True)
+        columns = []
+        for spec in fields:
+            if spec.dtype.endswith("vector"):
+                continue
+            sql_type = self._SQL_TYPES[spec.dtype]
+            columns.append(f"{spec.name} {sql_type} PRIMARY KEY" if spec.is_primary else f"{spec.name} {sql_type}")
+        db = sqlite3.connect(os.path.join(directory, "rows.sqlite"))
+        db.execute(f"CREATE TABLE IF NOT EXISTS rows ({', '.join(columns)})")
+        for spec in fields:
+            if spec.is_partition_key:
+                db.execute(f"CREATE INDEX IF NOT EXISTS idx_{spec.name} ON rows ({spec.name})")
+        db.commit()
+        db.close()
+        vector_dtype = next(spec.dtype for spec in fields if spec.dtype.endswith("vector"))
+        for filename in (_vector_file(vector_dtype), "ids.i64"):
+            open(os.path.join(directory, filename), 'ab').close()
+        with open(os.path.join(directory, "schema.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                "description": description,
+                "fields": [asdict(spec) for spec in fields],
+                "index_params": index_params,
+                "next_id": 0,
+            }, f, ensure_ascii=False)
+        return self.open_collection(name)
+
+    def describe(self, collection: LocalCollection) -> List[FieldSpec]:
+        return list(collection.fields)
+
+    def set_index(self, collection: LocalCollection, index_params: Dict):
+        collection.set_index(index_params)
+
+    def drop_collection(self, name: str):
+        with self._lock:
+            collection = self._collections.pop(name, None)
+        if collection is not None:
+            collection.release()
+            collection._db.close()
+        shutil.rmtree(self._dir(name), ignore_errors=True)
+
+    def list_collections(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if self.has_collection(name))
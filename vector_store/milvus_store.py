@@ -0,0 +1,92 @@
+import os
+from typing import Dict, List
+from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
+from .base import FieldSpec, VectorBackend
+
+MILVUS_HOST = os.getenv("MILVUS_HOST", "localhost")
+MILVUS_PORT = os.getenv("MILVUS_PORT", "19530")
+
+_DTYPES = {
+    "int32": DataType.INT32,
+    "int64": DataType.INT64,
+    "varchar": DataType.VARCHAR,
+    "float_vector": DataType.FLOAT_VECTOR,
+    "float16_vector": DataType.FLOAT16_VECTOR,
+    "binary_vector": DataType.BINARY_VECTOR,
+}
+_VECTOR_DTYPES = (DataType.FLOAT_VECTOR, DataType.FLOAT16_VECTOR, DataType.BINARY_VECTOR)
+
+class MilvusBackend(VectorBackend):
+    """Milvus 服务端后端，集合即 pymilvus.Collection"""
+
+    index_types = ("FLAT", "HNSW", "IVF_FLAT", "IVF_SQ8", "IVF_PQ", "BIN_FLAT", "BIN_IVF_FLAT")
+
+    def __init__(self, host: str = MILVUS_HOST, port: str = MILVUS_PORT, alias: str = "default"):
+        self.host = host
+        self.port = port
+        self.alias = alias
+
+    def connect(self):
+        if not connections.has_connection(self.alias):
+            connections.connect(self.alias, host=self.host, port=self.port)
+
+    def has_collection(self, name: str) -> bool:
+        return utility.has_collection(name)
+
+    def open_collection(self, name: str, load: bool = True) -> Collection:
+        collection = Collection(name)
+        if load:
+            collection.load()
+        return collection
+
+    @staticmethod
+    def _field(spec: FieldSpec) -> FieldSchema:
+        kwargs = {}
+        if spec.max_length is not None:
+            kwargs["max_length"] = spec.max_length
+        if spec.dim is not None:
+            kwargs["dim"] = spec.dim
+        if spec.is_primary:
+            kwargs["is_primary"] = True
+            kwargs["auto_id"] = spec.auto_id
+        if spec.is_partition_key:
+            kwargs["is_partition_key"] = True
+        return FieldSchema(name=spec.name, dtype=_DTYPES[spec.dtype], **kwargs)
+
+    def create_collection(self, name: str, fields: List[FieldSpec], index_params: Dict,
+                          description: str = "") -> Collection:
+        schema = CollectionSchema([self._field(spec) for spec in fields], description)
+        collection = Collection(name, schema)
+        vector_field = next(spec.name for spec in fields if spec.dtype.endswith("vector"))
+        collection.create_index(vector_field, index_params)
+        collection.load()
+        return collection
+
+    def describe(self, collection: Collection) -> List[FieldSpec]:
+        names = {dtype: name for name, dtype in _DTYPES.items()}
+        return [
+            FieldSpec(
+                name=field.name,
+                dtype=names.get(field.dtype, str(field.dtype)),
+                max_length=field.params.get("max_length"),
+                dim=field.params.get("dim"),
+                is_primary=field.is_primary,
+                auto_id=field.auto_id,
+                is_partition_key=getattr(field, "is_partition_key", False),
+            )
+            for field in collection.schema.fields
+        ]
+
+    def set_index(self, collection: Collection, index_params: Dict):
+        # Milvus 不能修改已加载集合的索引：释放、删除旧索引、重建后重新加载
+        vector_field = next(field.name for field in collection.schema.fields if field.dtype in _VECTOR_DTYPES)
+        collection.release()
+        collection.drop_index()
+        collection.create_index(vector_field, index_params)
+        collection.load()
+
+    def drop_collection(self, name: str):
+        utility.drop_collection(name)
+
+    def list_collections(self) -> List[str]:
+        return utility.list_collections()